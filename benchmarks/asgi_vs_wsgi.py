@@ -0,0 +1,58 @@
+"""
+Сравнение пропускной способности синхронного (WSGI) и асинхронного (ASGI) пути чтения.
+
+Поднимите оба сервера на одной базе, например:
+
+    gunicorn shop_api.wsgi:application -w 4 --bind 127.0.0.1:8000
+    gunicorn shop_api.asgi:application -k uvicorn.workers.UvicornWorker -w 4 --bind 127.0.0.1:8001
+
+и запустите:
+
+    python benchmarks/asgi_vs_wsgi.py --token <JWT> --concurrency 64 --requests 2000
+
+Синхронные эндпоинты (/api/v1/products/...) бьются на WSGI-сервере,
+их async-аналоги (/api/v1/async/products/...) — на ASGI-сервере.
+"""
+import argparse
+import json
+
+import load
+
+ENDPOINTS = [
+    'products/',
+    'products/1/',
+    'products/categories/',
+    'products/reviews/',
+]
+
+
+def run(url, token, concurrency, total):
+    results, elapsed = load.run(lambda _: load.request(url, token=token), total, concurrency)
+    return {'url': url, **load.summarize(results, elapsed)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--wsgi', default='http://127.0.0.1:8000/api/v1/')
+    parser.add_argument('--asgi', default='http://127.0.0.1:8001/api/v1/async/')
+    parser.add_argument('--token', help='JWT access token (нужен для списка товаров)')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--output', help='сохранить результаты в JSON')
+    args = parser.parse_args()
+
+    results = []
+    for endpoint in ENDPOINTS:
+        for mode, base in (('wsgi', args.wsgi), ('asgi', args.asgi)):
+            result = run(base + endpoint, args.token, args.concurrency, args.requests)
+            result['mode'] = mode
+            results.append(result)
+            print(json.dumps(result, ensure_ascii=False))
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
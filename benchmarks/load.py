@@ -0,0 +1,77 @@
+"""Генерация конкурентной HTTP-нагрузки и сводка по задержкам (только stdlib)."""
+import json
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# X-Query-Budget ("факт/бюджет") отдаёт QueryBudgetMiddleware при QUERY_BUDGET_MODE=log|raise,
+# X-DjangoQueryCount-Count — django-querycount при DEBUG=True
+QUERY_HEADERS = ('X-Query-Budget', 'X-DjangoQueryCount-Count')
+
+
+class Result:
+    __slots__ = ('latency', 'status', 'queries', 'body')
+
+    def __init__(self, latency, status, queries, body):
+        self.latency = latency
+        self.status = status
+        self.queries = queries
+        self.body = body
+
+
+def request(url, method='GET', data=None, token=None, timeout=30):
+    body = json.dumps(data).encode() if data is not None else None
+    http_request = urllib.request.Request(url, data=body, method=method)
+    http_request.add_header('Content-Type', 'application/json')
+    if token:
+        http_request.add_header('Authorization', f'Bearer {token}')
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(http_request, timeout=timeout) as response:
+            payload = response.read()
+            status, headers = response.status, response.headers
+    except urllib.error.HTTPError as error:
+        payload, status, headers = error.read(), error.code, error.headers
+    except OSError:
+        return Result(time.perf_counter() - started, 0, None, b'')
+    latency = time.perf_counter() - started
+    return Result(latency, status, query_count(headers), payload)
+
+
+def query_count(headers):
+    for name in QUERY_HEADERS:
+        value = (headers.get(name) or '').split('/')[0]
+        if value.isdigit():
+            return int(value)
+    return None
+
+
+def run(make_request, total, concurrency):
+    """make_request(i) -> Result; выполняет total запросов в concurrency потоков."""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(make_request, range(total)))
+    return results, time.perf_counter() - started
+
+
+def summarize(results, elapsed):
+    ok = [result for result in results if 200 <= result.status < 400]
+    latencies = sorted(result.latency for result in ok)
+    queries = [result.queries for result in ok if result.queries is not None]
+    summary = {
+        'requests': len(results),
+        'errors': len(results) - len(ok),
+        'rps': round(len(ok) / elapsed, 1) if elapsed else 0.0,
+    }
+    if latencies:
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        summary.update({
+            'p50_ms': round(quantiles[49] * 1000, 2),
+            'p95_ms': round(quantiles[94] * 1000, 2),
+            'p99_ms': round(quantiles[98] * 1000, 2),
+        })
+    if queries:
+        summary['queries_per_request'] = round(statistics.mean(queries), 2)
+    return summary
@@ -0,0 +1,249 @@
+"""
+Нагрузочный прогон основных эндпоинтов на одной машине (локальные Postgres и Redis).
+
+Поднимите сервер без лимитов частоты (все запросы идут с одного IP и на немногие
+email, с лимитами почти все они получили бы 429), например:
+
+    RATE_LIMITS_ENABLED=False QUERY_BUDGET_MODE=log gunicorn shop_api.wsgi:application -w 4 --bind 127.0.0.1:8000
+
+и запустите из корня проекта:
+
+    python benchmarks/run.py --seed 200000 --concurrency 32 --requests 1000
+
+--seed N досевает каталог до N товаров (с отзывами) командой manage.py seed
+и требует окружения проекта (.env, доступ к базе). Для каждого эндпоинта выводятся
+пропускная способность, p50/p95/p99 и среднее число SQL-запросов на запрос
+(из заголовка X-Query-Budget, поэтому нужен QUERY_BUDGET_MODE=log); результаты
+сохраняются в benchmarks/results/<commit>.json. Ответ 429 прерывает прогон:
+с включёнными лимитами цифры ничего не значат. Два прогона сравниваются так:
+
+    python benchmarks/run.py --compare benchmarks/results/a1b2c3d.json benchmarks/results/e4f5a6b.json
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import uuid
+
+import load
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+PASSWORD = 'bench-password'
+LIST_PAGES = 20
+
+SCENARIOS = ('register', 'send_code', 'confirm', 'login',
+             'product_list', 'product_detail', 'categories', 'reviews', 'product_reviews')
+# подтверждать можно только зарегистрированные email с отправленным кодом
+DEPENDENCIES = {'confirm': ('register', 'send_code')}
+
+
+THROTTLED_MESSAGE = ('{}: сервер ответил 429 — лимиты частоты включены. '
+                     'Перезапустите сервер с RATE_LIMITS_ENABLED=False.')
+
+
+def check_throttled(name, results):
+    if any(result.status == 429 for result in results):
+        raise SystemExit(THROTTLED_MESSAGE.format(name))
+
+
+# --- данные ---
+
+def seed(products, rng_seed=1):
+    """Досевает каталог до products товаров командой manage.py seed."""
+    sys.path.insert(0, ROOT)
+    import dotenv
+    dotenv.load_dotenv(os.path.join(ROOT, '.env'))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shop_api.settings')
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from product.models import Product
+
+    missing = products - Product.objects.count()
+    if missing <= 0:
+        print(f'seed: в каталоге уже не меньше {products} товаров')
+        return
+    call_command('seed', products=missing, seed=rng_seed)
+
+
+# --- сценарии ---
+
+class Suite:
+    def __init__(self, base_url, concurrency, total, warmup):
+        self.base_url = base_url.rstrip('/') + '/'
+        self.concurrency = concurrency
+        self.total = total
+        self.warmup = warmup
+        self.run_id = uuid.uuid4().hex[:8]
+        self.codes = {}
+        self.token = None
+        self.product_ids = []
+
+    def url(self, path):
+        return self.base_url + path
+
+    def email(self, i):
+        return f'bench-{self.run_id}-{i}@example.com'
+
+    def prepare(self):
+        """Заводит активного пользователя с JWT и собирает id товаров для detail-запросов."""
+        email = self.email('main')
+        steps = [load.request(self.url('users/register/'), 'POST', {'email': email, 'password': PASSWORD})]
+        steps.append(load.request(self.url('users/send-code/'), 'POST', {'email': email}))
+        check_throttled('prepare', steps)
+        code = json.loads(steps[-1].body)['code']
+        steps.append(load.request(self.url('users/confirm/'), 'POST', {'email': email, 'code': code}))
+        response = load.request(self.url('users/login/'), 'POST', {'email': email, 'password': PASSWORD})
+        check_throttled('prepare', [*steps, response])
+        if response.status != 200:
+            raise SystemExit(f'Не удалось получить JWT: {response.status} {response.body[:200]!r}')
+        self.token = json.loads(response.body)['access']
+
+        for page in range(1, 6):
+            response = load.request(self.url(f'products/?page={page}&page_size=100'), token=self.token)
+            if response.status != 200:
+                break
+            self.product_ids.extend(product['id'] for product in json.loads(response.body)['results'])
+        if not self.product_ids:
+            raise SystemExit('Каталог пуст: запустите с --seed N')
+
+    def catalog_size(self):
+        response = load.request(self.url('products/?page_size=1'), token=self.token)
+        return json.loads(response.body).get('total') if response.status == 200 else None
+
+    # каждый сценарий: i -> Result; регистрация, отправка и подтверждение кода идут цепочкой по одним email
+
+    def register(self, i):
+        return load.request(self.url('users/register/'), 'POST', {'email': self.email(i), 'password': PASSWORD})
+
+    def send_code(self, i):
+        result = load.request(self.url('users/send-code/'), 'POST', {'email': self.email(i)})
+        if result.status == 200:
+            self.codes[i] = json.loads(result.body)['code']
+        return result
+
+    def confirm(self, i):
+        return load.request(self.url('users/confirm/'), 'POST', {'email': self.email(i), 'code': self.codes.get(i, '')})
+
+    def login(self, i):
+        return load.request(self.url('users/login/'), 'POST', {'email': self.email('main'), 'password': PASSWORD})
+
+    def product_list(self, i):
+        return load.request(self.url(f'products/?page={i % LIST_PAGES + 1}'), token=self.token)
+
+    def product_detail(self, i):
+        return load.request(self.url(f'products/{random.choice(self.product_ids)}/'), token=self.token)
+
+    def categories(self, i):
+        return load.request(self.url('products/categories/'), token=self.token)
+
+    def reviews(self, i):
+        return load.request(self.url(f'products/reviews/?page={i % LIST_PAGES + 1}'), token=self.token)
+
+    def product_reviews(self, i):
+        return load.request(self.url(f'products/{random.choice(self.product_ids)}/reviews/'), token=self.token)
+
+    def run(self, name):
+        scenario = getattr(self, name)
+        if self.warmup and name not in ('register', 'send_code', 'confirm'):
+            check_throttled(name, load.run(scenario, self.warmup, self.concurrency)[0])
+        results, elapsed = load.run(scenario, self.total, self.concurrency)
+        check_throttled(name, results)
+        return load.summarize(results, elapsed)
+
+
+# --- отчёт ---
+
+def current_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def print_table(results):
+    print(f'{"endpoint":<16}{"rps":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"queries":>9}{"errors":>8}')
+    for name, summary in results.items():
+        print(f'{name:<16}{summary["rps"]:>10}{summary.get("p50_ms", "-"):>10}{summary.get("p95_ms", "-"):>10}'
+              f'{summary.get("p99_ms", "-"):>10}{summary.get("queries_per_request", "-"):>9}{summary["errors"]:>8}')
+
+
+def compare(before_path, after_path):
+    with open(before_path) as file:
+        before = json.load(file)
+    with open(after_path) as file:
+        after = json.load(file)
+    print(f'{before["meta"]["commit"]} -> {after["meta"]["commit"]}')
+    print(f'{"endpoint":<16}{"rps":>18}{"p95 ms":>20}{"queries":>14}')
+    for name, new in after['results'].items():
+        old = before['results'].get(name)
+        if not old:
+            continue
+
+        def delta(key):
+            if key not in old or key not in new:
+                return '-'
+            change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            return f'{new[key]} ({change:+.0f}%)'
+
+        print(f'{name:<16}{delta("rps"):>18}{delta("p95_ms"):>20}{delta("queries_per_request"):>14}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000/api/v1/')
+    parser.add_argument('--seed', type=int, metavar='N', help='досеять каталог до N товаров перед прогоном')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=1000, help='запросов на каждый эндпоинт')
+    parser.add_argument('--warmup', type=int, default=50, help='прогревочных запросов (в отчёт не входят)')
+    parser.add_argument('--only', nargs='+', choices=SCENARIOS, help='прогнать только эти эндпоинты')
+    parser.add_argument('--output', help='файл результатов (по умолчанию benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='сравнить два файла результатов')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.seed:
+        seed(args.seed)
+
+    selected = set(args.only or SCENARIOS)
+    for name in list(selected):
+        selected.update(DEPENDENCIES.get(name, ()))
+
+    suite = Suite(args.base_url, args.concurrency, args.requests, args.warmup)
+    suite.prepare()
+    results = {}
+    for name in SCENARIOS:
+        if name not in selected:
+            continue
+        results[name] = suite.run(name)
+        print(name, json.dumps(results[name], ensure_ascii=False), flush=True)
+
+    commit = current_commit()
+    report = {
+        'meta': {
+            'commit': commit,
+            'started_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'base_url': suite.base_url,
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'products': suite.catalog_size(),
+        },
+        'results': results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f'{commit}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=2, ensure_ascii=False)
+    print()
+    print_table(results)
+    print(f'\nРезультаты сохранены в {output}')
+
+
+if __name__ == '__main__':
+    main()
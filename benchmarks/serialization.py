@@ -0,0 +1,100 @@
+"""
+Стоимость сериализации одного объекта на страницах списков: обычный путь
+(экземпляры моделей -> ModelSerializer -> JSONRenderer) против быстрого
+(values() -> ReadPlan -> ORJSONRenderer, см. product/read_plan.py).
+
+Запуск из корня проекта в окружении проекта (.env, база с каталогом, например
+после manage.py seed):
+
+    python benchmarks/serialization.py --items 100 --repeat 50
+
+Для каждого сериализатора выводится время на объект по этапам: выборка из базы,
+построение данных ответа, кодирование в JSON; заодно проверяется, что оба пути
+дают одинаковые байты. Отзывы product_with_reviews обычный путь подгружает при
+выборке (prefetch), быстрый — при построении данных, поэтому сравнивать стоит итог.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup():
+    sys.path.insert(0, ROOT)
+    import dotenv
+    dotenv.load_dotenv(os.path.join(ROOT, '.env'))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shop_api.settings')
+    import django
+    django.setup()
+
+
+def measure(step, repeat):
+    """Медиана времени step() в секундах и результат последнего вызова."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = step()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result
+
+
+def cases():
+    from product.models import Category, Product, Review
+    from product.serializers import (CategorySerializer, ProductSerializer, ProductWithReviewsSerializer,
+                                     ReviewSerializer)
+
+    return [
+        ('category', Category.objects.order_by('id'), CategorySerializer, {}),
+        ('product', Product.objects.order_by('id'), ProductSerializer, {}),
+        ('product+expand', Product.objects.order_by('id'), ProductSerializer, {'expand': {'category'}}),
+        ('review', Review.objects.order_by('id'), ReviewSerializer, {}),
+        ('product_with_reviews', Product.objects.order_by('id'), ProductWithReviewsSerializer, {}),
+    ]
+
+
+def bench(items, repeat):
+    from rest_framework.renderers import JSONRenderer
+
+    from product.fieldsets import fieldset_queryset
+    from product.read_plan import ReadPlan, plan_rows
+    from shop_api.renderers import ORJSONRenderer
+
+    print(f'{items} объектов на страницу, медиана из {repeat} повторов, мкс на объект')
+    print(f'{"":<22}{"путь":<8}{"выборка":>10}{"данные":>10}{"JSON":>10}{"всего":>10}')
+    for name, queryset, serializer_class, context in cases():
+        serializer = serializer_class(context=context)
+
+        restricted = fieldset_queryset(queryset, serializer)
+        fetch, instances = measure(lambda: list(restricted[:items]), repeat)
+        build, data = measure(lambda: serializer_class(instances, many=True, context=context).data, repeat)
+        encode, before = measure(lambda: JSONRenderer().render(data), repeat)
+        slow = (fetch, build, encode)
+
+        plan = ReadPlan(serializer_class(context=context))
+        fetch, rows = measure(lambda: list(plan_rows(queryset, plan)[:items]), repeat)
+        build, data = measure(lambda: plan.represent(rows), repeat)
+        encode, after = measure(lambda: ORJSONRenderer().render(data), repeat)
+        fast = (fetch, build, encode)
+
+        count = len(instances) or 1
+        for label, timings in (('обычный', slow), ('быстрый', fast)):
+            cells = ''.join(f'{value / count * 1e6:>10.1f}' for value in (*timings, sum(timings)))
+            print(f'{name if label == "обычный" else "":<22}{label:<8}{cells}')
+        speedup = sum(slow) / sum(fast) if sum(fast) else 0.0
+        print(f'{"":<22}{"":<8}ускорение x{speedup:.1f}, ответы {"совпадают" if before == after else "РАЗЛИЧАЮТСЯ"}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=100, help='объектов на страницу')
+    parser.add_argument('--repeat', type=int, default=30, help='повторов каждого замера')
+    args = parser.parse_args()
+    setup()
+    bench(args.items, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,44 @@
 from django.contrib import admin
+from .filters import PRICE_BUCKETS, price_bucket_label, search_products
 from .models import Category, Product, Review
 
 class ReviewInline(admin.TabularInline):
     model = Review
     extra = 1
 
+class PriceRangeFilter(admin.SimpleListFilter):
+    # вместо списка всех различных цен (SELECT DISTINCT по всей таблице) — корзины фасетов,
+    # каждая выбирается диапазоном по индексу price
+    title = 'price'
+    parameter_name = 'price_range'
+
+    def lookups(self, request, model_admin):
+        return [(str(index), price_bucket_label(index)) for index in range(len(PRICE_BUCKETS))]
+
+    def queryset(self, request, queryset):
+        # значение приходит из адреса как есть: неизвестная корзина — без фильтра, а не 500
+        if self.value() not in dict(self.lookup_choices):
+            return queryset
+        index = int(self.value())
+        queryset = queryset.filter(price__gte=PRICE_BUCKETS[index])
+        if index + 1 < len(PRICE_BUCKETS):
+            queryset = queryset.filter(price__lt=PRICE_BUCKETS[index + 1])
+        return queryset
+
 class ProductAdmin(admin.ModelAdmin):
     inlines = [ReviewInline]
     search_fields = ['title']
-    list_filter = ['price', 'category']
+    list_filter = [PriceRangeFilter, 'category']
     list_display = ['title', 'price', 'category']
     list_editable = ['price']
+    list_select_related = ['category']
+    show_full_result_count = False  # без второго COUNT(*) по всей таблице при фильтрах и поиске
+
+    def get_search_results(self, request, queryset, search_term):
+        # UPPER(title) LIKE '%...%' читает всю таблицу; поиск API идёт по индексам
+        if not search_term.strip():
+            return queryset, False
+        return search_products(queryset, search_term.strip())[0], False
 
 admin.site.register(Category)
 admin.site.register(Product, ProductAdmin)
@@ -0,0 +1,87 @@
+from django.db import connection
+from django.db.models import Count, F, FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, Now, NullIf
+
+from .models import Category, CategoryStats, Product, Review
+
+
+def increment_products_count(category_id, delta):
+    if category_id is None or not delta:
+        return
+    Category.objects.filter(id=category_id).update(products_count=F('products_count') + delta,
+                                                   updated_at=Now(), version=F('version') + 1)
+
+
+def refresh_products_count(category_ids=None):
+    """Пересчитывает products_count одним UPDATE, исправляя расхождения после bulk-операций."""
+    actual = (Product.objects
+              .filter(category=OuterRef('pk'))
+              .order_by()
+              .values('category')
+              .annotate(total=Count('id'))
+              .values('total'))
+    categories = Category.objects.all()
+    if category_ids is not None:
+        categories = categories.filter(id__in=category_ids)
+    return (categories
+            .exclude(products_count=Coalesce(Subquery(actual), 0))
+            .update(products_count=Coalesce(Subquery(actual), 0), updated_at=Now(), version=F('version') + 1))
+
+
+def _rating_expression(stars_delta):
+    # Postgres вычисляет все выражения SET по старой строке, поэтому дельты добавляются явно
+    stars_sum = sum(F(f'stars_{i}') * i for i in range(1, 6)) + sum(i * d for i, d in stars_delta.items())
+    reviews_count = F('reviews_count') + sum(stars_delta.values())
+    return Cast(stars_sum, FloatField()) / NullIf(reviews_count, 0)
+
+
+def apply_rating_delta(product_id, stars_delta):
+    """Атомарно применяет изменения гистограммы {звёзды: +-n} к агрегатам товара."""
+    stars_delta = {stars: delta for stars, delta in stars_delta.items() if delta}
+    if product_id is None or not stars_delta:
+        return
+    updates = {f'stars_{stars}': F(f'stars_{stars}') + delta for stars, delta in stars_delta.items()}
+    updates['reviews_count'] = F('reviews_count') + sum(stars_delta.values())
+    updates['rating'] = _rating_expression(stars_delta)
+    # рейтинг входит в экспорт и ответы API, поэтому его изменение тоже считается изменением товара
+    updates['updated_at'] = Now()
+    updates['version'] = F('version') + 1
+    Product.objects.filter(id=product_id).update(**updates)
+
+
+def refresh_ratings(product_ids=None):
+    """
+    Пересчитывает рейтинг, число отзывов и гистограмму оценок одним UPDATE.
+
+    Обновляются только товары, у которых агрегаты разошлись с отзывами, поэтому
+    их updated_at и version (а с ними ETag) не меняются без реальных изменений.
+    """
+    def reviews(**filters):
+        return (Review.objects
+                .filter(product=OuterRef('pk'), **filters)
+                .order_by()
+                .values('product'))
+
+    def count(**filters):
+        return Coalesce(Subquery(reviews(**filters).annotate(total=Count('id')).values('total')), 0)
+
+    products = Product.objects.all()
+    if product_ids is not None:
+        products = products.filter(id__in=product_ids)
+    counts = {f'stars_{i}': count(stars=i) for i in range(1, 6)}
+    counts['reviews_count'] = count()
+    rating = Subquery(reviews().annotate(
+        avg=Cast(Sum('stars'), FloatField()) / Cast(Count('id'), FloatField())).values('avg'))
+    # exclude с несколькими условиями отбрасывает строки, где совпадают все счётчики сразу
+    return products.exclude(**counts).update(**counts, rating=rating, updated_at=Now(), version=F('version') + 1)
+
+
+def refresh_category_stats():
+    """
+    Пересчитывает материализованное представление статистики категорий.
+
+    CONCURRENTLY строит новые данные рядом и применяет разницу, поэтому чтения
+    во время пересчёта не блокируются и видят прежние строки.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'REFRESH MATERIALIZED VIEW CONCURRENTLY {CategoryStats._meta.db_table}')
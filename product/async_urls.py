@@ -0,0 +1,15 @@
+from django.urls import path
+from .async_views import (
+    product_list,
+    product_detail,
+    category_list,
+    category_detail,
+    product_reviews)
+
+urlpatterns = [
+    path('', product_list),
+    path('<int:id>/', product_detail),
+    path('categories/', category_list),
+    path('categories/<int:id>/', category_detail),
+    path('reviews/', product_reviews),
+]
@@ -0,0 +1,139 @@
+"""
+Асинхронные версии горячих эндпоинтов чтения.
+
+Работают на async ORM Django и не блокируют воркер, пока ждут Postgres.
+Под ASGI (см. docker-compose, профиль asgi) каждый воркер обслуживает
+много одновременных запросов; ответы совпадают по формату с /api/v1/products/.
+"""
+from functools import wraps
+
+from django.http import Http404, JsonResponse
+from rest_framework.exceptions import APIException
+from rest_framework.pagination import _positive_int
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from users.models import CustomUser
+from .fieldsets import fieldset_queryset
+from .filters import filter_products
+from .models import Category, Product
+from .pagination import MAX_PAGE_SIZE, PAGE_SIZE
+from .serializers import CategorySerializer, ProductSerializer, ProductWithReviewsSerializer
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+async def authenticate(request):
+    """JWT-аутентификация без блокирующего запроса: пользователь читается через async ORM."""
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    if header is None:
+        return None
+    raw_token = authentication.get_raw_token(header)
+    if raw_token is None:
+        return None
+    token = authentication.get_validated_token(raw_token)
+    return await CustomUser.objects.filter(id=token[jwt_settings.USER_ID_CLAIM], is_active=True).afirst()
+
+
+def api_view(require_auth=False):
+    """Ошибки DRF и 404 отдаются в том же виде, что и у синхронных APIView."""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return json_response({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+            try:
+                if require_auth:
+                    request.api_user = await authenticate(request)
+                    if request.api_user is None:
+                        return json_response({'detail': 'Authentication credentials were not provided.'},
+                                             status=401)
+                return await view(request, *args, **kwargs)
+            except (InvalidToken, TokenError):
+                return json_response({'detail': 'Given token not valid for any token type'}, status=401)
+            except Http404 as exc:
+                return json_response({'detail': str(exc)}, status=404)
+            except APIException as exc:
+                return json_response(exc.detail, status=exc.status_code)
+        return wrapper
+    return decorator
+
+
+async def paginate(request, queryset):
+    """Аналог CustomPagination в режиме ?page=N."""
+    try:
+        page_size = _positive_int(request.GET['page_size'], strict=True, cutoff=MAX_PAGE_SIZE)
+    except (KeyError, ValueError):
+        page_size = PAGE_SIZE
+    try:
+        page = _positive_int(request.GET.get('page', 1), strict=True)
+    except ValueError:
+        raise Http404('Invalid page.')
+
+    if not queryset.ordered:
+        queryset = queryset.order_by('id')
+    total = await queryset.acount()
+    offset = (page - 1) * page_size
+    if page > 1 and offset >= total:
+        raise Http404('Invalid page.')
+    rows = [row async for row in queryset[offset:offset + page_size]]
+
+    url = request.build_absolute_uri()
+    next_link = replace_query_param(url, 'page', page + 1) if offset + page_size < total else None
+    if page == 1:
+        previous_link = None
+    elif page == 2:
+        previous_link = remove_query_param(url, 'page')
+    else:
+        previous_link = replace_query_param(url, 'page', page - 1)
+    return rows, {'total': total, 'next': next_link, 'previous': previous_link}
+
+
+async def paginated_response(request, queryset, serializer_class):
+    rows, meta = await paginate(request, queryset)
+    meta['results'] = serializer_class(rows, many=True).data
+    return json_response(meta)
+
+
+async def get_or_404(queryset, **lookup):
+    instance = await queryset.filter(**lookup).afirst()
+    if instance is None:
+        raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+    return instance
+
+
+@api_view(require_auth=True)
+async def product_list(request):
+    products = filter_products(Product.objects.select_related('category'), request.GET)
+    return await paginated_response(request, products, ProductSerializer)
+
+
+@api_view()
+async def product_detail(request, id):
+    product = await get_or_404(Product.objects.select_related('category'), id=id)
+    return json_response(ProductSerializer(product).data)
+
+
+@api_view()
+async def category_list(request):
+    return await paginated_response(request, Category.objects.all(), CategorySerializer)
+
+
+@api_view()
+async def category_detail(request, id):
+    category = await get_or_404(Category.objects.all(), id=id)
+    return json_response(CategorySerializer(category).data)
+
+
+@api_view()
+async def product_reviews(request):
+    # те же колонки и не больше EMBEDDED_REVIEWS последних отзывов на товар, что и у ProductWithReviewsAPIView
+    products = fieldset_queryset(Product.objects.all(), ProductWithReviewsSerializer())
+    return await paginated_response(request, products, ProductWithReviewsSerializer)
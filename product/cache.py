@@ -0,0 +1,184 @@
+import hashlib
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from shop_api.db_router import use_primary
+
+RESPONSE_CACHE_TIMEOUT = 60 * 5
+LOCK_TIMEOUT = 10
+LOCK_WAIT_STEP = 0.05
+LOCK_WAIT_ATTEMPTS = 40
+
+
+def generation_key(model):
+    return f'cache_gen:{model._meta.label_lower}'
+
+
+def changed_at_key(model):
+    return f'cache_gen_at:{model._meta.label_lower}'
+
+
+def get_model_state(models):
+    """
+    Поколения моделей и время последнего изменения любой из них одним запросом к Redis.
+
+    Отсутствующие значения инициализируются: поколение — от времени, чтобы после
+    вытеснения ключа не вернуться к старому поколению, время изменения — текущим
+    моментом (считаем, что модель только что изменилась).
+    """
+    generation_keys = [generation_key(model) for model in models]
+    changed_keys = [changed_at_key(model) for model in models]
+    values = cache.get_many(generation_keys + changed_keys)
+    for key in generation_keys + changed_keys:
+        if key not in values:
+            cache.add(key, time.time_ns() if key in generation_keys else time.time(), timeout=None)
+            values[key] = cache.get(key)
+    return [values[key] for key in generation_keys], max((values[key] for key in changed_keys), default=0.0)
+
+
+def bump_generation(model):
+    key = generation_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+    cache.set(changed_at_key(model), time.time(), timeout=None)
+
+
+def bump_generation_on_commit(model):
+    transaction.on_commit(lambda: bump_generation(model))
+
+
+def response_cache_key(request, generations):
+    params = sorted(request.query_params.lists())
+    raw = f'{request.get_host()}{request.path}?{params}|{generations}'
+    return 'response:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def fresh_reads(changed_at):
+    """
+    Чтения для кэша сразу после записи идут в primary: реплика могла ещё не получить
+    свежую запись, а результат ляжет в кэш до следующего изменения.
+    """
+    if settings.REPLICA_DATABASES and time.time() - changed_at < settings.REPLICA_MAX_LAG_SECONDS:
+        return use_primary()
+    return nullcontext()
+
+
+def cached_response(key, compute, timeout=RESPONSE_CACHE_TIMEOUT):
+    """
+    Возвращает закэшированный ответ или вычисляет его.
+
+    При промахе ответ вычисляет только тот, кто взял блокировку; остальные
+    ждут его результата, а не идут в базу одновременно.
+    """
+    cached = cache.get(key)
+    if cached is not None:
+        return Response(cached)
+
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+        for _ in range(LOCK_WAIT_ATTEMPTS):
+            time.sleep(LOCK_WAIT_STEP)
+            cached = cache.get(key)
+            if cached is not None:
+                return Response(cached)
+        return compute()
+
+    try:
+        response = compute()
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, timeout=timeout)
+        return response
+    finally:
+        cache.delete(lock_key)
+
+
+def row_validators(queryset, pk, key, timeout=RESPONSE_CACHE_TIMEOUT, related=()):
+    """
+    ETag и Last-Modified одной строки по её version и updated_at.
+
+    related — прямые FK, вложенные в ответ (?expand=): их version и updated_at
+    входят в ETag тем же запросом через JOIN, а Last-Modified — самое позднее время.
+
+    Один запрос по первичному ключу; результат кэшируется рядом с ответом и
+    пересчитывается при смене поколения, но ETag меняется, только если изменилась сама строка
+    или вложенные в ответ строки.
+    """
+    validators_key = f'{key}:validators'
+    validators = cache.get(validators_key)
+    if validators is None:
+        columns = ['version', 'updated_at']
+        for name in related:
+            columns.extend((f'{name}__version', f'{name}__updated_at'))
+        row = queryset.filter(pk=pk).values_list(*columns).first()
+        if row is None:
+            return None, None
+        parts, last_modified = [str(pk)], 0.0
+        for version, updated_at in zip(row[::2], row[1::2]):
+            if updated_at is None:  # пустой nullable FK
+                parts.append('-')
+                continue
+            parts.append(f'{version}.{int(updated_at.timestamp() * 1_000_000)}')
+            last_modified = max(last_modified, updated_at.timestamp())
+        validators = ('.'.join(parts), last_modified)
+        cache.set(validators_key, validators, timeout=timeout)
+    return validators
+
+
+class CachedResponseMixin:
+    """
+    Кэширует GET-ответы в Redis по пути, параметрам запроса и поколениям моделей.
+
+    Запись в любую из cache_models увеличивает её поколение, и старые ключи
+    просто перестают использоваться, без поиска и удаления.
+
+    Ответы получают ETag и Last-Modified, а запросы с If-None-Match/If-Modified-Since
+    при совпадении получают 304 без обращения к кэшу ответа и сериализации.
+    """
+    cache_models = ()
+    cache_timeout = RESPONSE_CACHE_TIMEOUT
+
+    def get_validators(self, request, key, changed_at, *args, **kwargs):
+        """
+        (etag, last_modified) ответа. По умолчанию — по поколениям cache_models,
+        что подходит для списков; детальные представления уточняют по строке.
+        """
+        return key.split(':', 1)[1], changed_at
+
+    def get(self, request, *args, **kwargs):
+        generations, changed_at = get_model_state(self.cache_models)
+        key = response_cache_key(request, generations)
+
+        with fresh_reads(changed_at):
+            etag, last_modified = self.get_validators(request, key, changed_at, *args, **kwargs)
+        headers = {}
+        if etag is not None:
+            headers['ETag'] = quote_etag(etag)
+        if last_modified is not None:
+            headers['Last-Modified'] = http_date(int(last_modified))
+
+        not_modified = get_conditional_response(
+            request, etag=headers.get('ETag'), last_modified=int(last_modified) if last_modified else None)
+        if not_modified is not None:
+            for name, value in headers.items():
+                not_modified[name] = value
+            return not_modified
+
+        def compute():
+            with fresh_reads(changed_at):
+                return super(CachedResponseMixin, self).get(request, *args, **kwargs)
+
+        response = cached_response(key, compute, timeout=self.cache_timeout)
+        if response.status_code == status.HTTP_200_OK:
+            for name, value in headers.items():
+                response[name] = value
+        return response
@@ -0,0 +1,46 @@
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+EXPORT_CHUNK_SIZE = 2000
+
+BASE_FIELDS = ['id', 'title', 'description', 'price', 'category', 'owner', 'updated_at']
+CATEGORY_FIELDS = ['category__name']
+RATING_FIELDS = ['rating', 'reviews_count', 'stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5']
+
+
+def export_fields(include_category, include_rating):
+    fields = list(BASE_FIELDS)
+    if include_category:
+        fields += CATEGORY_FIELDS
+    if include_rating:
+        fields += RATING_FIELDS
+    return fields
+
+
+def export_rows(queryset, fields):
+    """Строки каталога через серверный курсор: память не растёт с размером таблицы."""
+    return queryset.order_by('id').values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def column_names(fields):
+    return [field.replace('__', '_') for field in fields]
+
+
+def ndjson_lines(rows, fields):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    names = column_names(fields)
+    for row in rows:
+        yield encoder.encode(dict(zip(names, row))) + '\n'
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows, fields):
+    writer = csv.writer(Echo())
+    yield writer.writerow(column_names(fields))
+    for row in rows:
+        yield writer.writerow(row)
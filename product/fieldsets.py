@@ -0,0 +1,104 @@
+"""
+?fields= и ?expand= для эндпоинтов товаров.
+
+    /api/v1/products/?fields=id,title,price
+    /api/v1/products/12/?expand=category
+
+Параметры определяют не только состав ответа, но и запрос к базе: выбираются
+только колонки нужных полей (only()), а связи присоединяются (select_related)
+или подгружаются (prefetch_related), только если попадают в ответ.
+"""
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import BaseSerializer
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def split_param(request, name):
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def parse_fieldset(request, serializer_class):
+    """(fields, expand) из параметров запроса; неизвестные имена — ошибка 400."""
+    fields = split_param(request, 'fields') or None
+    expand = split_param(request, 'expand') or []
+    available = serializer_class.Meta.fields
+    errors = {}
+    unknown = [name for name in fields or () if name not in available]
+    if unknown:
+        errors['fields'] = f'Неизвестные поля: {", ".join(unknown)}. Доступны: {", ".join(available)}.'
+    unknown = [name for name in expand if name not in serializer_class.expandable_fields]
+    if unknown:
+        expandable = ', '.join(serializer_class.expandable_fields) or 'нет'
+        errors['expand'] = f'Нельзя раскрыть: {", ".join(unknown)}. Доступны: {expandable}.'
+    if errors:
+        raise ValidationError(errors)
+    return fields, set(expand)
+
+
+def model_columns(serializer):
+    concrete = {field.name for field in serializer.Meta.model._meta.concrete_fields}
+    columns = {serializer.Meta.model._meta.pk.name}
+    for name, field in serializer.fields.items():
+        if name in getattr(serializer, 'field_columns', {}):
+            columns.update(serializer.field_columns[name])
+        elif field.source in concrete:
+            columns.add(field.source)
+    return columns
+
+
+def top_per_parent(queryset, fk, limit, ordering):
+    """Первые limit строк каждого родителя: ROW_NUMBER() OVER (PARTITION BY fk ORDER BY ordering)."""
+    return (queryset
+            .annotate(position=Window(RowNumber(), partition_by=F(fk), order_by=ordering))
+            .filter(position__lte=limit)
+            .order_by(*ordering))
+
+
+def fieldset_queryset(queryset, serializer):
+    """Ограничивает queryset колонками и связями, которые нужны полям serializer."""
+    model = queryset.model
+    columns = model_columns(serializer)
+    for name, field in serializer.fields.items():
+        if not isinstance(field, BaseSerializer):
+            continue
+        nested = getattr(field, 'child', field)
+        relation = model._meta.get_field(field.source)
+        if relation.concrete:
+            # прямой FK: одна таблица в JOIN и только колонки вложенного сериализатора
+            queryset = queryset.select_related(field.source)
+            columns.add(field.source)
+            columns.update(f'{field.source}__{column}' for column in model_columns(nested))
+        else:
+            # обратная связь: отдельный запрос на все строки страницы
+            related = nested.Meta.model.objects.only(*model_columns(nested), relation.field.name)
+            if name in getattr(serializer, 'embedded_limits', {}):
+                related = top_per_parent(related, relation.field.name, *serializer.embedded_limits[name])
+            queryset = queryset.prefetch_related(Prefetch(field.source, queryset=related))
+    return queryset.only(*columns)
+
+
+class SparseFieldsMixin:
+    """Применяет ?fields= и ?expand= к чтению в generic-представлениях товаров."""
+
+    def get_fieldset(self):
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = parse_fieldset(self.request, self.get_serializer_class())
+        return self._fieldset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.method in SAFE_METHODS:
+            context['fields'], context['expand'] = self.get_fieldset()
+        return context
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method in SAFE_METHODS:
+            queryset = fieldset_queryset(queryset, self.get_serializer())
+        return queryset
@@ -0,0 +1,122 @@
+import math
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.postgres.search import SearchQuery
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, JSONObject
+from rest_framework.exceptions import ValidationError
+
+from .models import SEARCH_CONFIG
+
+# границы ценовых корзин для фасетов: [0, 10), [10, 50), ..., [500, ∞)
+PRICE_BUCKETS = (0, 10, 50, 100, 500)
+
+
+def _parse(params, name, cast):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        result = cast(value)
+        # NaN и Infinity проходят Decimal()/float(), но не имеют смысла как границы фильтра
+        if isinstance(result, (Decimal, float)) and not math.isfinite(result):
+            raise ValueError(value)
+        return result
+    except (TypeError, ValueError, InvalidOperation):
+        raise ValidationError({name: 'Некорректное значение.'})
+
+
+def _id_list(value):
+    return [int(item) for item in value.split(',') if item]
+
+
+def filter_products(queryset, params):
+    """Фильтры списка товаров: category=1,2&min_price=&max_price=&min_rating=&owner=."""
+    categories = _parse(params, 'category', _id_list)
+    min_price = _parse(params, 'min_price', Decimal)
+    max_price = _parse(params, 'max_price', Decimal)
+    min_rating = _parse(params, 'min_rating', float)
+    owner = _parse(params, 'owner', int)
+
+    if categories:
+        queryset = queryset.filter(category_id__in=categories)
+    if min_price is not None:
+        queryset = queryset.filter(price__gte=min_price)
+    if max_price is not None:
+        queryset = queryset.filter(price__lte=max_price)
+    if min_rating is not None:
+        queryset = queryset.filter(rating__gte=min_rating)
+    if owner is not None:
+        queryset = queryset.filter(owner_id=owner)
+    return queryset
+
+
+def search_products(queryset, text):
+    """
+    Товары, совпавшие с текстом: полнотекстово по GIN-индексу search_vector или
+    с опечаткой в названии по триграммному индексу. Возвращает (queryset, SearchQuery).
+    """
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.filter(Q(search_vector=query) | Q(title__trigram_similar=text)), query
+
+
+def price_bucket_label(index):
+    low = PRICE_BUCKETS[index]
+    if index + 1 < len(PRICE_BUCKETS):
+        return f'{low}-{PRICE_BUCKETS[index + 1]}'
+    return f'{low}+'
+
+
+def product_facets(queryset):
+    """Число товаров по категориям и ценовым корзинам одним GROUP BY запросом."""
+    bucket = Case(
+        *[When(price__lt=PRICE_BUCKETS[i + 1], then=Value(i)) for i in range(len(PRICE_BUCKETS) - 1)],
+        default=Value(len(PRICE_BUCKETS) - 1),
+    )
+    rows = (queryset
+            .order_by()
+            .annotate(bucket=bucket)
+            .values('category', 'category__name', 'bucket')
+            .annotate(count=Count('id')))
+
+    categories = {}
+    prices = {price_bucket_label(i): 0 for i in range(len(PRICE_BUCKETS))}
+    for row in rows:
+        category = categories.setdefault(row['category'], {
+            'id': row['category'], 'name': row['category__name'], 'count': 0})
+        category['count'] += row['count']
+        prices[price_bucket_label(row['bucket'])] += row['count']
+
+    return {
+        'categories': sorted(categories.values(), key=lambda item: -item['count']),
+        'price': [{'range': label, 'count': count} for label, count in prices.items()],
+    }
+
+
+def owner_totals(queryset):
+    """
+    Итоги по товарам владельца одной строкой: число товаров, отзывов и сумма
+    оценок (rating * reviews_count) для средневзвешенного рейтинга. Используется
+    как некоррелированный подзапрос — Postgres считает его один раз (InitPlan).
+    """
+    return (queryset
+            .order_by()
+            .values('owner')
+            .annotate(totals=JSONObject(
+                products=Count('id'),
+                reviews=Coalesce(Sum('reviews_count'), 0),
+                stars=Sum(F('rating') * F('reviews_count')),
+            ))
+            .values('totals'))
+
+
+def totals_summary(totals):
+    """Итоги из owner_totals() для ответа: средний рейтинг взвешен по числу отзывов."""
+    if not totals:
+        return {'products': 0, 'reviews': 0, 'rating': None}
+    reviews = totals['reviews']
+    return {
+        'products': totals['products'],
+        'reviews': reviews,
+        'rating': round(totals['stars'] / reviews, 2) if reviews else None,
+    }
@@ -0,0 +1,201 @@
+import csv
+import io
+import json
+import os
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DatabaseError, connection, transaction
+
+from product.aggregates import refresh_products_count, refresh_ratings
+from product.cache import bump_generation
+from product.models import Category, Product, Review
+
+DEFAULT_CHUNK_SIZE = 50000
+
+
+def read_records(path):
+    """Построчно читает CSV (с заголовком) или JSONL, не загружая файл в память."""
+    with open(path, encoding='utf-8', newline='') as file:
+        if path.endswith('.jsonl') or path.endswith('.ndjson'):
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(file)
+
+
+def file_identity(path):
+    """Путь, размер и время изменения: --resume продолжает только тот же файл."""
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def copy_rows(table, columns, rows):
+    """Загружает строки одним COPY ... FROM STDIN."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    sql = f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)'
+    # ошибки драйвера при COPY -> исключения django.db, как у обычных запросов
+    with connection.cursor() as cursor, connection.wrap_database_errors:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):  # psycopg2
+            raw.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+class Command(BaseCommand):
+    help = 'Быстрая загрузка категорий, товаров и отзывов из CSV/JSONL через COPY'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', help='файл с колонкой name')
+        parser.add_argument('--products', help='файл с колонками [id], title, description, price, category, [owner]; '
+                                               'category — название категории')
+        parser.add_argument('--reviews', help='файл с колонками text, stars, product (id товара)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--checkpoint', help='файл прогресса (по умолчанию import_catalog.checkpoint)',
+                            default='import_catalog.checkpoint')
+        parser.add_argument('--resume', action='store_true', help='продолжить с последнего успешного чанка тех же файлов')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Импорт через COPY поддерживается только для PostgreSQL.')
+        if not any(options[name] for name in ('categories', 'products', 'reviews')):
+            raise CommandError('Укажите хотя бы один из файлов: --categories, --products, --reviews.')
+
+        self.chunk_size = options['chunk_size']
+        self.checkpoint_path = options['checkpoint']
+        self.progress = self.load_checkpoint() if options['resume'] else {}
+        self.category_ids = {}
+
+        if options['categories']:
+            self.run('categories', options['categories'], self.import_categories)
+        if options['products']:
+            self.category_ids = dict(Category.objects.values_list('name', 'id'))
+            self.run('products', options['products'], self.import_products)
+        if options['reviews']:
+            self.run('reviews', options['reviews'], self.import_reviews)
+
+        self.rebuild_derived_data(reviews_loaded=bool(options['reviews']))
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    # --- прогресс ---
+
+    def load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return {}
+        with open(self.checkpoint_path) as file:
+            return json.load(file)
+
+    def save_checkpoint(self):
+        with open(self.checkpoint_path, 'w') as file:
+            json.dump(self.progress, file)
+
+    def run(self, entity, path, import_chunk):
+        done = 0
+        if entity in self.progress:
+            saved = self.progress[entity]
+            if not isinstance(saved, dict):  # прогресс, записанный без данных о файле
+                saved = {'file': None, 'done': saved}
+            if saved['file'] != file_identity(path):
+                raise CommandError(f'{entity}: файл прогресса {self.checkpoint_path} записан для другого файла '
+                                   f'или другой его версии (загружено записей: {saved["done"]}). '
+                                   f'Удалите файл прогресса и загрузите только оставшиеся записи')
+            done = saved['done']
+        records = islice(read_records(path), done, None)
+        for chunk in chunked(records, self.chunk_size):
+            last_line = done + len(chunk)
+            try:
+                with transaction.atomic():
+                    with connection.cursor() as cursor:
+                        # внешние ключи проверяются при COPY, а не при коммите: ошибка относится к своему чанку
+                        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+                    import_chunk(chunk, first_line=done + 1)
+            except DatabaseError as error:
+                message = '; '.join(line.strip() for line in str(error).splitlines() if line.strip())
+                raise CommandError(f'{entity}, записи {done + 1}-{last_line}: {message}. '
+                                   f'Чанк не загружен, предыдущие сохранены в файле прогресса')
+            done = last_line
+            self.progress[entity] = {'file': file_identity(path), 'done': done}
+            self.save_checkpoint()
+            self.stdout.write(f'{entity}: загружено {done}')
+
+    # --- загрузка ---
+
+    def import_categories(self, chunk, first_line):
+        names = {record['name'].strip() for record in chunk if record.get('name', '').strip()}
+        existing = set(Category.objects.filter(name__in=names).values_list('name', flat=True))
+        copy_rows('product_category', ['name', 'products_count', 'updated_at', 'version'],
+                  [(name, 0, 'now', 1) for name in sorted(names - existing)])
+
+    def resolve_categories(self, names):
+        missing = {name for name in names if name not in self.category_ids}
+        if missing:
+            copy_rows('product_category', ['name', 'products_count', 'updated_at', 'version'],
+                      [(name, 0, 'now', 1) for name in sorted(missing)])
+            self.category_ids.update(Category.objects.filter(name__in=missing).values_list('name', 'id'))
+
+    def import_products(self, chunk, first_line):
+        self.resolve_categories({str(record.get('category') or '').strip() for record in chunk} - {''})
+        with_ids = 'id' in chunk[0]
+        columns = ['title', 'description', 'price', 'category_id', 'owner_id', 'updated_at', 'version',
+                   'reviews_count', 'stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5']
+        if with_ids:
+            columns = ['id'] + columns
+
+        rows = []
+        for line, record in enumerate(chunk, start=first_line):
+            title = str(record.get('title') or '').strip()
+            category = str(record.get('category') or '').strip()
+            try:
+                price = Decimal(str(record.get('price')))
+            except InvalidOperation:
+                raise CommandError(f'products, запись {line}: некорректная цена {record.get("price")!r}')
+            if not title or not category:
+                raise CommandError(f'products, запись {line}: title и category обязательны')
+            row = [title, record.get('description') or None, price, self.category_ids[category],
+                   record.get('owner') or None, 'now', 1, 0, 0, 0, 0, 0, 0]
+            rows.append([record['id']] + row if with_ids else row)
+        copy_rows('product_product', columns, rows)
+
+    def import_reviews(self, chunk, first_line):
+        rows = []
+        for line, record in enumerate(chunk, start=first_line):
+            try:
+                stars = int(record.get('stars'))
+                product_id = int(record.get('product'))
+            except (TypeError, ValueError):
+                raise CommandError(f'reviews, запись {line}: stars и product должны быть числами')
+            if not 1 <= stars <= 5:
+                raise CommandError(f'reviews, запись {line}: stars должно быть от 1 до 5')
+            rows.append([record.get('text') or None, product_id, stars, 'now', 1])
+        copy_rows('product_review', ['text', 'product_id', 'stars', 'updated_at', 'version'], rows)
+
+    # --- производные данные ---
+
+    def rebuild_derived_data(self, reviews_loaded):
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Category, Product, Review]):
+                cursor.execute(sql)
+        # search_vector заполняется триггером при COPY; счётчики и рейтинги пересчитываются целиком
+        fixed = refresh_products_count()
+        rated = refresh_ratings() if reviews_loaded else 0
+        for model in (Category, Product, Review):
+            bump_generation(model)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: счётчики исправлены в {fixed} категориях, рейтинги пересчитаны для {rated} товаров'))
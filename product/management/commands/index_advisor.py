@@ -0,0 +1,277 @@
+import json
+import re
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve
+from rest_framework.test import APIClient
+
+from product.models import Category, Product, Review
+from users.models import CustomUser
+
+DEFAULT_MIN_ROWS = 10000
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# условие из Filter/Index Cond плана: (price >= 100.00), (category_id = ANY (...)), (rating IS NOT NULL)
+CONDITION = re.compile(r'(?<![:\w.])(\w+)\s+(IS NOT NULL|IS NULL|=|>=|<=|>|<)')
+SORT_KEY = re.compile(r'^(?:\w+\.)?(\w+)(?:\s+(?:DESC|ASC))?(?:\s+NULLS\s+\w+)?$')
+
+
+def plan_nodes(node, parent=None):
+    yield node, parent
+    for child in node.get('Plans', ()):
+        yield from plan_nodes(child, node)
+
+
+def scan_below(node):
+    """Ближайший узел чтения таблицы под node (для Sort — откуда пришли сортируемые строки)."""
+    for child, _ in plan_nodes(node):
+        if 'Relation Name' in child:
+            return child
+    return None
+
+
+def conditions(node):
+    text = ' '.join(node.get(key, '') for key in ('Filter', 'Index Cond', 'Recheck Cond'))
+    return CONDITION.findall(text)
+
+
+def propose(scan, sort=None):
+    """
+    (таблица, колонки, условие частичного индекса) для узла плана.
+
+    Порядок колонок: сначала равенства, затем ключи сортировки или, если
+    сортировки нет, диапазоны. IS [NOT] NULL уходит в WHERE частичного индекса.
+    """
+    equal, ranges, predicate = [], [], []
+    for column, operator in conditions(scan):
+        if operator == '=':
+            equal.append(column)
+        elif operator.startswith('IS'):
+            predicate.append(f'{column} {operator}')
+        else:
+            ranges.append(column)
+    tail = ranges
+    if sort is not None:
+        tail = []
+        for key in sort.get('Sort Key', ()):
+            match = SORT_KEY.match(key)
+            if match is None:
+                return None  # сортировка по выражению — обычный индекс не поможет
+            tail.append(match.group(1))
+    columns = list(dict.fromkeys(equal + tail))
+    if not columns:
+        return None
+    return scan['Relation Name'], tuple(columns), ' AND '.join(sorted(set(predicate))) or None
+
+
+class Command(BaseCommand):
+    help = ('Повторяет запросы эндпоинтов API и списков админки, выполняет для них EXPLAIN (ANALYZE, BUFFERS), '
+            'отмечает последовательные чтения и сортировки больших таблиц и предлагает индексы')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-rows', type=int, default=DEFAULT_MIN_ROWS,
+                            help='таблицы и сортировки меньше этого числа строк не считаются проблемой')
+        parser.add_argument('--only', nargs='+', metavar='ИМЯ', help='только сценарии, содержащие эти подстроки')
+        parser.add_argument('--plans', action='store_true', help='печатать планы отмеченных запросов целиком')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('EXPLAIN (ANALYZE, BUFFERS) поддерживается только для PostgreSQL.')
+        self.min_rows = options['min_rows']
+        self.show_plans = options['plans']
+        self.table_rows = self.load_table_rows()
+        self.proposals = {}
+
+        scenarios = self.scenarios()
+        if options['only']:
+            scenarios = [(name, make) for name, make in scenarios if any(part in name for part in options['only'])]
+
+        # запросы должны дойти до базы: ни кэша ответов, ни реплик, ни бюджета запросов
+        with override_settings(CACHES=LOCMEM_CACHE, REPLICA_DATABASES=[], QUERY_BUDGET_MODE='off',
+                               ALLOWED_HOSTS=['*']):
+            for name, make_request in scenarios:
+                self.run_scenario(name, make_request)
+        self.report()
+
+    # --- сценарии ---
+
+    def scenarios(self):
+        # пользователь только в памяти: команда ничего не пишет в базу
+        user = CustomUser(id=0, email='index-advisor@localhost', is_active=True, is_staff=True, is_superuser=True)
+        self.api = APIClient()
+        self.api.force_authenticate(user)
+        self.factory = RequestFactory()
+        self.user = user
+
+        # самая большая категория (категорий немного) и товар последнего отзыва (по первичному ключу),
+        # чтобы сама подготовка не читала большие таблицы целиком
+        category = Category.objects.order_by('-products_count').values_list('id', flat=True).first()
+        product = Review.objects.order_by('-id').values_list('product_id', flat=True).first()
+        if category is None or product is None:
+            raise CommandError('Каталог пуст: заполните базу, например manage.py seed.')
+        owner = Product.objects.filter(id=product).values_list('owner_id', flat=True).first()
+
+        api = '/api/v1/products/'
+        return [
+            ('api: товары, первая страница', self.get(f'{api}')),
+            ('api: товары, далёкая страница', self.get(f'{api}?page=200')),
+            ('api: товары категории', self.get(f'{api}?category={category}')),
+            ('api: товары по цене', self.get(f'{api}?min_price=100&max_price=200')),
+            ('api: товары по рейтингу', self.get(f'{api}?min_rating=4.5')),
+            ('api: товары, курсор по цене', self.get(f'{api}?cursor=&ordering=-price')),
+            ('api: товары категории, курсор по цене', self.get(f'{api}?cursor=&ordering=price&category={category}')),
+            ('api: товары с фасетами', self.get(f'{api}?category={category}&facets=1')),
+            ('api: товар', self.get(f'{api}{product}/?expand=category')),
+            ('api: поиск', self.get(f'{api}search/?q=чайник')),
+            ('api: категории', self.get(f'{api}categories/')),
+            ('api: товары с отзывами', self.get(f'{api}reviews/')),
+            ('api: товары с отзывами, курсор по цене', self.get(f'{api}reviews/?cursor=&ordering=-price')),
+            ('api: отзывы товара', self.get(f'{api}{product}/reviews/')),
+            ('api: отзывы товара по оценке', self.get(f'{api}{product}/reviews/?ordering=-stars')),
+            ('api: мои товары', self.get(f'{api}mine/', user=CustomUser(id=owner or 0, is_active=True))),
+            ('api: аналитика категорий', self.get(f'{api}analytics/categories/?ordering=-reviews_count')),
+            ('api: аналитика категории', self.get(f'{api}analytics/categories/{category}/')),
+            ('admin: товары', self.admin('/admin/product/product/')),
+            ('admin: товары категории', self.admin(f'/admin/product/product/?category__id__exact={category}')),
+            ('admin: товары по цене', self.admin('/admin/product/product/?price_range=3')),
+            ('admin: поиск товаров', self.admin('/admin/product/product/?q=чайник')),
+            ('admin: товар с отзывами', self.admin(f'/admin/product/product/{product}/change/')),
+            ('admin: категории', self.admin('/admin/product/category/')),
+            ('admin: пользователи', self.admin('/admin/users/customuser/')),
+        ]
+
+    def get(self, path, user=None):
+        if user is None:
+            return lambda: self.api.get(path)
+        client = APIClient()
+        client.force_authenticate(user)
+        return lambda: client.get(path)
+
+    def admin(self, path):
+        def make_request():
+            request = self.factory.get(path)
+            request.user = self.user
+            match = resolve(request.path_info)
+            response = match.func(request, *match.args, **match.kwargs)
+            if hasattr(response, 'render'):
+                response.render()  # запросы шаблона выполняются при рендеринге
+            return response
+        return make_request
+
+    # --- EXPLAIN ---
+
+    def load_table_rows(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relname, reltuples FROM pg_class WHERE relkind IN ('r', 'p', 'm')")
+            return {name: max(int(rows), 0) for name, rows in cursor.fetchall()}
+
+    def explain(self, sql):
+        # ANALYZE выполняет запрос; откат на случай функций с побочными эффектами
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}')
+                plan = cursor.fetchone()[0]
+            transaction.set_rollback(True)
+        return plan[0] if isinstance(plan, list) else json.loads(plan)[0]
+
+    def run_scenario(self, name, make_request):
+        try:
+            with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+                response = make_request()
+                transaction.set_rollback(True)
+        except DatabaseError as error:
+            self.stdout.write(self.style.ERROR(f'{name}: ошибка базы: {error}'.strip()))
+            return
+        status = getattr(response, 'status_code', '?')
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{name} — HTTP {status}, запросов: {len(queries)}'))
+
+        seen = set()
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith(('SELECT', 'WITH')) or sql in seen:
+                continue
+            seen.add(sql)
+            try:
+                plan = self.explain(sql)
+            except DatabaseError as error:
+                self.stdout.write(self.style.ERROR(f'  EXPLAIN не выполнен: {error}'.strip()))
+                continue
+            problems = self.problems(plan['Plan'], name)
+            if not problems:
+                continue
+            self.stdout.write(f'  {plan["Execution Time"]:.1f} мс  {sql[:160]}')
+            for problem in problems:
+                self.stdout.write(self.style.WARNING(f'    - {problem}'))
+            if self.show_plans:
+                self.stdout.write(json.dumps(plan['Plan'], ensure_ascii=False, indent=2))
+
+    def problems(self, root, scenario):
+        found = []
+        for node, parent in plan_nodes(root):
+            node_type = node['Node Type']
+            if node_type == 'Seq Scan':
+                table = node['Relation Name']
+                if self.table_rows.get(table, 0) < self.min_rows:
+                    continue
+                found.append(f'Seq Scan {table} (~{self.table_rows[table]} строк), '
+                             f'отброшено фильтром: {node.get("Rows Removed by Filter", 0)}')
+                # сортировка над этим чтением даёт лучшее предложение, чем один фильтр
+                if parent is None or parent['Node Type'] not in ('Sort', 'Incremental Sort'):
+                    self.add_proposal(propose(node), scenario)
+            elif node_type in ('Sort', 'Incremental Sort'):
+                source = node['Plans'][0]
+                rows = source.get('Actual Rows', 0) * source.get('Actual Loops', 1)
+                if rows < self.min_rows:
+                    continue
+                found.append(f'{node_type} {rows} строк по {", ".join(node.get("Sort Key", ()))} '
+                             f'({node.get("Sort Method", "?")}, {node.get("Sort Space Type", "?")})')
+                scan = scan_below(node)
+                if scan is not None:
+                    self.add_proposal(propose(scan, node), scenario)
+        return found
+
+    def add_proposal(self, proposal, scenario):
+        if proposal is None or self.covered(*proposal):
+            return
+        self.proposals.setdefault(proposal, []).append(scenario)
+
+    def covered(self, table, columns, predicate):
+        """Уже есть индекс, который начинается с этих колонок."""
+        if not hasattr(self, '_indexes'):
+            self._indexes = {}
+        if table not in self._indexes:
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(cursor, table)
+            self._indexes[table] = [tuple(info['columns']) for info in constraints.values() if info['index']]
+        return any(index[:len(columns)] == columns for index in self._indexes[table])
+
+    # --- отчёт ---
+
+    def report(self):
+        self.stdout.write('')
+        if not self.proposals:
+            self.stdout.write(self.style.SUCCESS('Подходящие индексы уже есть для всех проверенных запросов.'))
+            return
+        # индекс (a) не нужен, если предложен и (a, b): первый покрывается вторым
+        proposals = {}
+        for proposal, scenarios in self.proposals.items():
+            table, columns, predicate = proposal
+            wider = next((other for other in self.proposals if other != proposal and other[0] == table
+                          and other[2] == predicate and other[1][:len(columns)] == columns), None)
+            proposals.setdefault(wider or proposal, []).extend(scenarios)
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Предлагаемые индексы:'))
+        models = {model._meta.db_table: model for model in apps.get_models()}
+        for (table, columns, predicate), scenarios in proposals.items():
+            name = f'{table}_{"_".join(columns)}_idx'[:63]
+            where = f' WHERE {predicate}' if predicate else ''
+            self.stdout.write(f'CREATE INDEX CONCURRENTLY {name} ON {table} ({", ".join(columns)}){where};')
+            model = models.get(table)
+            if model is not None:
+                fields = {field.column: field.name for field in model._meta.concrete_fields}
+                self.stdout.write(f'  {model.__name__}: models.Index(fields={[fields.get(c, c) for c in columns]})')
+            self.stdout.write(f'  нужен для: {"; ".join(dict.fromkeys(scenarios))}')
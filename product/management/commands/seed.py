@@ -0,0 +1,159 @@
+import datetime
+import random
+import time
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from product.aggregates import increment_products_count, refresh_category_stats
+from product.cache import bump_generation
+from product.management.commands.import_catalog import copy_rows
+from product.models import Category, CategoryStats, Product, Review
+from users.models import CustomUser
+
+SIZE_PRESETS = {
+    '10k': {'products': 10_000, 'users': 500, 'categories': 20},
+    '1m': {'products': 1_000_000, 'users': 20_000, 'categories': 200},
+    '10m': {'products': 10_000_000, 'users': 100_000, 'categories': 1_000},
+}
+DEFAULT_CHUNK_SIZE = 50000
+DEFAULT_PASSWORD = 'seed-password'
+MAX_REVIEWS = 1000
+
+ADJECTIVES = ['Новый', 'Компактный', 'Лёгкий', 'Умный', 'Классический', 'Беспроводной', 'Детский',
+              'Профессиональный', 'Складной', 'Металлический', 'Деревянный', 'Водостойкий']
+NOUNS = ['чайник', 'телефон', 'рюкзак', 'фонарь', 'стул', 'ноутбук', 'кофемолка', 'велосипед', 'зонт',
+         'пылесос', 'наушники', 'часы', 'чемодан', 'блендер', 'утюг', 'микроволновка']
+REVIEW_TEXTS = ['Отличный товар', 'Соответствует описанию', 'Быстрая доставка', 'Могло быть лучше',
+                'Не понравилось', 'Рекомендую', 'Качество среднее', None]
+
+
+def zipf_cum_weights(n, exponent):
+    """Накопленные веса рангового распределения: первые элементы выбираются намного чаще."""
+    return list(accumulate(1 / rank ** exponent for rank in range(1, n + 1)))
+
+
+class Command(BaseCommand):
+    help = ('Генерирует синтетический каталог для нагрузочных тестов: пользователи, категории, товары и отзывы '
+            'с неравномерными распределениями, загрузка через COPY')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=SIZE_PRESETS, default='10k', help='пресет размера каталога')
+        parser.add_argument('--products', type=int, help='число товаров (переопределяет пресет)')
+        parser.add_argument('--users', type=int, help='число владельцев товаров')
+        parser.add_argument('--categories', type=int, help='число категорий')
+        parser.add_argument('--seed', type=int, default=1, help='зерно генератора: одинаковое зерно — одинаковые данные')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--password', default=DEFAULT_PASSWORD, help='пароль всех созданных пользователей')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Генерация через COPY поддерживается только для PostgreSQL.')
+        sizes = {name: options[name] if options[name] is not None else value
+                 for name, value in SIZE_PRESETS[options['size']].items()}
+        if min(sizes.values()) < 1:
+            raise CommandError('Числа товаров, пользователей и категорий должны быть положительными.')
+
+        self.rnd = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        started = time.monotonic()
+
+        with transaction.atomic():
+            user_ids = self.create_users(sizes['users'], options['password'])
+            category_ids = self.create_categories(sizes['categories'])
+        products_per_category = self.create_products(sizes['products'], category_ids, user_ids)
+
+        # счётчики категорий одним UPDATE на категорию вместо пересчёта по всей таблице товаров
+        for category_id, count in products_per_category.items():
+            increment_products_count(category_id, count)
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [CustomUser, Category, Product, Review]):
+                cursor.execute(sql)
+            # свежая статистика для планировщика и оценок числа строк в пагинации
+            for model in (CustomUser, Category, Product, Review):
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+        refresh_category_stats()
+        for model in (Category, CategoryStats, Product, Review):
+            bump_generation(model)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.0f} с: {sizes["users"]} пользователей, '
+            f'{sizes["categories"]} категорий, {sizes["products"]} товаров, {self.reviews_total} отзывов'))
+
+    def next_id(self, model):
+        return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+    def create_users(self, count, password):
+        first_id = self.next_id(CustomUser)
+        password_hash = make_password(password)  # хэширование дорогое, поэтому один хэш на всех
+        rows = []
+        for user_id in range(first_id, first_id + count):
+            birthday = datetime.date(1950, 1, 1) + datetime.timedelta(days=self.rnd.randint(0, 365 * 55))
+            rows.append([user_id, password_hash, False, f'seed-{user_id}@example.com', True, False, birthday])
+        for start in range(0, len(rows), self.chunk_size):
+            copy_rows(CustomUser._meta.db_table,
+                      ['id', 'password', 'is_superuser', 'email', 'is_active', 'is_staff', 'birthday'],
+                      rows[start:start + self.chunk_size])
+        self.stdout.write(f'users: {count}')
+        return list(range(first_id, first_id + count))
+
+    def create_categories(self, count):
+        first_id = self.next_id(Category)
+        ids = list(range(first_id, first_id + count))
+        copy_rows(Category._meta.db_table, ['id', 'name', 'products_count', 'updated_at', 'version'],
+                  [(category_id, f'Категория {category_id}', 0, 'now', 1) for category_id in ids])
+        self.stdout.write(f'categories: {count}')
+        return ids
+
+    def create_products(self, count, category_ids, user_ids):
+        rnd = self.rnd
+        category_weights = zipf_cum_weights(len(category_ids), 1.1)
+        owner_weights = zipf_cum_weights(len(user_ids), 0.8)
+        products_per_category = dict.fromkeys(category_ids, 0)
+        self.reviews_total = 0
+
+        first_id = self.next_id(Product)
+        for chunk_start in range(first_id, first_id + count, self.chunk_size):
+            product_rows, review_rows = [], []
+            for product_id in range(chunk_start, min(chunk_start + self.chunk_size, first_id + count)):
+                category_id = rnd.choices(category_ids, cum_weights=category_weights)[0]
+                products_per_category[category_id] += 1
+
+                # длинный хвост: у большинства товаров 0-2 отзыва, у немногих — сотни
+                reviews_count = min(int(rnd.paretovariate(1.2)) - 1, MAX_REVIEWS)
+                quality = rnd.uniform(1.5, 5.0)
+                stars = [0] * 5
+                for _ in range(reviews_count):
+                    star = min(5, max(1, round(rnd.gauss(quality, 1.0))))
+                    stars[star - 1] += 1
+                    review_rows.append((rnd.choice(REVIEW_TEXTS), product_id, star, 'now', 1))
+                rating = sum(star * n for star, n in enumerate(stars, start=1)) / reviews_count if reviews_count else None
+
+                product_rows.append((
+                    product_id,
+                    f'{rnd.choice(ADJECTIVES)} {rnd.choice(NOUNS)} {product_id}',
+                    ' '.join(rnd.choices(NOUNS, k=rnd.randint(3, 30))),
+                    f'{min(max(rnd.lognormvariate(4, 1.2), 0.5), 999.99):.2f}',
+                    category_id,
+                    rnd.choices(user_ids, cum_weights=owner_weights)[0],
+                    'now',
+                    1,
+                    rating,
+                    reviews_count,
+                    *stars,
+                ))
+
+            with transaction.atomic():
+                copy_rows(Product._meta.db_table,
+                          ['id', 'title', 'description', 'price', 'category_id', 'owner_id', 'updated_at', 'version',
+                           'rating',
+                           'reviews_count', 'stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5'],
+                          product_rows)
+                copy_rows(Review._meta.db_table, ['text', 'product_id', 'stars', 'updated_at', 'version'], review_rows)
+            self.reviews_total += len(review_rows)
+            self.stdout.write(f'products: {product_rows[-1][0] - first_id + 1}/{count}, reviews: {self.reviews_total}')
+        return products_per_category
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:47
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_products_count(apps, schema_editor):
+    Category = apps.get_model('product', 'Category')
+    Product = apps.get_model('product', 'Product')
+    actual = (Product.objects
+              .filter(category=OuterRef('pk'))
+              .order_by()
+              .values('category')
+              .annotate(total=Count('id'))
+              .values('total'))
+    Category.objects.update(products_count=Coalesce(Subquery(actual), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0002_product_owner'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='products_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_products_count, migrations.RunPython.noop),
+    ]
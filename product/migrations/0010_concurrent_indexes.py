@@ -0,0 +1,26 @@
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE/DROP INDEX CONCURRENTLY не блокирует записи в таблицу, но не работает внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('product', '0009_review_cursor_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(rating__isnull=False), fields=['rating'], name='product_rating_rated_idx'),
+        ),
+        RemoveIndexConcurrently(
+            model_name='product',
+            name='product_rating_idx',
+        ),
+    ]
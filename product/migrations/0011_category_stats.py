@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# оценка категории — по всем её отзывам (гистограммы товаров), а не среднее рейтингов товаров;
+# уникальный индекс нужен для REFRESH MATERIALIZED VIEW CONCURRENTLY и поиска по категории
+CATEGORY_STATS_SQL = """
+CREATE MATERIALIZED VIEW product_category_stats AS
+SELECT c.id AS category_id,
+       c.name,
+       COUNT(p.id) AS products_count,
+       MIN(p.price) AS price_min,
+       MAX(p.price) AS price_max,
+       ROUND(AVG(p.price), 2) AS price_avg,
+       ROUND(SUM(p.stars_1 + 2 * p.stars_2 + 3 * p.stars_3 + 4 * p.stars_4 + 5 * p.stars_5)::numeric
+             / NULLIF(SUM(p.reviews_count), 0), 2)::double precision AS rating,
+       COALESCE(SUM(p.reviews_count), 0) AS reviews_count,
+       now() AS refreshed_at
+FROM product_category c
+LEFT JOIN product_product p ON p.category_id = c.id
+GROUP BY c.id, c.name;
+
+CREATE UNIQUE INDEX product_category_stats_pk ON product_category_stats (category_id);
+"""
+
+DROP_CATEGORY_STATS_SQL = 'DROP MATERIALIZED VIEW IF EXISTS product_category_stats;'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0010_concurrent_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CATEGORY_STATS_SQL, DROP_CATEGORY_STATS_SQL),
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='stats', serialize=False, to='product.category')),
+                ('name', models.CharField(max_length=50)),
+                ('products_count', models.PositiveIntegerField()),
+                ('price_min', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('price_max', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('price_avg', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('rating', models.FloatField(null=True)),
+                ('reviews_count', models.PositiveIntegerField()),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Статистика категории',
+                'verbose_name_plural': 'Статистика категорий',
+                'db_table': 'product_category_stats',
+                'managed': False,
+            },
+        ),
+    ]
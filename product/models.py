@@ -1,8 +1,74 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import F
 from users.models import CustomUser
 
-class Category(models.Model):
+# конфигурация полнотекстового поиска; должна совпадать с триггером из миграции 0005
+SEARCH_CONFIG = 'russian'
+
+
+def CASCADE_WITHOUT_SIGNALS(collector, field, sub_objs, using):
+    """
+    CASCADE одним DELETE без загрузки строк в память.
+
+    У Review есть receivers удаления, и обычный CASCADE из-за них выбирает все
+    отзывы удаляемого товара (категории, владельца) и шлёт сигналы по каждому.
+    Здесь связанные строки удаляются как при fast-delete: сигналы Review для них
+    не отправляются. Агрегаты отзывов живут в самом товаре и удаляются вместе с
+    ним, а кэш списков отзывов зависит и от поколения Product, поэтому ничего не
+    теряется; удаление самих отзывов (Review.delete(), queryset) шлёт сигналы как
+    раньше. Объекты, которые ссылаются на эту модель, так не удаляются.
+    """
+    collector.fast_deletes.append(sub_objs)
+
+
+# Collector передаёт невыполненный queryset вместо списка объектов
+CASCADE_WITHOUT_SIGNALS.lazy_sub_objs = True
+
+
+class VersionedModel(models.Model):
+    """Время и номер последнего изменения строки; по ним строятся ETag и Last-Modified."""
+    updated_at = models.DateTimeField(auto_now=True)
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    def save(self, *args, **kwargs):
+        updating = not self._state.adding and not kwargs.get('force_insert')
+        if updating:
+            # инкремент в самом UPDATE, чтобы параллельные сохранения не получили одну версию
+            self.version = F('version') + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version', 'updated_at'}
+        super().save(*args, **kwargs)
+        if updating:
+            # новое значение известно только базе: поле становится отложенным и перечитается при обращении
+            del self.__dict__['version']
+
+    class Meta:
+        abstract = True
+
+
+class AggregateFieldsModel(models.Model):
+    """Не перезаписывает при save() поля, которые обновляются атомарными F()-апдейтами."""
+    aggregate_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            skip = set(self.aggregate_fields) | self.get_deferred_fields()
+            kwargs['update_fields'] = [f.name for f in self._meta.concrete_fields
+                                       if not f.primary_key and f.name not in skip]
+        super().save(*args, **kwargs)
+
+    class Meta:
+        abstract = True
+
+
+class Category(VersionedModel, AggregateFieldsModel):
     name = models.CharField(max_length=50)
+    products_count = models.PositiveIntegerField(default=0, editable=False)
+
+    aggregate_fields = ('products_count',)
+
     def __str__(self):
         return self.name
 
@@ -10,30 +76,102 @@ class Category(models.Model):
         verbose_name = 'Категория'
         verbose_name_plural = 'Категории'
 
-class Product(models.Model):
+class Product(VersionedModel, AggregateFieldsModel):
     title = models.CharField(max_length=50)
     description = models.TextField(null=True, blank=True)
     price = models.DecimalField(max_digits=5, decimal_places=2)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     owner = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='products', null=True)
+    rating = models.FloatField(null=True, blank=True, editable=False)
+    reviews_count = models.PositiveIntegerField(default=0, editable=False)
+    stars_1 = models.PositiveIntegerField(default=0, editable=False)
+    stars_2 = models.PositiveIntegerField(default=0, editable=False)
+    stars_3 = models.PositiveIntegerField(default=0, editable=False)
+    stars_4 = models.PositiveIntegerField(default=0, editable=False)
+    stars_5 = models.PositiveIntegerField(default=0, editable=False)
+    # заполняется триггером product_search_vector_update в Postgres
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    aggregate_fields = ('rating', 'reviews_count', 'stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5',
+                        'search_vector')
+
     def __str__(self):
         return self.title
 
+    @property
+    def stars_histogram(self):
+        return {str(i): getattr(self, f'stars_{i}') for i in range(1, 6)}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # запоминаем исходную категорию, чтобы сигналы могли перенести счётчик
+        instance._loaded_category_id = instance.__dict__.get('category_id')
+        return instance
+
     class Meta:
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
+            GinIndex(fields=['title'], opclasses=['gin_trgm_ops'], name='product_title_trgm'),
+            models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+            # курсор ?ordering=price без категории и диапазоны цен (список, фильтр админки)
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            # у большинства товаров нет отзывов; min_rating ищет только среди оценённых
+            models.Index(fields=['rating'], condition=models.Q(rating__isnull=False), name='product_rating_rated_idx'),
+            models.Index(fields=['updated_at'], name='product_updated_at_idx'),
+            # товары владельца по курсору; INCLUDE — итоги владельца читаются только из индекса
+            models.Index(fields=['owner', 'id'], include=['rating', 'reviews_count'], name='product_owner_id_idx'),
+        ]
+
+class CategoryStats(models.Model):
+    """
+    Строка материализованного представления product_category_stats (миграция 0011).
+
+    Пересчитывается задачей update_category_stats через REFRESH MATERIALIZED VIEW
+    CONCURRENTLY и отстаёт от каталога на период расписания (см. refreshed_at).
+    """
+    category = models.OneToOneField(Category, primary_key=True, on_delete=models.DO_NOTHING, related_name='stats')
+    name = models.CharField(max_length=50)
+    products_count = models.PositiveIntegerField()
+    price_min = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    price_max = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    price_avg = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    rating = models.FloatField(null=True)  # средняя оценка по всем отзывам категории
+    reviews_count = models.PositiveIntegerField()
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = 'product_category_stats'
+        verbose_name = 'Статистика категории'
+        verbose_name_plural = 'Статистика категорий'
 
 STARS =(
     (i,"⭐" * i) for i in range(1,6)
 )
 
-class Review(models.Model):
+class Review(VersionedModel):
     text = models.TextField(null=True,blank=True)
-    product = models.ForeignKey(Product, on_delete=models.CASCADE,related_name='reviews')
+    product = models.ForeignKey(Product, on_delete=CASCADE_WITHOUT_SIGNALS, related_name='reviews')
     stars = models.IntegerField(choices=STARS, default=5)
     def __str__(self):
         return f'Отзыв на {self.product.title}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # исходные товар и оценка нужны сигналам для переноса агрегатов рейтинга
+        instance._loaded_product_id = instance.__dict__.get('product_id')
+        instance._loaded_stars = instance.__dict__.get('stars')
+        return instance
+
     class Meta:
         verbose_name = 'Отзыв'
         verbose_name_plural = 'Отзывы'
+        indexes = [
+            # отзывы товара по курсору: новые первыми и по оценке (id — второй ключ курсора)
+            models.Index(fields=['product', 'id'], name='review_product_id_idx'),
+            models.Index(fields=['product', 'stars', 'id'], name='review_product_stars_id_idx'),
+        ]
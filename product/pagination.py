@@ -0,0 +1,191 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+PAGE_SIZE = 5
+MAX_PAGE_SIZE = 100
+
+# ниже этого порога оценка планировщика заменяется точным COUNT(*)
+ESTIMATE_EXACT_THRESHOLD = 10000
+
+
+def estimate_count(queryset):
+    """Оценка числа строк по статистике планировщика Postgres без COUNT(*)."""
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.count()
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    estimate = int(plan[0]['Plan']['Plan Rows'])
+    if estimate < ESTIMATE_EXACT_THRESHOLD:
+        return queryset.count()
+    return estimate
+
+
+class EstimatedCountPaginator(DjangoPaginator):
+    @cached_property
+    def count(self):
+        return estimate_count(self.object_list)
+
+
+class CustomPagination(PageNumberPagination):
+    """
+    Постраничная пагинация с опциональным keyset-режимом.
+
+    По умолчанию работает как раньше (?page=N). Режим курсора включается
+    параметром ?cursor= (пустым для первой страницы): страницы выбираются
+    условием WHERE по последней позиции вместо OFFSET, а total не считается,
+    если его не запросили через ?total=exact|estimate.
+
+    Представление с пустым cursor_ordering_fields сортирует по своему (например,
+    поиск по рангу), и ?cursor= для него игнорируется — остаётся ?page=N.
+    """
+    page_size = PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    total_query_param = 'total'
+    default_cursor_ordering = ('id',)
+    cursor_only = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.total_mode = request.query_params.get(self.total_query_param)
+        if not queryset.ordered:
+            queryset = queryset.order_by('id')
+        cursor_allowed = getattr(view, 'cursor_ordering_fields', self.default_cursor_ordering)
+        if self.cursor_only or (cursor_allowed and self.cursor_query_param in request.query_params):
+            self.cursor_mode = True
+            return self.paginate_keyset(queryset, request, view)
+        self.cursor_mode = False
+        if self.total_mode == 'estimate':
+            self.django_paginator_class = EstimatedCountPaginator
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_mode:
+            return Response(OrderedDict([
+                ('total', self.total),
+                ('next', self.next_link),
+                ('previous', self.previous_link),
+                ('results', data)
+            ]))
+        return Response(OrderedDict([
+            ('total', self.page.paginator.count),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+    # --- keyset-режим ---
+
+    def get_cursor_ordering(self, request, view):
+        allowed = getattr(view, 'cursor_ordering_fields', self.default_cursor_ordering)
+        default = getattr(view, 'cursor_default_ordering', allowed[0])
+        ordering = request.query_params.get(self.ordering_query_param, default)
+        if ordering.lstrip('-') not in allowed:
+            ordering = default
+        descending = ordering.startswith('-')
+        field = ordering.lstrip('-')
+        fields = [field] if field == 'id' else [field, 'id']
+        return [(name, descending) for name in fields]
+
+    def paginate_keyset(self, queryset, request, view):
+        page_size = self.get_page_size(request)
+        ordering = self.get_cursor_ordering(request, view)
+        position, backwards = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+        if position is not None:
+            position = self.coerce_position(queryset.model, ordering, position)
+
+        self.total = self.get_total(queryset)
+
+        if backwards:
+            ordering_for_query = [(name, not descending) for name, descending in ordering]
+        else:
+            ordering_for_query = ordering
+        queryset = queryset.order_by(*[f'-{name}' if descending else name
+                                       for name, descending in ordering_for_query])
+        loaded, deferred = queryset.query.deferred_loading
+        if loaded and not deferred:
+            # колонки курсора нужны ссылкам next/previous, даже если ?fields= их не запрашивает
+            queryset = queryset.only(*loaded, *(name for name, _ in ordering))
+        if position is not None:
+            queryset = queryset.filter(self.after_position(ordering_for_query, position))
+
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = position is not None, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+
+        self.next_link = self.cursor_link(rows[-1], ordering, False) if rows and has_next else None
+        self.previous_link = self.cursor_link(rows[0], ordering, True) if rows and has_previous else None
+        return rows
+
+    def get_total(self, queryset):
+        if self.total_mode == 'exact':
+            return queryset.count()
+        if self.total_mode == 'estimate':
+            return estimate_count(queryset)
+        return None
+
+    @staticmethod
+    def after_position(ordering, position):
+        condition = Q()
+        for index, (name, descending) in enumerate(ordering):
+            step = Q(**{f'{name}__lt' if descending else f'{name}__gt': position[index]})
+            for prev_index, (prev_name, _) in enumerate(ordering[:index]):
+                step &= Q(**{prev_name: position[prev_index]})
+            condition |= step
+        return condition
+
+    @staticmethod
+    def coerce_position(model, ordering, position):
+        """Значения курсора в типы полей сортировки; подделанный курсор — 404, а не ошибка в filter()."""
+        if len(position) != len(ordering):
+            raise NotFound('Invalid cursor')
+        try:
+            values = [model._meta.get_field(name).to_python(value) for (name, _), value in zip(ordering, position)]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound('Invalid cursor')
+        if any(value is None for value in values):
+            raise NotFound('Invalid cursor')
+        return values
+
+    def cursor_link(self, row, ordering, backwards):
+        # строки — экземпляры моделей или словари values() (см. product/read_plan.py)
+        position = [str(row[name] if isinstance(row, dict) else getattr(row, name)) for name, _ in ordering]
+        payload = json.dumps({'p': position, 'b': backwards}, separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            position = payload['p']
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError):
+            raise NotFound('Invalid cursor')
+        if not isinstance(position, list):
+            raise NotFound('Invalid cursor')
+        return position, bool(payload.get('b', False))
+
+
+class CursorOnlyPagination(CustomPagination):
+    """Только keyset-режим: для списков, которые могут быть очень длинными (отзывы одного товара)."""
+    cursor_only = True
@@ -9,4 +9,5 @@ class IsModeratorPermission(BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.user.is_staff:
             return True
-        return obj.owner == request.user  
\ No newline at end of file
+        # сравнение по id: request.user может быть пользователем из claims токена
+        return request.user.is_authenticated and obj.owner_id == request.user.id
\ No newline at end of file
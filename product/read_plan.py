@@ -0,0 +1,163 @@
+"""
+Быстрый путь чтения списков: ответ строится прямо из строк values(), без
+экземпляров моделей и без to_representation() сериализатора на каждый объект.
+
+План строится по полям уже созданного сериализатора, поэтому учитывает
+?fields= и ?expand= и отдаёт те же ключи в том же порядке, что и сериализатор.
+Значения, которые DRF не меняет (int, str, float, bool, id связей), берутся из
+строки как есть; Decimal, даты и choices проходят через to_representation()
+самого поля, так что формат ответа не расходится с обычным путём.
+"""
+from collections import defaultdict
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+
+from .fieldsets import model_columns, top_per_parent
+
+# to_representation() этих полей возвращает значение из values() без изменений
+PASSTHROUGH_FIELDS = (serializers.IntegerField, serializers.CharField, serializers.FloatField,
+                      serializers.BooleanField, PrimaryKeyRelatedField)
+
+
+class RowAttributes:
+    """Колонки строки values() как атрибуты — для методов сериализатора и свойств модели."""
+    __slots__ = ('row', 'prefix')
+
+    def __init__(self, row, prefix):
+        self.row = row
+        self.prefix = prefix
+
+    def __getattr__(self, name):
+        try:
+            return self.row[self.prefix + name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+def column_getter(column, field):
+    if isinstance(field, PASSTHROUGH_FIELDS):
+        return lambda row, related: row[column]
+    to_representation = field.to_representation
+
+    def get(row, related):
+        value = row[column]
+        return None if value is None else to_representation(value)
+    return get
+
+
+def property_getter(fget, field, prefix):
+    def get(row, related):
+        value = fget(RowAttributes(row, prefix))
+        return None if value is None else field.to_representation(value)
+    return get
+
+
+def method_getter(field, prefix):
+    return lambda row, related: field.to_representation(RowAttributes(row, prefix))
+
+
+def nested_getter(plan):
+    def get(row, related):
+        if row[plan.pk] is None:
+            return None
+        return plan.represent_row(row, related)
+    return get
+
+
+def many_getter(name, plan, pk):
+    return lambda row, related: [plan.represent_row(child, None) for child in related[name].get(row[pk], ())]
+
+
+class ReadPlan:
+    """
+    Колонки для values() и функции, собирающие из строки словарь ответа.
+
+    Прямые FK (вложенный сериализатор) читаются тем же запросом через JOIN,
+    обратные связи (many=True) — одним дополнительным запросом на страницу;
+    для связей из embedded_limits сериализатора этот запрос ограничивает число
+    строк на родителя оконной функцией.
+    """
+
+    def __init__(self, serializer, prefix=''):
+        self.model = model = serializer.Meta.model
+        self.pk = prefix + model._meta.pk.name
+        self.columns = [prefix + column for column in sorted(model_columns(serializer))]
+        self.fields = []
+        self.related = []
+        concrete = {field.name for field in model._meta.concrete_fields}
+        limits = getattr(serializer, 'embedded_limits', {})
+
+        for name, field in serializer.fields.items():
+            if isinstance(field, serializers.ListSerializer):
+                relation = model._meta.get_field(field.source)
+                plan = ReadPlan(field.child)
+                self.related.append((name, plan, relation.field.name, limits.get(name)))
+                getter = many_getter(name, plan, self.pk)
+            elif isinstance(field, serializers.BaseSerializer):
+                plan = ReadPlan(field, prefix=f'{prefix}{field.source}__')
+                self.columns.extend(plan.columns)
+                getter = nested_getter(plan)
+            elif field.source == '*':
+                getter = method_getter(field, prefix)
+            elif field.source in concrete:
+                getter = column_getter(prefix + field.source, field)
+            elif isinstance(getattr(model, field.source, None), property):
+                getter = property_getter(getattr(model, field.source).fget, field, prefix)
+            else:
+                raise ImproperlyConfigured(
+                    f'{type(serializer).__name__}.{name}: source={field.source!r} не поддерживается ReadPlan')
+            self.fields.append((name, getter))
+
+    def represent_row(self, row, related):
+        return {name: get(row, related) for name, get in self.fields}
+
+    def represent(self, rows):
+        rows = list(rows)
+        related = {}
+        if self.related and rows:
+            ids = [row[self.pk] for row in rows]
+            for name, plan, fk, limit in self.related:
+                children = defaultdict(list)
+                queryset = plan.model._default_manager.filter(**{f'{fk}__in': ids})
+                if limit is not None:
+                    queryset = top_per_parent(queryset, fk, *limit)
+                for child in queryset.values(*dict.fromkeys([*plan.columns, fk])):
+                    children[child[fk]].append(child)
+                related[name] = children
+        return [self.represent_row(row, related) for row in rows]
+
+
+def plan_rows(queryset, plan, extra_columns=()):
+    """
+    queryset как строки values() с колонками плана.
+
+    extra_columns — колонки, которые нужны не ответу, а пагинации (позиция курсора).
+    Связи many план выбирает сам, поэтому prefetch_related сбрасывается.
+
+    JOIN-ы, добавленные только ради колонок вложенных объектов, делаются LEFT:
+    по прямому FK строк от них не прибавляется и не убывает, а такой JOIN Postgres
+    выбрасывает из COUNT(*) пагинации (INNER JOIN остался бы и в подсчёте).
+    """
+    filter_aliases = set(queryset.query.alias_map)
+    rows = queryset.prefetch_related(None).values(*dict.fromkeys([*plan.columns, *extra_columns]))
+    for alias, join in list(rows.query.alias_map.items()):
+        if alias not in filter_aliases and join.join_type is not None:
+            rows.query.alias_map[alias] = join.promote()
+    return rows
+
+
+class ReadPlanListMixin:
+    """list() generic-представления через ReadPlan вместо сериализации экземпляров."""
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        plan = ReadPlan(self.get_serializer())
+        rows = plan_rows(queryset, plan, getattr(self, 'cursor_ordering_fields', ()))
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(plan.represent(page))
+        return Response(plan.represent(rows))
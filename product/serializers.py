@@ -1,44 +1,96 @@
+import copy
+from decimal import Decimal
+
 from rest_framework import serializers
-from .models import Category, Product, Review
+from .models import Category, CategoryStats, Product, Review
 from rest_framework.exceptions import ValidationError
 
-class CategorySerializer(serializers.ModelSerializer):
-    products_count = serializers.SerializerMethodField()
+# сколько последних отзывов встраивается в товар; все отзывы — /api/v1/products/<id>/reviews/
+EMBEDDED_REVIEWS = 5
+
+
+class SparseFieldsetMixin:
+    """
+    Набор полей ответа из контекста: fields — какие поля оставить, expand — какие связи
+    отдать вложенными объектами вместо id. По тем же полям строится список колонок
+    для only() (см. product/fieldsets.py).
+    """
+    expandable_fields = {}  # поле -> сериализатор вложенного объекта
+    field_columns = {}  # поле -> колонки модели, если не совпадают с именем поля
+    embedded_limits = {}  # вложенный список (many=True) -> (не больше объектов на родителя, порядок)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        for name in self.context.get('expand', ()):
+            if name in self.fields:
+                self.fields[name] = copy.deepcopy(self.expandable_fields[name])
+
 
+class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'name', 'products_count']
-
-    def get_products_count(self, category):
-            return Product.objects.filter(category=category).count()
+        read_only_fields = ['products_count']
 
 
 class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = Review
-        fields = '__all__'
+        fields = ['id', 'text', 'stars', 'product']
+
+
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    expandable_fields = {'category': CategorySerializer(read_only=True)}
+
+    class Meta:
+        model = Product
+        fields = ['id', 'title', 'description', 'price', 'category', 'owner']
+
 
+class ProductWithReviewsSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    category = CategorySerializer(read_only=True)
+    reviews = ReviewSerializer(many=True, read_only=True)
+    rating = serializers.SerializerMethodField()
+    stars_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
+
+    field_columns = {'rating': ('rating',), 'stars_histogram': ('stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5')}
+    embedded_limits = {'reviews': (EMBEDDED_REVIEWS, ('-id',))}
 
-class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields = '__all__'
+        fields = ['id', 'title', 'description', 'price', 'category', 'reviews', 'rating',
+                  'reviews_count', 'stars_histogram']
 
+    def get_rating(self, obj):
+        if obj.rating is None:
+            return None
+        return round(obj.rating, 2)
 
-class ProductWithReviewsSerializer(serializers.ModelSerializer):
-    # reviews = ReviewSerializer(many=True, read_only=True)
+
+class OwnerProductSerializer(serializers.ModelSerializer):
     rating = serializers.SerializerMethodField()
 
+    field_columns = {'rating': ('rating',)}
+
     class Meta:
         model = Product
-        fields = ['id', 'title', 'description', 'price', 'category', 'reviews', 'rating']
-        depth = 1
+        fields = ['id', 'title', 'price', 'category', 'rating', 'reviews_count']
 
     def get_rating(self, obj):
-        reviews = obj.reviews.all()
-        if reviews.exists():
-            return round(sum([r.stars for r in reviews]) / reviews.count(), 2)
-        return None
+        if obj.rating is None:
+            return None
+        return round(obj.rating, 2)
+
+
+class CategoryStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CategoryStats
+        fields = ['category', 'name', 'products_count', 'price_min', 'price_max', 'price_avg', 'rating',
+                  'reviews_count', 'refreshed_at']
 
 
 class CategoryValidateSerializer(serializers.Serializer):
@@ -46,12 +98,21 @@ class CategoryValidateSerializer(serializers.Serializer):
 
 
 class ProductValidateSerializer(serializers.Serializer):
-    title = serializers.CharField(required=True, min_length=2, max_length=255)
+    # границы берутся из модели: иначе лишнее значение падает в базе (DataError) целым запросом
+    title = serializers.CharField(required=True, min_length=2, max_length=Product._meta.get_field('title').max_length)
     description = serializers.CharField(required=False, allow_blank=True)
-    price = serializers.FloatField(min_value=0.01)
+    price = serializers.DecimalField(max_digits=Product._meta.get_field('price').max_digits,
+                                     decimal_places=Product._meta.get_field('price').decimal_places,
+                                     min_value=Decimal('0.01'))
     category = serializers.IntegerField(min_value=1)
 
     def validate_category(self, category_id):
+        categories = self.context.get('categories')
+        if categories is not None:
+            # категории заранее загружены одним запросом (массовые операции)
+            if category_id not in categories:
+                raise ValidationError('Category does not exist')
+            return categories[category_id]
         try:
             return Category.objects.get(id=category_id)
         except Category.DoesNotExist:
@@ -64,6 +125,11 @@ class ReviewValidateSerializer(serializers.Serializer):
     product = serializers.IntegerField(min_value=1)
 
     def validate_product(self, product_id):
+        products = self.context.get('products')
+        if products is not None:
+            if product_id not in products:
+                raise ValidationError('Product does not exist')
+            return products[product_id]
         try:
             return Product.objects.get(id=product_id)
         except Product.DoesNotExist:
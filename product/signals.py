@@ -0,0 +1,67 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .aggregates import apply_rating_delta, increment_products_count
+from .cache import bump_generation_on_commit
+from .models import Category, Product, Review
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = instance.__dict__.get('_loaded_category_id', instance.category_id)
+    if created:
+        increment_products_count(instance.category_id, 1)
+    elif previous != instance.category_id:
+        increment_products_count(previous, -1)
+        increment_products_count(instance.category_id, 1)
+    instance._loaded_category_id = instance.category_id
+
+
+def deleted_with(origin, model):
+    """Удаление каскадом от объекта model: агрегаты удаляемого родителя обновлять незачем."""
+    return isinstance(origin, model) or getattr(origin, 'model', None) is model
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, origin=None, **kwargs):
+    if deleted_with(origin, Category):
+        return
+    increment_products_count(instance.category_id, -1)
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        apply_rating_delta(instance.product_id, {instance.stars: 1})
+    else:
+        previous_product = instance.__dict__.get('_loaded_product_id', instance.product_id)
+        previous_stars = instance.__dict__.get('_loaded_stars', instance.stars)
+        if previous_product == instance.product_id:
+            delta = {previous_stars: -1}
+            delta[instance.stars] = delta.get(instance.stars, 0) + 1
+            apply_rating_delta(instance.product_id, delta)
+        else:
+            apply_rating_delta(previous_product, {previous_stars: -1})
+            apply_rating_delta(instance.product_id, {instance.stars: 1})
+    instance._loaded_product_id = instance.product_id
+    instance._loaded_stars = instance.stars
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    # при удалении товара его отзывы удаляются без сигналов (CASCADE_WITHOUT_SIGNALS в models.py)
+    apply_rating_delta(instance.product_id, {instance.stars: -1})
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_response_cache(sender, **kwargs):
+    bump_generation_on_commit(sender)
@@ -2,6 +2,10 @@ from celery import shared_task
 import time
 from datetime import datetime
 
+from .aggregates import refresh_category_stats, refresh_products_count, refresh_ratings
+from .cache import bump_generation
+from .models import Category, CategoryStats, Product
+
 @shared_task
 def simple_task():
     print("Запущена обычная задача...")
@@ -12,3 +16,25 @@ def simple_task():
 def scheduled_task():
     now = datetime.now()
     print(f"Запланированная задача выполнена в {now}")
+
+@shared_task
+def reconcile_products_count():
+    fixed = refresh_products_count()
+    if fixed:
+        bump_generation(Category)
+    print(f"Счётчики товаров исправлены в {fixed} категориях")
+    return fixed
+
+@shared_task
+def reconcile_ratings():
+    fixed = refresh_ratings()
+    if fixed:
+        bump_generation(Product)
+    print(f"Рейтинги исправлены у {fixed} товаров")
+    return fixed
+
+@shared_task
+def update_category_stats():
+    refresh_category_stats()
+    bump_generation(CategoryStats)
+    print(f"Статистика категорий пересчитана в {datetime.now()}")
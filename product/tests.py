@@ -1,3 +1,1164 @@
-from django.test import TestCase
+import base64
+import csv
+import datetime
+import decimal
+import io
+import json
+import os
+import random
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from redis.exceptions import RedisError
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from shop_api import db_router, idempotency
+from shop_api.query_budget import (QueryBudgetMiddleware, get_query_budget, query_budget_violations,
+                                   reset_query_budget_violations)
+from shop_api.renderers import ORJSONRenderer
+from users.models import CustomUser
+from .aggregates import refresh_category_stats, refresh_products_count, refresh_ratings
+from .models import Category, CategoryStats, Product, Review
+from .pagination import CustomPagination
+from .fieldsets import fieldset_queryset
+from .management.commands.index_advisor import propose
+from .read_plan import ReadPlan, plan_rows
+from .serializers import (EMBEDDED_REVIEWS, CategorySerializer, ProductSerializer, ProductWithReviewsSerializer,
+                          ReviewSerializer)
+from .views import (
+    CategoryDetailAPIView,
+    CategoryListCreateAPIView,
+    OwnerProductsAPIView,
+    ProductDetailAPIView,
+    ProductListCreateAPIView,
+    ProductReviewsAPIView,
+    ProductWithReviewsAPIView,
+)
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def seed_catalog(products, owner, categories=5, max_reviews=8, seed=1):
+    """Досевает каталог до заданного числа товаров: неравномерные категории и число отзывов."""
+    rnd = random.Random(seed + products)
+    category_ids = list(Category.objects.values_list('id', flat=True))
+    if not category_ids:
+        Category.objects.bulk_create([Category(name=f'Категория {i}') for i in range(categories)])
+        category_ids = list(Category.objects.values_list('id', flat=True))
+
+    missing = products - Product.objects.count()
+    if missing <= 0:
+        return
+    new_products = Product.objects.bulk_create([
+        Product(title=f'Товар {i}', description='Описание ' * 5, price=rnd.randint(100, 99999) / 100,
+                category_id=rnd.choices(category_ids, weights=range(len(category_ids), 0, -1))[0], owner=owner)
+        for i in range(missing)
+    ])
+    Review.objects.bulk_create([
+        Review(text='Отзыв', stars=rnd.randint(1, 5), product=product)
+        for product in new_products
+        for _ in range(int(rnd.paretovariate(1.5)) % max_reviews)
+    ])
+    refresh_products_count()
+    refresh_ratings()
+
+
+@override_settings(CACHES=LOCMEM_CACHE, RATE_LIMITS_ENABLED=False)
+class QueryBudgetTests(APITestCase):
+    """Число запросов каждого эндпоинта не растёт с размером данных и укладывается в бюджет."""
+    SIZES = (10, 150)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email='owner@example.com', password='secret',
+                                                  birthday=datetime.date(1990, 1, 1))
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def measure(self, method, url, data=None):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 400, response.content)
+        return len(queries)
+
+    def assertBudget(self, view, method, make_request):
+        budget = get_query_budget(view, method.upper())
+        counts = []
+        for size in self.SIZES:
+            seed_catalog(size, owner=self.user)
+            counts.append(make_request())
+        self.assertEqual(len(set(counts)), 1, f'{view.__name__} {method}: число запросов растёт {counts}')
+        self.assertLessEqual(counts[0], budget, f'{view.__name__} {method}: {counts[0]} > {budget}')
+
+    def test_product_list(self):
+        for page_size in (5, 100):
+            self.assertBudget(ProductListCreateAPIView, 'get',
+                              lambda: self.measure('get', f'/api/v1/products/?page_size={page_size}&facets=1'))
+
+    def test_product_list_cursor(self):
+        self.assertBudget(ProductListCreateAPIView, 'get',
+                          lambda: self.measure('get', '/api/v1/products/?cursor=&ordering=-price&page_size=50'))
+
+    def test_product_create(self):
+        self.assertBudget(ProductListCreateAPIView, 'post', lambda: self.measure('post', '/api/v1/products/', {
+            'title': 'Новый', 'price': 10, 'category': Category.objects.first().id}))
+
+    def test_product_detail(self):
+        self.assertBudget(ProductDetailAPIView, 'get',
+                          lambda: self.measure('get', f'/api/v1/products/{Product.objects.last().id}/'))
+
+    def test_product_update_moves_category(self):
+        def request():
+            product = Product.objects.last()
+            category = Category.objects.exclude(id=product.category_id).first()
+            return self.measure('put', f'/api/v1/products/{product.id}/', {
+                'title': 'Изменён', 'price': 5, 'category': category.id})
+        self.assertBudget(ProductDetailAPIView, 'put', request)
+
+    def test_product_delete(self):
+        def request():
+            product = Product.objects.order_by('-reviews_count').first()
+            return self.measure('delete', f'/api/v1/products/{product.id}/')
+        self.assertBudget(ProductDetailAPIView, 'delete', request)
+
+    def test_category_list(self):
+        self.assertBudget(CategoryListCreateAPIView, 'get',
+                          lambda: self.measure('get', '/api/v1/products/categories/?page_size=100'))
+
+    def test_category_detail(self):
+        self.assertBudget(CategoryDetailAPIView, 'get',
+                          lambda: self.measure('get', f'/api/v1/products/categories/{Category.objects.first().id}/'))
+
+    def test_products_with_reviews(self):
+        for page_size in (5, 50):
+            self.assertBudget(ProductWithReviewsAPIView, 'get',
+                              lambda: self.measure('get', f'/api/v1/products/reviews/?page_size={page_size}'))
+
+    def test_product_reviews(self):
+        def request():
+            product = Product.objects.order_by('-reviews_count').first()
+            return self.measure('get', f'/api/v1/products/{product.id}/reviews/?ordering=-stars&page_size=3')
+        self.assertBudget(ProductReviewsAPIView, 'get', request)
+
+    def test_owner_products(self):
+        self.assertBudget(OwnerProductsAPIView, 'get', lambda: self.measure('get', '/api/v1/products/mine/?page_size=5'))
+
+    async def test_middleware_counts_async_orm(self):
+        async def view(request):
+            await Product.objects.acount()
+            await Category.objects.acount()
+            return HttpResponse()
+        view.query_budget = 1
+
+        middleware = QueryBudgetMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        request = AsyncRequestFactory().get('/')
+        request.resolver_match = mock.Mock(func=view, route='async/')
+        reset_query_budget_violations()
+        with self.settings(QUERY_BUDGET_MODE='log'):
+            response = await middleware(request)
+        self.assertEqual(response['X-Query-Budget'], '2/1')
+        self.assertEqual(query_budget_violations(), {'GET async/': 1})
+
+
+@override_settings(CACHES=LOCMEM_CACHE, REPLICA_DATABASES=['replica_1'], READ_YOUR_WRITES_SECONDS=5,
+                   REPLICA_MAX_LAG_SECONDS=5, REPLICA_CHECK_INTERVAL=0)
+class ReplicaRoutingTests(SimpleTestCase):
+    """Чтение GET-запросов уходит на реплику, кроме окна read-your-writes и недоступной реплики."""
+
+    def setUp(self):
+        cache.clear()
+        db_router._health.clear()
+        self.factory = RequestFactory()
+        lag = mock.patch('shop_api.db_router.replica_lag', return_value=0.0)
+        self.replica_lag = lag.start()
+        self.addCleanup(lag.stop)
+
+    def request(self, method, user=None, status=200):
+        """Прогоняет запрос через middleware и возвращает базу, выбранную роутером для чтения."""
+        request = getattr(self.factory, method)('/api/v1/products/', REMOTE_ADDR='10.0.0.1')
+        request.user = user or AnonymousUser()
+        chosen = []
+
+        def view(request):
+            chosen.append(db_router.ReplicaRouter().db_for_read(Product))
+            return HttpResponse(status=status)
+
+        db_router.ReplicaRoutingMiddleware(view)(request)
+        return chosen[0]
+
+    def arequest(self, method, user=None, status=200):
+        """То же для async-представления: роутер вызывается из потока async ORM."""
+        request = getattr(AsyncRequestFactory(), method)('/api/v1/async/products/', REMOTE_ADDR='10.0.0.1')
+        request.user = user or AnonymousUser()
+        chosen = []
+
+        async def view(request):
+            chosen.append(await sync_to_async(db_router.ReplicaRouter().db_for_read)(Product))
+            return HttpResponse(status=status)
+
+        middleware = db_router.ReplicaRoutingMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        async_to_sync(middleware)(request)
+        return chosen[0]
+
+    def user(self, pk):
+        return mock.Mock(pk=pk, is_authenticated=True)
+
+    def test_get_reads_from_replica(self):
+        self.assertEqual(self.request('get'), 'replica_1')
+
+    def test_write_reads_from_primary(self):
+        self.assertEqual(self.request('post', self.user(1), status=201), 'default')
+
+    def test_read_your_writes(self):
+        self.request('post', self.user(1), status=201)
+        self.assertEqual(self.request('get', self.user(1)), 'default')
+        self.assertEqual(self.request('get', self.user(2)), 'replica_1')
+
+    def test_failed_write_does_not_stick(self):
+        self.request('post', self.user(1), status=400)
+        self.assertEqual(self.request('get', self.user(1)), 'replica_1')
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        self.replica_lag.return_value = 30.0
+        self.assertEqual(self.request('get'), 'default')
+
+    def test_unavailable_replica_falls_back_to_primary(self):
+        self.replica_lag.side_effect = DatabaseError
+        self.assertEqual(self.request('get'), 'default')
+
+    def test_async(self):
+        self.assertEqual(self.arequest('get', self.user(1)), 'replica_1')
+        self.assertEqual(self.arequest('post', self.user(1), status=201), 'default')
+        # метка read-your-writes общая для sync и async запросов
+        self.assertEqual(self.arequest('get', self.user(1)), 'default')
+        self.assertEqual(self.request('get', self.user(1)), 'default')
+        self.assertEqual(self.arequest('get', self.user(2)), 'replica_1')
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ConditionalGetTests(APITestCase):
+    """ETag/Last-Modified: повторный запрос без изменений получает 304, после изменения — новые данные."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email='owner@example.com', password='secret',
+                                                  birthday=datetime.date(1990, 1, 1))
+        seed_catalog(20, owner=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+        self.product = Product.objects.first()
+        self.url = f'/api/v1/products/{self.product.id}/'
+
+    def test_detail_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(0):
+            repeated = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeated.status_code, 304)
+        self.assertEqual(repeated['ETag'], response['ETag'])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+    def test_detail_changes_after_update(self):
+        etag = self.client.get(self.url)['ETag']
+        version = self.product.version
+        self.product.title = 'Изменён'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertEqual(self.product.version, version + 1)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['title'], 'Изменён')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_etag_survives_unrelated_writes(self):
+        etag = self.client.get(self.url)['ETag']
+        other = Product.objects.exclude(id=self.product.id).first()
+        other.title = 'Другой'
+        with self.captureOnCommitCallbacks(execute=True):
+            other.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_expanded_category_rename(self):
+        url = self.url + '?expand=category'
+        etag = self.client.get(url)['ETag']
+        list_url = f'/api/v1/products/?expand=category&category={self.product.category_id}'
+        list_etag = self.client.get(list_url)['ETag']
+        category = self.product.category
+        category.name = 'Переименована'
+        with self.captureOnCommitCallbacks(execute=True):
+            category.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['category']['name'], 'Переименована')
+        response = self.client.get(list_url, HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['category']['name'], 'Переименована')
+        # без expand ответ не зависит от категории, и ETag строки прежний
+        plain = self.client.get(self.url)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=plain['ETag']).status_code, 304)
+
+    def test_list_not_modified_until_delete(self):
+        url = '/api/v1/products/categories/'
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(id=self.product.id).delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class SparseFieldsetTests(APITestCase):
+    """?fields= сужает и ответ, и SELECT; ?expand= добавляет JOIN только по запросу."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email='owner@example.com', password='secret',
+                                                  birthday=datetime.date(1990, 1, 1))
+        seed_catalog(20, owner=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response, ' '.join(query['sql'] for query in queries)
+
+    def test_fields_limit_columns(self):
+        response, sql = self.get('/api/v1/products/?fields=id,title,price')
+        self.assertEqual(list(response.data['results'][0]), ['id', 'title', 'price'])
+        self.assertNotIn('description', sql)
+        self.assertNotIn('product_category', sql)
+
+    def test_expand_category(self):
+        response, sql = self.get('/api/v1/products/?fields=id,category&expand=category')
+        self.assertEqual(set(response.data['results'][0]['category']), {'id', 'name', 'products_count'})
+        self.assertIn('JOIN "product_category"', sql)
+
+        response, sql = self.get('/api/v1/products/?fields=id,category')
+        self.assertIsInstance(response.data['results'][0]['category'], int)
+        self.assertNotIn('JOIN', sql)
+
+    def test_reviews_not_prefetched_unless_requested(self):
+        response, sql = self.get('/api/v1/products/reviews/?fields=id,title,rating')
+        self.assertEqual(list(response.data['results'][0]), ['id', 'title', 'rating'])
+        self.assertNotIn('product_review', sql)
+
+    def test_unknown_fields_rejected(self):
+        response = self.client.get('/api/v1/products/?fields=id,secret&expand=owner')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {'fields', 'expand'})
+
+
+class ReadPlanTests(APITestCase):
+    """Быстрый путь чтения отдаёт те же байты, что сериализаторы DRF с JSONRenderer."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email='owner@example.com', password='secret',
+                                                  birthday=datetime.date(1990, 1, 1))
+        seed_catalog(20, owner=cls.user)
+        Product.objects.create(title='Без отзывов «ё»\u2028', price=decimal.Decimal('5.00'),
+                               category=Category.objects.first(), owner=cls.user)
+
+    def assertSameOutput(self, queryset, serializer_class, context=None):
+        context = context or {}
+        expected = JSONRenderer().render(serializer_class(queryset, many=True, context=context).data)
+        plan = ReadPlan(serializer_class(context=context))
+        actual = ORJSONRenderer().render(plan.represent(plan_rows(queryset, plan)))
+        self.assertEqual(actual, expected)
+
+    def test_serializers(self):
+        products = Product.objects.order_by('id')
+        self.assertSameOutput(Category.objects.order_by('id'), CategorySerializer)
+        self.assertSameOutput(Review.objects.order_by('id'), ReviewSerializer)
+        self.assertSameOutput(products, ProductSerializer)
+        self.assertSameOutput(products, ProductSerializer, {'fields': ['id', 'price'], 'expand': set()})
+        self.assertSameOutput(products, ProductSerializer, {'fields': None, 'expand': {'category'}})
+        self.assertSameOutput(fieldset_queryset(products, ProductWithReviewsSerializer()), ProductWithReviewsSerializer)
+
+    def test_reviews_one_query_per_page(self):
+        plan = ReadPlan(ProductWithReviewsSerializer())
+        rows = list(plan_rows(Product.objects.order_by('id'), plan)[:10])
+        with self.assertNumQueries(1):
+            plan.represent(rows)
+
+    def test_renderer_matches_drf(self):
+        data = {
+            'price': decimal.Decimal('10.50'),
+            'at': timezone.make_aware(datetime.datetime(2024, 5, 1, 12, 30, 15, 123456), datetime.timezone.utc),
+            'day': datetime.date(2024, 5, 1),
+            'text': 'Отзыв\u2028\u2029 "в кавычках"',
+            'lazy': gettext_lazy('Ошибка'),
+            1: [1.5, None, True, {'nested': ()}],
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ProductReviewsTests(APITestCase):
+    """Отзывы товара по курсору и ограниченный список отзывов внутри товара."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email='owner@example.com', password='secret',
+                                                  birthday=datetime.date(1990, 1, 1))
+        seed_catalog(3, owner=cls.user)
+        cls.product = Product.objects.first()
+        Review.objects.bulk_create([Review(text=f'Отзыв {i}', stars=i % 5 + 1, product=cls.product)
+                                    for i in range(EMBEDDED_REVIEWS * 3)])
+        refresh_ratings()
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            ids.extend((review['stars'], review['id']) for review in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_cursor_orderings(self):
+        reviews = list(self.product.reviews.values_list('stars', 'id'))
+        url = f'/api/v1/products/{self.product.id}/reviews/?page_size=4'
+        self.assertEqual(self.walk(url), sorted(reviews, key=lambda review: -review[1]))
+        self.assertEqual(self.walk(url + '&ordering=-stars'), sorted(reviews, reverse=True))
+        self.assertEqual(self.walk(url + '&ordering=stars'), sorted(reviews))
+
+    def test_tampered_cursors(self):
+        def cursor(position):
+            return base64.urlsafe_b64encode(json.dumps({'p': position}).encode()).decode()
+
+        self.client.force_authenticate(self.user)
+        reviews = f'/api/v1/products/{self.product.id}/reviews/?cursor='
+        for url in (reviews + cursor(['abc']),
+                    reviews + cursor(['1', '2']),
+                    reviews + cursor('12'),
+                    reviews + cursor([None]),
+                    reviews + cursor(['x', '1']) + '&ordering=stars',
+                    '/api/v1/products/?ordering=price&cursor=' + cursor(['дорого', '1']),
+                    '/api/v1/products/?ordering=price&cursor=' + cursor([{'a': 1}, '1'])):
+            self.assertEqual(self.client.get(url).status_code, 404, url)
+        # огромный, но корректный id — просто пустая страница
+        response = self.client.get('/api/v1/products/?cursor=' + cursor(['9' * 30]))
+        self.assertEqual((response.status_code, response.data['results']), (200, []))
+
+    def test_cursor_disabled_keeps_view_ordering(self):
+        # как у поиска: своя сортировка, курсор по ней не строится
+        view = mock.Mock(cursor_ordering_fields=())
+        request = Request(RequestFactory().get('/', {'cursor': '', 'page_size': 2}))
+        paginator = CustomPagination()
+        rows = paginator.paginate_queryset(Review.objects.order_by('-stars', 'id'), request, view)
+        self.assertFalse(paginator.cursor_mode)
+        self.assertEqual([review.id for review in rows],
+                         list(Review.objects.order_by('-stars', 'id').values_list('id', flat=True)[:2]))
+
+    def test_missing_product(self):
+        response = self.client.get('/api/v1/products/999999/reviews/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_async_embedded_reviews_match(self):
+        url = '/reviews/?page_size=100'
+        sync = self.client.get('/api/v1/products' + url)
+        async_ = self.client.get('/api/v1/async/products' + url)
+        self.assertEqual(async_.status_code, 200)
+        self.assertEqual(async_.json(), sync.json())
+
+    def test_embedded_reviews_capped(self):
+        response = self.client.get('/api/v1/products/reviews/?page_size=100')
+        products = {product['id']: product for product in response.data['results']}
+        embedded = products[self.product.id]['reviews']
+        newest = list(self.product.reviews.order_by('-id').values_list('id', flat=True)[:EMBEDDED_REVIEWS])
+        self.assertEqual([review['id'] for review in embedded], newest)
+        self.assertGreater(products[self.product.id]['reviews_count'], EMBEDDED_REVIEWS)
+
+
+class OwnerProductsTests(APITestCase):
+    """Товары текущего владельца по курсору и итоги по всем его товарам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = CustomUser.objects.create_user(email='owner@example.com', password='secret')
+        cls.other = CustomUser.objects.create_user(email='other@example.com', password='secret')
+        seed_catalog(12, owner=cls.owner)
+        Product.objects.filter(id__in=Product.objects.order_by('id').values('id')[:4]).update(owner=cls.other)
+
+    def test_own_products_and_totals(self):
+        self.client.force_authenticate(self.owner)
+        own = Product.objects.filter(owner=self.owner)
+        ids, url = [], '/api/v1/products/mine/?page_size=3'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            ids.extend(product['id'] for product in response.data['results'])
+            totals = response.data['totals']
+            url = response.data['next']
+        self.assertEqual(ids, list(own.order_by('-id').values_list('id', flat=True)))
+
+        reviews = Review.objects.filter(product__owner=self.owner)
+        stars = list(reviews.values_list('stars', flat=True))
+        self.assertEqual(totals, {'products': own.count(), 'reviews': len(stars),
+                                  'rating': round(sum(stars) / len(stars), 2) if stars else None})
+
+    def test_no_products(self):
+        self.client.force_authenticate(CustomUser.objects.create_user(email='new@example.com', password='secret'))
+        response = self.client.get('/api/v1/products/mine/')
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(response.data['totals'], {'products': 0, 'reviews': 0, 'rating': None})
+
+    def test_requires_auth(self):
+        self.assertEqual(self.client.get('/api/v1/products/mine/').status_code, 401)
+
+
+class IndexAdvisorTests(APITestCase):
+    """index_advisor проходит все сценарии, ничего не записывая, и строит индекс по узлу плана."""
+
+    def test_propose_from_sort(self):
+        scan = {'Node Type': 'Seq Scan', 'Relation Name': 'product_product',
+                'Filter': "((category_id = 3) AND (price >= 10.00) AND (rating IS NOT NULL))"}
+        sort = {'Node Type': 'Sort', 'Sort Key': ['product_product.price DESC', 'product_product.id DESC'],
+                'Plans': [scan]}
+        self.assertEqual(propose(scan, sort), ('product_product', ('category_id', 'price', 'id'), 'rating IS NOT NULL'))
+        self.assertEqual(propose(scan), ('product_product', ('category_id', 'price'), 'rating IS NOT NULL'))
+
+    def test_command_runs_read_only(self):
+        user = CustomUser.objects.create_user(email='owner@example.com', password='secret')
+        seed_catalog(5, owner=user)
+        counts = [model.objects.count() for model in (CustomUser, Category, Product, Review)]
+        out = io.StringIO()
+        call_command('index_advisor', min_rows=0, stdout=out)
+        self.assertIn('admin: товары — HTTP 200', out.getvalue())
+        self.assertIn('api: отзывы товара — HTTP 200', out.getvalue())
+        self.assertEqual([model.objects.count() for model in (CustomUser, Category, Product, Review)], counts)
+
+
+class AdminPriceRangeTests(APITestCase):
+    """Фильтр по ценовым корзинам в админке принимает только свои значения."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_superuser(email='admin@example.com', password='secret')
+        seed_catalog(20, owner=cls.admin)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist(self, query):
+        response = self.client.get(f'/admin/product/product/?{query}')
+        self.assertEqual(response.status_code, 200, query)
+        return response.context['cl'].result_count
+
+    def test_price_range(self):
+        total = Product.objects.count()
+        self.assertEqual(self.changelist('price_range=1'), Product.objects.filter(price__gte=10, price__lt=50).count())
+        self.assertEqual(self.changelist('price_range=4'), Product.objects.filter(price__gte=500).count())
+        for value in ('abc', '99', '-1', ''):
+            self.assertEqual(self.changelist(f'price_range={value}'), total, value)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CategoryStatsTests(APITestCase):
+    """Аналитика категорий читается из материализованного представления после пересчёта."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email='owner@example.com', password='secret')
+        seed_catalog(30, owner=cls.user)
+        Category.objects.create(name='Пустая')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def test_stats_after_refresh(self):
+        self.assertFalse(CategoryStats.objects.exists())
+        refresh_category_stats()
+
+        response = self.client.get('/api/v1/products/analytics/categories/?ordering=-products_count')
+        self.assertEqual(response.status_code, 200)
+        stats = response.data
+        self.assertEqual(len(stats), Category.objects.count())
+        self.assertEqual([row['products_count'] for row in stats],
+                         sorted((row['products_count'] for row in stats), reverse=True))
+
+        category = stats[0]['category']
+        products = Product.objects.filter(category_id=category)
+        reviews = Review.objects.filter(product__category_id=category)
+        stars = sum(review.stars for review in reviews)
+        self.assertEqual(stats[0]['products_count'], products.count())
+        self.assertEqual(stats[0]['price_max'], str(max(product.price for product in products)))
+        self.assertEqual(stats[0]['reviews_count'], reviews.count())
+        self.assertEqual(stats[0]['rating'], round(stars / reviews.count(), 2))
+
+        empty = self.client.get(f'/api/v1/products/analytics/categories/{Category.objects.get(name="Пустая").id}/')
+        self.assertEqual((empty.data['products_count'], empty.data['price_avg'], empty.data['rating']), (0, None, None))
+
+    def test_unknown_ordering(self):
+        response = self.client.get('/api/v1/products/analytics/categories/?ordering=name')
+        self.assertEqual(response.status_code, 400)
+
+
+class FakeIdempotencyStore:
+    """Сохранённые ответы и замки в памяти с семантикой скриптов shop_api/idempotency.py."""
+
+    def __init__(self):
+        self.responses, self.locks = {}, {}
+
+    def claim(self, scope, key, token):
+        if (scope, key) in self.responses:
+            return idempotency.STORED, self.responses[scope, key]
+        if (scope, key) in self.locks:
+            return idempotency.BUSY, None
+        self.locks[scope, key] = token
+        return idempotency.CLAIMED, None
+
+    def store(self, scope, key, token, payload):
+        if payload:
+            self.responses[scope, key] = payload
+        if self.locks.get((scope, key)) == token:
+            del self.locks[scope, key]
+
+
+@override_settings(IDEMPOTENCY_WAIT=0, RATE_LIMITS_ENABLED=False)
+class IdempotencyTests(APITestCase):
+    """Повтор POST с тем же Idempotency-Key отдаёт первый ответ и ничего не создаёт."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email='owner@example.com', password='secret',
+                                                  birthday=datetime.date(1990, 1, 1))
+        cls.category = Category.objects.create(name='Категория')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        self.store = FakeIdempotencyStore()
+        for name, fake in (('claim_key', self.store.claim), ('store_response', self.store.store)):
+            patcher = mock.patch(f'shop_api.idempotency.{name}', side_effect=fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def create(self, key, title='Товар'):
+        return self.client.post('/api/v1/products/', {'title': title, 'price': 10, 'category': self.category.id},
+                                format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay(self):
+        first = self.create('key-1')
+        self.assertEqual(first.status_code, 201)
+        with CaptureQueriesContext(connection) as queries:
+            repeat = self.create('key-1')
+        self.assertEqual(len(queries), 0)
+        self.assertEqual((repeat.status_code, repeat.content), (201, first.content))
+        self.assertEqual(repeat['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.create('key-2').status_code, 201)
+        self.assertEqual(Product.objects.count(), 2)
+        self.assertFalse(self.store.locks)
+
+    def test_key_reused_with_other_body(self):
+        self.create('key-1')
+        self.assertEqual(self.create('key-1', title='Другой').status_code, 422)
+
+    def test_concurrent_duplicate(self):
+        self.store.locks[f'user:{self.user.id}', 'key-1'] = 'first-attempt'
+        self.assertEqual(self.create('key-1').status_code, 409)
+        self.assertFalse(Product.objects.exists())
+
+    def test_redis_unavailable(self):
+        with mock.patch('shop_api.idempotency.claim_key', side_effect=RedisError):
+            self.assertEqual(self.create('key-1').status_code, 201)
+            self.assertEqual(self.create('key-1').status_code, 201)
+        self.assertEqual(Product.objects.count(), 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class AggregateSignalTests(APITestCase):
+    """Счётчики категорий и агрегаты отзывов поддерживаются сигналами без пересчёта."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email='owner@example.com', password='secret')
+        cls.first, cls.second = Category.objects.bulk_create([Category(name='Первая'), Category(name='Вторая')])
+
+    def assertProductsCount(self):
+        for category in Category.objects.all():
+            self.assertEqual(category.products_count, category.product_set.count(), category.name)
+
+    def test_products_count(self):
+        product = Product.objects.create(title='Товар', price=10, category=self.first, owner=self.user)
+        Product.objects.create(title='Ещё товар', price=20, category=self.first, owner=self.user)
+        self.assertProductsCount()
+
+        product.category = self.second
+        product.save()
+        self.assertProductsCount()
+        # повторное сохранение без смены категории счётчики не трогает
+        product.title = 'Переименован'
+        product.save()
+        self.assertProductsCount()
+
+        Product.objects.get(id=product.id).delete()
+        self.assertProductsCount()
+        self.assertEqual(refresh_products_count(), 0)
+
+        response = self.client.get('/api/v1/products/categories/')
+        self.assertEqual({category['name']: category['products_count'] for category in response.data['results']},
+                         {'Первая': 1, 'Вторая': 0})
+
+    def assertRatings(self, *products):
+        for product in products:
+            product.refresh_from_db()
+            stars = list(product.reviews.values_list('stars', flat=True))
+            self.assertEqual([getattr(product, f'stars_{i}') for i in range(1, 6)],
+                             [stars.count(i) for i in range(1, 6)])
+            self.assertEqual(product.reviews_count, len(stars))
+            if stars:
+                self.assertAlmostEqual(product.rating, sum(stars) / len(stars))
+            else:
+                self.assertIsNone(product.rating)
+
+    def test_review_aggregates(self):
+        first = Product.objects.create(title='Первый', price=10, category=self.first, owner=self.user)
+        second = Product.objects.create(title='Второй', price=20, category=self.first, owner=self.user)
+        reviews = [Review.objects.create(text='Отзыв', stars=stars, product=first) for stars in (5, 4, 4, 1)]
+        self.assertRatings(first, second)
+
+        review = reviews[1]
+        review.stars = 2
+        review.save()
+        self.assertRatings(first, second)
+
+        # перенос отзыва к другому товару вместе со сменой оценки
+        review = Review.objects.get(id=reviews[0].id)
+        review.product, review.stars = second, 3
+        review.save()
+        self.assertRatings(first, second)
+
+        Review.objects.get(id=reviews[2].id).delete()
+        self.assertRatings(first, second)
+        Review.objects.get(id=reviews[0].id).delete()
+        self.assertRatings(first, second)
+        self.assertEqual(refresh_ratings(), 0)
+
+        response = self.client.get('/api/v1/products/reviews/')
+        data = {product['id']: product for product in response.data['results']}[first.id]
+        self.assertEqual((data['rating'], data['reviews_count'], data['stars_histogram']),
+                         (1.5, 2, {'1': 1, '2': 1, '3': 0, '4': 0, '5': 0}))
+
+    def test_product_delete_cascades_reviews(self):
+        product = Product.objects.create(title='Товар', price=10, category=self.first, owner=self.user)
+        other = Product.objects.create(title='Другой', price=10, category=self.second, owner=self.user)
+        Review.objects.bulk_create([Review(text='Отзыв', stars=3, product=product) for _ in range(50)]
+                                   + [Review(text='Отзыв', stars=5, product=other)])
+        refresh_ratings()
+
+        with CaptureQueriesContext(connection) as queries:
+            product.delete()
+        # отзывы удаляются одним DELETE, без выборки каждого отзыва
+        review_queries = [query['sql'] for query in queries if '"product_review"' in query['sql']]
+        self.assertEqual(len(review_queries), 1, review_queries)
+        self.assertTrue(review_queries[0].startswith('DELETE'))
+        self.assertFalse(Review.objects.filter(product_id=product.id).exists())
+        self.assertRatings(other)
+        self.assertProductsCount()
+
+        self.second.delete()
+        self.assertFalse(Review.objects.exists())
+        self.assertProductsCount()
+
+
+@override_settings(CACHES=LOCMEM_CACHE, RATE_LIMITS_ENABLED=False)
+class BulkTests(APITestCase):
+    """Массовые операции: всё или ничего, ошибки по индексам, производные данные обновлены."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email='owner@example.com', password='secret',
+                                                  birthday=datetime.date(1990, 1, 1))
+        cls.other = CustomUser.objects.create_user(email='other@example.com', password='secret',
+                                                   birthday=datetime.date(1990, 1, 1))
+        cls.first, cls.second = Category.objects.bulk_create([Category(name='Первая'), Category(name='Вторая')])
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def products(self, count, category):
+        return [{'title': f'Товар {i}', 'price': 10 + i, 'category': category.id} for i in range(count)]
+
+    def test_create(self):
+        response = self.client.post('/api/v1/products/bulk/', self.products(3, self.first), format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual([product['title'] for product in response.data], ['Товар 0', 'Товар 1', 'Товар 2'])
+        self.assertTrue(all(product['id'] for product in response.data))
+        self.assertEqual(Product.objects.filter(owner=self.user).count(), 3)
+        self.assertEqual(Category.objects.get(id=self.first.id).products_count, 3)
+
+    def test_create_validation(self):
+        items = self.products(3, self.first)
+        items[1]['category'] = 999999
+        items[2]['price'] = 0
+        response = self.client.post('/api/v1/products/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 400)
+        errors = response.data['errors']
+        self.assertEqual(errors[0], {})
+        self.assertEqual(set(errors[1]), {'category'})
+        self.assertEqual(set(errors[2]), {'price'})
+        self.assertFalse(Product.objects.exists())
+
+        for payload in ([], {'title': 'Не список'}):
+            self.assertEqual(self.client.post('/api/v1/products/bulk/', payload, format='json').status_code, 400)
+
+    def test_model_bounds(self):
+        # значения, которые не помещаются в колонки, — ошибки элементов, а не DataError всего запроса
+        items = self.products(5, self.first)
+        items[1]['price'] = 5000
+        items[2]['title'] = 'Т' * 51
+        items[3]['price'] = '10.123'
+        response = self.client.post('/api/v1/products/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([set(error) for error in response.data['errors']],
+                         [set(), {'price'}, {'title'}, {'price'}, set()])
+        self.assertFalse(Product.objects.exists())
+
+        product = Product.objects.create(title='Свой', price=10, category=self.first, owner=self.user)
+        response = self.client.put('/api/v1/products/bulk/', [{'id': product.id, 'title': 'Свой', 'price': 1000,
+                                                               'category': self.first.id}], format='json')
+        self.assertEqual((response.status_code, set(response.data['errors'][0])), (400, {'price'}))
+        response = self.client.post('/api/v1/products/', items[1], format='json')
+        self.assertEqual((response.status_code, set(response.data)), (400, {'price'}))
+
+        items[1]['price'], items[2]['title'], items[3]['price'] = '999.99', 'Т' * 50, '0.01'
+        self.assertEqual(self.client.post('/api/v1/products/bulk/', items, format='json').status_code, 201)
+
+    def test_create_permissions(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.post('/api/v1/products/bulk/', self.products(1, self.first),
+                                          format='json').status_code, 401)
+        young = CustomUser.objects.create_user(email='young@example.com', password='secret',
+                                               birthday=datetime.date.today() - datetime.timedelta(days=365 * 10))
+        self.client.force_authenticate(young)
+        self.assertEqual(self.client.post('/api/v1/products/bulk/', self.products(1, self.first),
+                                          format='json').status_code, 403)
+        self.assertFalse(Product.objects.exists())
+
+    def test_update(self):
+        own = Product.objects.create(title='Свой', price=10, category=self.first, owner=self.user)
+        foreign = Product.objects.create(title='Чужой', price=10, category=self.first, owner=self.other)
+        version = Product.objects.get(id=own.id).version
+
+        items = [{'id': own.id, 'title': 'Свой', 'price': 15, 'category': self.second.id},
+                 {'id': foreign.id, 'title': 'Захват', 'price': 1, 'category': self.first.id},
+                 {'id': 999999, 'title': 'Нет', 'price': 1, 'category': self.first.id}]
+        response = self.client.put('/api/v1/products/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 400)
+        errors = response.data['errors']
+        self.assertEqual((errors[0], set(errors[1]), set(errors[2])), ({}, {'id'}, {'id'}))
+        self.assertEqual(Product.objects.get(id=foreign.id).title, 'Чужой')
+        self.assertEqual(Product.objects.get(id=own.id).category_id, self.first.id)
+
+        # повтор id — ошибка каждого повтора, а не тихая перезапись последним
+        duplicate = {**items[0], 'price': 99}
+        response = self.client.put('/api/v1/products/bulk/', [items[0], duplicate, duplicate], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([set(error) for error in response.data['errors']], [set(), {'id'}, {'id'}])
+        self.assertEqual(Product.objects.get(id=own.id).price, 10)
+
+        response = self.client.put('/api/v1/products/bulk/', items[:1], format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        own = Product.objects.get(id=own.id)
+        self.assertEqual((own.price, own.category_id, own.version), (15, self.second.id, version + 1))
+        self.assertEqual([Category.objects.get(id=category.id).products_count for category in (self.first, self.second)],
+                         [1, 1])
+
+        # персонал может менять любые товары
+        self.client.force_authenticate(CustomUser.objects.create_user(email='staff@example.com', password='secret',
+                                                                      is_staff=True))
+        self.assertEqual(self.client.put('/api/v1/products/bulk/', items[1:2], format='json').status_code, 200)
+        self.assertEqual(Product.objects.get(id=foreign.id).title, 'Захват')
+
+    def test_reviews(self):
+        product = Product.objects.create(title='Товар', price=10, category=self.first, owner=self.user)
+        items = [{'text': 'Отзыв', 'stars': stars, 'product': product.id} for stars in (5, 4, 3)]
+        response = self.client.post('/api/v1/products/reviews/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        product.refresh_from_db()
+        self.assertEqual((product.reviews_count, product.rating, product.stars_4), (3, 4.0, 1))
+
+        invalid = [{'text': 'Отзыв', 'stars': 6, 'product': product.id},
+                   {'text': 'Отзыв', 'stars': 5, 'product': 999999}]
+        response = self.client.post('/api/v1/products/reviews/bulk/', invalid, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([set(error) for error in response.data['errors']], [{'stars'}, {'product'}])
+        self.assertEqual(Review.objects.count(), 3)
+
+        # персоналу создавать отзывы нельзя, как и в ReviewViewSet
+        self.client.force_authenticate(CustomUser.objects.create_user(email='staff@example.com', password='secret',
+                                                                      is_staff=True))
+        self.assertEqual(self.client.post('/api/v1/products/reviews/bulk/', items,
+                                          format='json').status_code, 403)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class FilterFacetsTests(APITestCase):
+    """Фильтры списка товаров и фасеты по тому же отфильтрованному набору."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email='owner@example.com', password='secret')
+        cls.other = CustomUser.objects.create_user(email='other@example.com', password='secret')
+        cls.first, cls.second = Category.objects.bulk_create([Category(name='Первая'), Category(name='Вторая')])
+        products = Product.objects.bulk_create([
+            Product(title='Дешёвый', price=5, category=cls.first, owner=cls.user),
+            Product(title='Средний', price=20, category=cls.first, owner=cls.user),
+            Product(title='Средний 2', price='49.99', category=cls.first, owner=cls.other),
+            Product(title='Дорогой', price=600, category=cls.second, owner=cls.user),
+        ])
+        cls.ids = {product.title: product.id for product in products}
+        Review.objects.bulk_create([Review(text='Отзыв', stars=5, product=products[1]),
+                                    Review(text='Отзыв', stars=2, product=products[3])])
+        refresh_ratings()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def titles(self, query):
+        response = self.client.get(f'/api/v1/products/?page_size=100&{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return {product['title'] for product in response.data['results']}
+
+    def test_filters(self):
+        self.assertEqual(self.titles(f'category={self.second.id}'), {'Дорогой'})
+        self.assertEqual(len(self.titles(f'category={self.first.id},{self.second.id}')), 4)
+        self.assertEqual(self.titles('min_price=10&max_price=49.99'), {'Средний', 'Средний 2'})
+        self.assertEqual(self.titles('min_rating=3'), {'Средний'})
+        self.assertEqual(self.titles(f'owner={self.other.id}'), {'Средний 2'})
+        for query in ('category=abc', 'min_price=дорого', 'min_rating=x', 'owner=1.5'):
+            self.assertEqual(self.client.get(f'/api/v1/products/?{query}').status_code, 400, query)
+
+    def test_non_finite_values(self):
+        for query in ('min_price=NaN', 'max_price=Infinity', 'min_price=-inf', 'max_price=sNaN', 'min_rating=nan',
+                      'min_rating=inf'):
+            response = self.client.get(f'/api/v1/products/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn(query.split('=')[0], response.data)
+            # выгрузка использует те же фильтры
+            self.assertEqual(self.client.get(f'/api/v1/products/export/?{query}').status_code, 400, query)
+
+    def test_facets(self):
+        response = self.client.get('/api/v1/products/?facets=1')
+        self.assertEqual(response.data['facets'], {
+            'categories': [{'id': self.first.id, 'name': 'Первая', 'count': 3},
+                           {'id': self.second.id, 'name': 'Вторая', 'count': 1}],
+            'price': [{'range': '0-10', 'count': 1}, {'range': '10-50', 'count': 2}, {'range': '50-100', 'count': 0},
+                      {'range': '100-500', 'count': 0}, {'range': '500+', 'count': 1}],
+        })
+        self.assertNotIn('facets', self.client.get('/api/v1/products/').data)
+
+        # фасеты считаются по отфильтрованному набору, а не по всей странице или каталогу
+        facets = self.client.get('/api/v1/products/?facets=true&min_price=10&page_size=1').data['facets']
+        self.assertEqual(facets['categories'], [{'id': self.first.id, 'name': 'Первая', 'count': 2},
+                                                {'id': self.second.id, 'name': 'Вторая', 'count': 1}])
+        self.assertEqual([bucket['count'] for bucket in facets['price']], [0, 2, 0, 0, 1])
+
+
+class ExportTests(APITestCase):
+    """Потоковая выгрузка каталога в NDJSON и CSV с фильтрами и updated_since."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email='owner@example.com', password='secret')
+        cls.first, cls.second = Category.objects.bulk_create([Category(name='Первая'), Category(name='Вторая')])
+        cls.products = Product.objects.bulk_create([
+            Product(title='Товар', description='Строка, с "кавычками"\nи переносом', price='10.50',
+                    category=cls.first, owner=cls.user),
+            Product(title='Другой', price=20, category=cls.second, owner=cls.user),
+        ])
+        Review.objects.create(text='Отзыв', stars=4, product=cls.products[0])
+        cls.old = timezone.make_aware(datetime.datetime(2024, 1, 1, 12, 0), datetime.timezone.utc)
+        Product.objects.filter(id=cls.products[1].id).update(updated_at=cls.old)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def export(self, **params):
+        response = self.client.get('/api/v1/products/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_ndjson(self):
+        response, body = self.export(include='category,rating')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['id'] for row in rows], [product.id for product in self.products])
+        first = rows[0]
+        self.assertEqual((first['title'], first['description'], first['price']),
+                         ('Товар', 'Строка, с "кавычками"\nи переносом', '10.50'))
+        self.assertEqual((first['category'], first['category_name'], first['owner']),
+                         (self.first.id, 'Первая', self.user.id))
+        self.assertEqual((first['rating'], first['reviews_count'], first['stars_4']), (4.0, 1, 1))
+
+        _, body = self.export()
+        self.assertEqual(set(json.loads(body.splitlines()[0])),
+                         {'id', 'title', 'description', 'price', 'category', 'owner', 'updated_at'})
+
+    def test_csv(self):
+        response, body = self.export(output='csv', include='category', category=self.first.id)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment', response['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0], ['id', 'title', 'description', 'price', 'category', 'owner', 'updated_at',
+                                   'category_name'])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][:4],
+                         [str(self.products[0].id), 'Товар', 'Строка, с "кавычками"\nи переносом', '10.50'])
+
+    def test_updated_since(self):
+        recent = [product.id for product in self.products[:1]]
+        for value in ('2025-01-01T00:00:00Z', '2025-01-01T03:00:00+03:00', '2025-01-01 00:00'):
+            _, body = self.export(updated_since=value)
+            self.assertEqual([json.loads(line)['id'] for line in body.splitlines()], recent, value)
+        _, body = self.export(updated_since=self.old.isoformat())
+        self.assertEqual(len(body.splitlines()), 2)
+
+    def test_errors(self):
+        for params in ({'updated_since': 'вчера'}, {'output': 'xml'}, {'min_price': 'x'}):
+            self.assertEqual(self.client.get('/api/v1/products/export/', params).status_code, 400, params)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/api/v1/products/export/').status_code, 401)
+
+
+class ImportCatalogTests(APITestCase):
+    """import_catalog: загрузка через COPY, продолжение только того же файла, ошибки с диапазоном записей."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.checkpoint = os.path.join(self.directory, 'import.checkpoint')
+
+    def write(self, name, lines):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+        return path
+
+    def call(self, **options):
+        call_command('import_catalog', chunk_size=2, checkpoint=self.checkpoint, stdout=io.StringIO(), **options)
+
+    def test_import(self):
+        self.call(products=self.write('products.csv', ['title,description,price,category', 'Товар 1,,10.50,Книги',
+                                                       'Товар 2,Описание,20,Книги', 'Товар 3,,30,Игры']))
+        self.assertEqual(dict(Category.objects.values_list('name', 'products_count')), {'Книги': 2, 'Игры': 1})
+        product = Product.objects.get(title='Товар 1')
+        self.call(reviews=self.write('reviews.jsonl', [json.dumps({'text': 'Отзыв', 'stars': stars, 'product': product.id})
+                                                       for stars in (5, 3)]))
+        product.refresh_from_db()
+        self.assertEqual((product.reviews_count, product.rating, product.stars_3), (2, 4.0, 1))
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resume_same_file_only(self):
+        product = Product.objects.create(title='Товар', price=10, category=Category.objects.create(name='Книги'))
+        path = self.write('reviews.jsonl', [json.dumps({'text': 'Отзыв', 'stars': 5, 'product': product_id})
+                                            for product_id in (product.id, product.id, product.id, 999999)])
+        # внешний ключ проверяется в своём чанке, а не при коммите всей загрузки
+        with self.assertRaisesMessage(CommandError, 'reviews, записи 3-4'):
+            self.call(reviews=path)
+        self.assertEqual(Review.objects.count(), 2)
+        with open(self.checkpoint) as file:
+            self.assertEqual(json.load(file)['reviews']['done'], 2)
+
+        with self.assertRaisesMessage(CommandError, 'загружено записей: 2'):
+            self.call(reviews=self.write('other.jsonl', ['{}']), resume=True)
+        modified = os.stat(path).st_mtime_ns
+        os.utime(path, ns=(modified, modified + 10 ** 9))
+        with self.assertRaisesMessage(CommandError, 'другого файла'):
+            self.call(reviews=path, resume=True)
+        os.utime(path, ns=(modified, modified))
+
+        Product.objects.create(id=999999, title='Найден', price=10, category=product.category)
+        self.call(reviews=path, resume=True)
+        self.assertEqual(Review.objects.count(), 4)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_record_errors(self):
+        with self.assertRaisesMessage(CommandError, 'products, запись 3: некорректная цена'):
+            self.call(products=self.write('products.csv', ['title,price,category', 'Товар 1,10,Книги',
+                                                           'Товар 2,20,Книги', 'Товар 3,дорого,Книги']))
+        self.assertEqual(Product.objects.count(), 2)
+        # ошибки самой базы (здесь переполнение numeric) — тоже CommandError с диапазоном записей
+        with self.assertRaisesMessage(CommandError, 'products, записи 1-1'):
+            self.call(products=self.write('expensive.csv', ['title,price,category', 'Дорогой,123456,Книги']))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class AsyncReadTests(APITestCase):
+    """Async-эндпоинты отдают то же, что синхронные, с теми же ошибками."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email='owner@example.com', password='secret')
+        seed_catalog(12, owner=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def assertSame(self, path):
+        sync = self.client.get(f'/api/v1/products/{path}')
+        async_ = self.client.get(f'/api/v1/async/products/{path}')
+        self.assertEqual(async_.status_code, sync.status_code, path)
+        expected = json.loads(sync.content.replace(b'/api/v1/products/', b'/api/v1/async/products/'))
+        self.assertEqual(async_.json(), expected, path)
+        return async_
+
+    def test_same_responses(self):
+        product, category = Product.objects.first(), Category.objects.first()
+        for path in ('', '?page=2&page_size=3', '?page=3&page_size=5', f'?category={category.id}&min_price=100',
+                     f'{product.id}/', 'categories/', 'categories/?page_size=2&page=2', f'categories/{category.id}/',
+                     'reviews/?page_size=100'):
+            self.assertSame(path)
+
+    def test_errors(self):
+        self.assertEqual(self.assertSame('999999/').status_code, 404)
+        self.assertEqual(self.assertSame('categories/999999/').status_code, 404)
+        self.assertEqual(self.assertSame('?page=100').status_code, 404)
+        self.assertEqual(self.assertSame('?min_price=x').status_code, 400)
+        self.assertEqual(self.client.post('/api/v1/async/products/categories/', {'name': 'Новая'}).status_code, 405)
+
+        self.client.credentials()
+        self.assertEqual(self.client.get('/api/v1/async/products/').status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer invalid')
+        self.assertEqual(self.client.get('/api/v1/async/products/').status_code, 401)
+        # детальная страница доступна без токена
+        self.client.credentials()
+        self.assertEqual(self.client.get(f'/api/v1/async/products/{Product.objects.first().id}/').status_code, 200)
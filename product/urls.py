@@ -2,17 +2,33 @@ from django.urls import path, include
 from .views import (
     CategoryListCreateAPIView,
     CategoryDetailAPIView,
+    CategoryStatsListAPIView,
+    CategoryStatsDetailAPIView,
     ProductListCreateAPIView,
     ProductDetailAPIView,
     ReviewViewSet,
+    ProductReviewsAPIView,
+    OwnerProductsAPIView,
     ProductWithReviewsAPIView,
+    ProductBulkAPIView,
+    ProductSearchAPIView,
+    ProductExportAPIView,
+    ReviewBulkCreateAPIView,
     RunExampleTaskAPIView)
 
 urlpatterns = [
     path('', ProductListCreateAPIView.as_view()),
+    path('bulk/', ProductBulkAPIView.as_view()),
+    path('search/', ProductSearchAPIView.as_view()),
+    path('export/', ProductExportAPIView.as_view()),
+    path('mine/', OwnerProductsAPIView.as_view()),
     path('<int:id>/', ProductDetailAPIView.as_view()),
+    path('<int:id>/reviews/', ProductReviewsAPIView.as_view()),
     path('categories/', CategoryListCreateAPIView.as_view()),
     path('categories/<int:id>/', CategoryDetailAPIView.as_view()),
+    path('analytics/categories/', CategoryStatsListAPIView.as_view()),
+    path('analytics/categories/<int:id>/', CategoryStatsDetailAPIView.as_view()),
     path('reviews/', ProductWithReviewsAPIView.as_view()),
+    path('reviews/bulk/', ReviewBulkCreateAPIView.as_view()),
     path('run-task/', RunExampleTaskAPIView.as_view(), name='run-task')
 ]
\ No newline at end of file
@@ -1,18 +1,34 @@
-from collections import OrderedDict
 from datetime import date
+from django.contrib.postgres.search import SearchRank, TrigramSimilarity
 from django.db import transaction
+from django.db.models import F, Subquery
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView 
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.generics import ListAPIView, ListCreateAPIView, RetrieveAPIView, RetrieveUpdateDestroyAPIView
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotFound, ValidationError
 
+from shop_api.idempotency import IdempotencyMixin
+from shop_api.rate_limit import RateLimit
+
+from .aggregates import refresh_products_count, refresh_ratings
+from .cache import CachedResponseMixin, bump_generation_on_commit, row_validators
+from .export import csv_lines, export_fields, export_rows, ndjson_lines
+from .fieldsets import SparseFieldsMixin, parse_fieldset
+from .filters import filter_products, owner_totals, product_facets, search_products, totals_summary
+from .pagination import CursorOnlyPagination, CustomPagination
 from .permissions import IsModeratorPermission
-from .models import Category, Product, Review
+from .read_plan import ReadPlan, ReadPlanListMixin, plan_rows
+from .models import Category, CategoryStats, Product, Review
 from .serializers import (
     CategorySerializer,
+    CategoryStatsSerializer,
+    OwnerProductSerializer,
     ProductSerializer,
     ReviewSerializer,
     ProductWithReviewsSerializer,
@@ -21,28 +37,58 @@ from .serializers import (
     ReviewValidateSerializer
 )
 
-from .tasks import example_delay_task  # <- импорт задачи
+from .tasks import simple_task  # <- импорт задачи
+
+
+MAX_BULK_ITEMS = 5000
+BULK_BATCH_SIZE = 500
+
+
+def check_adult(user):
+    if not user.birthday:
+        return Response({"error": "Укажите дату рождения в профиле."}, status=status.HTTP_400_BAD_REQUEST)
 
-PAGE_SIZE = 5
+    today = date.today()
+    age = today.year - user.birthday.year - ((today.month, today.day) < (user.birthday.month, user.birthday.day))
 
+    if age < 18:
+        return Response({"error": "Вам должно быть 18 лет, чтобы создать продукт."}, status=status.HTTP_403_FORBIDDEN)
+    return None
 
-class CustomPagination(PageNumberPagination):
-    def get_paginated_response(self, data):
-        return Response(OrderedDict([
-            ('total', self.page.paginator.count),
-            ('next', self.get_next_link()),
-            ('previous', self.get_previous_link()),
-            ('results', data)
-        ]))
 
-    def get_page_size(self, request):
-        return PAGE_SIZE
+def bulk_items(request):
+    items = request.data
+    if not isinstance(items, list) or not items:
+        raise ValidationError({'error': 'Ожидается непустой список объектов.'})
+    if len(items) > MAX_BULK_ITEMS:
+        raise ValidationError({'error': f'Не более {MAX_BULK_ITEMS} объектов за запрос.'})
+    return items
 
 
-class CategoryListCreateAPIView(ListCreateAPIView):
+def referenced_ids(items, field):
+    ids = set()
+    for item in items:
+        try:
+            ids.add(int(item.get(field)))
+        except (AttributeError, TypeError, ValueError):
+            pass
+    return ids
+
+
+def validate_bulk(items, serializer_class, context):
+    """Валидирует каждый элемент; ошибки возвращаются списком по индексам элементов."""
+    serializers = [serializer_class(data=item, context=context) for item in items]
+    errors = [{} if serializer.is_valid() else serializer.errors for serializer in serializers]
+    return serializers, errors
+
+
+class CategoryListCreateAPIView(IdempotencyMixin, CachedResponseMixin, ReadPlanListMixin, ListCreateAPIView):
     queryset = Category.objects.all()
+    cache_models = (Category, Product)
     serializer_class = CategorySerializer
     pagination_class = CustomPagination
+    query_budget = {'GET': 2, 'POST': 2}
+    rate_limits = {'POST': (RateLimit('user', '30/min', burst=10),)}
 
     def post(self, request, *args, **kwargs):
         serializer = CategoryValidateSerializer(data=request.data)
@@ -53,10 +99,15 @@ class CategoryListCreateAPIView(ListCreateAPIView):
                         status=status.HTTP_201_CREATED)
 
 
-class CategoryDetailAPIView(RetrieveUpdateDestroyAPIView):
+class CategoryDetailAPIView(CachedResponseMixin, RetrieveUpdateDestroyAPIView):
     queryset = Category.objects.all()
+    cache_models = (Category, Product)
     serializer_class = CategorySerializer
     lookup_field = 'id'
+    query_budget = {'GET': 2, 'PUT': 2, 'PATCH': 2, 'DELETE': 8}
+
+    def get_validators(self, request, key, changed_at, *args, **kwargs):
+        return row_validators(Category.objects.all(), kwargs['id'], key)
 
     def put(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -69,23 +120,31 @@ class CategoryDetailAPIView(RetrieveUpdateDestroyAPIView):
         return Response(data=CategorySerializer(instance).data)
 
 
-class ProductListCreateAPIView(ListCreateAPIView):
-    queryset = Product.objects.select_related('category').all()
+class ProductListCreateAPIView(IdempotencyMixin, CachedResponseMixin, SparseFieldsMixin, ReadPlanListMixin, ListCreateAPIView):
+    queryset = Product.objects.all()
+    cache_models = (Category, Product)  # Category — для ?expand=category
     serializer_class = ProductSerializer
     pagination_class = CustomPagination
+    cursor_ordering_fields = ('id', 'price')
     permission_classes = [IsAuthenticated]  # Требуется авторизация
+    query_budget = {'GET': 3, 'POST': 4}
+    rate_limits = {'POST': (RateLimit('user', '60/min', burst=20),)}
 
-    def post(self, request, *args, **kwargs):
-        user = request.user
+    def get_queryset(self):
+        return filter_products(super().get_queryset(), self.request.query_params)
 
-        if not user.birthday:
-            return Response({"error": "Укажите дату рождения в профиле."}, status=status.HTTP_400_BAD_REQUEST)
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if request.query_params.get('facets') in ('1', 'true'):
+            response.data['facets'] = product_facets(self.get_queryset())
+        return response
 
-        today = date.today()
-        age = today.year - user.birthday.year - ((today.month, today.day) < (user.birthday.month, user.birthday.day))
+    def post(self, request, *args, **kwargs):
+        user = request.user
 
-        if age < 18:
-            return Response({"error": "Вам должно быть 18 лет, чтобы создать продукт."}, status=status.HTTP_403_FORBIDDEN)
+        error_response = check_adult(user)
+        if error_response:
+            return error_response
 
         serializer = ProductValidateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -95,17 +154,23 @@ class ProductListCreateAPIView(ListCreateAPIView):
             description=serializer.validated_data.get('description'),
             price=serializer.validated_data.get('price'),
             category=serializer.validated_data.get('category'),
-            owner=user
+            owner_id=user.id
         )
 
         return Response(data=ProductSerializer(product).data,
                         status=status.HTTP_201_CREATED)
 
 
-class ProductDetailAPIView(RetrieveUpdateDestroyAPIView):
-    queryset = Product.objects.select_related('category').all()
+class ProductDetailAPIView(CachedResponseMixin, SparseFieldsMixin, RetrieveUpdateDestroyAPIView):
+    queryset = Product.objects.all()
+    cache_models = (Category, Product)  # Category — для ?expand=category
     serializer_class = ProductSerializer
     lookup_field = 'id'
+    query_budget = {'GET': 2, 'PUT': 5, 'PATCH': 5, 'DELETE': 7}
+
+    def get_validators(self, request, key, changed_at, *args, **kwargs):
+        _, expand = self.get_fieldset()
+        return row_validators(Product.objects.all(), kwargs['id'], key, related=sorted(expand))
 
     def put(self, request, *args, **kwargs):
         product = self.get_object()
@@ -121,12 +186,14 @@ class ProductDetailAPIView(RetrieveUpdateDestroyAPIView):
         return Response(data=ProductSerializer(product).data)
 
 
-class ReviewViewSet(ModelViewSet):
+class ReviewViewSet(IdempotencyMixin, ReadPlanListMixin, ModelViewSet):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
     pagination_class = CustomPagination
+    cursor_ordering_fields = ('id', 'stars')
     permission_classes = [IsModeratorPermission]
     lookup_field = 'id'
+    rate_limits = {'POST': (RateLimit('user', '60/min', burst=20),)}
 
     def perform_create(self, serializer):  
         serializer.save(owner=self.request.user)
@@ -157,17 +224,289 @@ class ReviewViewSet(ModelViewSet):
         return Response(data=ReviewSerializer(review).data)
 
 
-class ProductWithReviewsAPIView(APIView):
+class ProductSearchAPIView(CachedResponseMixin, SparseFieldsMixin, ReadPlanListMixin, ListAPIView):
+    """
+    Ранжированный поиск по названию и описанию.
+
+    Полнотекстовое совпадение идёт по GIN-индексу search_vector, опечатки в
+    названии ловит триграммный индекс; оба условия объединяются через OR.
+    Порядок -rank, id курсором не выражается (rank вычисляется в запросе),
+    поэтому пагинация только постраничная.
+    """
+    serializer_class = ProductSerializer
+    pagination_class = CustomPagination
+    cursor_ordering_fields = ()
+    cache_models = (Product,)
+    query_budget = 2
+
+    def get_queryset(self):
+        text = self.request.query_params.get('q', '').strip()
+        if len(text) < 2:
+            raise ValidationError({'q': 'Минимум 2 символа.'})
+        products, query = search_products(Product.objects.all(), text)
+        return (products
+                .annotate(rank=SearchRank(F('search_vector'), query) + TrigramSimilarity('title', text))
+                .order_by('-rank', 'id'))
+
+
+class ProductExportAPIView(APIView):
+    """
+    Потоковая выгрузка всего каталога в NDJSON или CSV.
+
+    ?output=ndjson|csv, ?include=category,rating, ?updated_since=<ISO 8601>
+    для инкрементальной выгрузки. Поддерживаются те же фильтры, что и у списка.
+    """
+    permission_classes = [IsAuthenticated]
+
     def get(self, request):
-        paginator = CustomPagination()
-        products = Product.objects.select_related('category').prefetch_related('reviews').all()
-        result_page = paginator.paginate_queryset(products, request)
+        output = request.query_params.get('output', 'ndjson')
+        if output not in ('ndjson', 'csv'):
+            raise ValidationError({'output': 'Допустимые значения: ndjson, csv.'})
+        include = set(request.query_params.get('include', '').split(','))
+
+        products = filter_products(Product.objects.all(), request.query_params)
+        updated_since = request.query_params.get('updated_since')
+        if updated_since:
+            parsed = parse_datetime(updated_since)
+            if parsed is None:
+                raise ValidationError({'updated_since': 'Ожидается дата и время в формате ISO 8601.'})
+            if timezone.is_naive(parsed):
+                parsed = timezone.make_aware(parsed)
+            products = products.filter(updated_at__gte=parsed)
+
+        fields = export_fields('category' in include, 'rating' in include)
+        rows = export_rows(products, fields)
+        if output == 'csv':
+            response = StreamingHttpResponse(csv_lines(rows, fields), content_type='text/csv; charset=utf-8')
+            response['Content-Disposition'] = 'attachment; filename="products.csv"'
+        else:
+            response = StreamingHttpResponse(ndjson_lines(rows, fields), content_type='application/x-ndjson')
+        return response
+
+
+class ProductBulkAPIView(IdempotencyMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    # до MAX_BULK_ITEMS строк за запрос, поэтому лимит строже, чем у одиночного создания
+    rate_limits = (RateLimit('user', '10/min', burst=3),)
+
+    def post(self, request):
+        user = request.user
+        error_response = check_adult(user)
+        if error_response:
+            return error_response
+
+        items = bulk_items(request)
+        categories = Category.objects.in_bulk(referenced_ids(items, 'category'))
+        serializers, errors = validate_bulk(items, ProductValidateSerializer, {'categories': categories})
+        if any(errors):
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        products = [
+            Product(
+                title=serializer.validated_data.get('title'),
+                description=serializer.validated_data.get('description'),
+                price=serializer.validated_data.get('price'),
+                category=serializer.validated_data.get('category'),
+                owner_id=user.id
+            )
+            for serializer in serializers
+        ]
+        with transaction.atomic():
+            Product.objects.bulk_create(products, batch_size=BULK_BATCH_SIZE)
+            # bulk_create не вызывает сигналы, поэтому производные данные обновляем явно
+            refresh_products_count({product.category_id for product in products})
+            bump_generation_on_commit(Product)
+
+        return Response(data=ProductSerializer(products, many=True).data,
+                        status=status.HTTP_201_CREATED)
+
+    def put(self, request):
+        items = bulk_items(request)
+        categories = Category.objects.in_bulk(referenced_ids(items, 'category'))
+        products = Product.objects.only('id', 'owner_id', 'category_id').in_bulk(referenced_ids(items, 'id'))
+        serializers, errors = validate_bulk(items, ProductValidateSerializer, {'categories': categories})
+
+        permission = IsModeratorPermission()
+        to_update, seen = [], set()
+        for index, (item, serializer) in enumerate(zip(items, serializers)):
+            try:
+                product = products.get(int(item.get('id')))
+            except (AttributeError, TypeError, ValueError):
+                product = None
+            if product is None:
+                errors[index]['id'] = ['Product does not exist']
+            elif product.id in seen:
+                # иначе молча победила бы последняя запись
+                errors[index]['id'] = ['Товар уже указан в этом запросе.']
+            elif not permission.has_object_permission(request, self, product):
+                errors[index]['id'] = ['Нет прав на изменение этого товара.']
+            elif not errors[index]:
+                to_update.append((product, serializer.validated_data))
+            if product is not None:
+                seen.add(product.id)
+        if any(errors):
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        affected_categories = set()
+        now = timezone.now()
+        for product, data in to_update:
+            affected_categories.add(product.category_id)
+            product.title = data.get('title')
+            product.description = data.get('description')
+            product.price = data.get('price')
+            product.category = data.get('category')
+            product.updated_at = now
+            product.version = F('version') + 1
+            affected_categories.add(product.category_id)
+        updated = [product for product, _ in to_update]
+        with transaction.atomic():
+            Product.objects.bulk_update(updated, ['title', 'description', 'price', 'category', 'updated_at', 'version'],
+                                        batch_size=BULK_BATCH_SIZE)
+            refresh_products_count(affected_categories)
+            bump_generation_on_commit(Product)
+
+        return Response(data=ProductSerializer(updated, many=True).data)
+
+
+class ReviewBulkCreateAPIView(IdempotencyMixin, APIView):
+    permission_classes = [IsModeratorPermission]
+    rate_limits = (RateLimit('user', '10/min', burst=3),)
+
+    def post(self, request):
+        items = bulk_items(request)
+        products = Product.objects.only('id').in_bulk(referenced_ids(items, 'product'))
+        serializers, errors = validate_bulk(items, ReviewValidateSerializer, {'products': products})
+        if any(errors):
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        reviews = [
+            Review(
+                text=serializer.validated_data.get('text'),
+                stars=serializer.validated_data.get('stars'),
+                product=serializer.validated_data.get('product')
+            )
+            for serializer in serializers
+        ]
+        with transaction.atomic():
+            Review.objects.bulk_create(reviews, batch_size=BULK_BATCH_SIZE)
+            refresh_ratings({review.product_id for review in reviews})
+            bump_generation_on_commit(Review)
+            bump_generation_on_commit(Product)
+
+        return Response(data=ReviewSerializer(reviews, many=True).data,
+                        status=status.HTTP_201_CREATED)
+
 
-        serializer = ProductWithReviewsSerializer(result_page, many=True)
-        return paginator.get_paginated_response(serializer.data)
+class ProductReviewsAPIView(CachedResponseMixin, ReadPlanListMixin, ListAPIView):
+    """
+    Все отзывы одного товара, только по курсору: у популярного товара их могут быть
+    десятки тысяч, и OFFSET по ним слишком дорог.
+
+    ?ordering=-id (по умолчанию, новые первыми), id, -stars или stars.
+    """
+    serializer_class = ReviewSerializer
+    pagination_class = CursorOnlyPagination
+    cursor_ordering_fields = ('id', 'stars')
+    cursor_default_ordering = '-id'
+    cache_models = (Product, Review)
+    query_budget = 2
+
+    def get_queryset(self):
+        return Review.objects.filter(product_id=self.kwargs['id'])
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        # пустая страница — либо отзывов нет, либо нет самого товара
+        if not response.data['results'] and not Product.objects.filter(id=self.kwargs['id']).exists():
+            raise NotFound()
+        return response
+
+
+class ProductWithReviewsAPIView(CachedResponseMixin, APIView):
+    cursor_ordering_fields = ('id', 'price')
+    cache_models = (Category, Product, Review)
+    query_budget = 3
+
+    def get(self, request):
+        fields, expand = parse_fieldset(request, ProductWithReviewsSerializer)
+        context = {'fields': fields, 'expand': expand}
+        paginator = CustomPagination()
+        plan = ReadPlan(ProductWithReviewsSerializer(context=context))
+        rows = plan_rows(Product.objects.all(), plan, self.cursor_ordering_fields)
+        result_page = paginator.paginate_queryset(rows, request, view=self)
+        return paginator.get_paginated_response(plan.represent(result_page))
+
+
+class OwnerProductsAPIView(ListAPIView):
+    """
+    Товары текущего пользователя с числом отзывов и рейтингом каждого и итогами
+    по всем его товарам (totals) — одним запросом.
+
+    Страница читается по индексу product_owner_id_idx (owner_id, id), итоги —
+    некоррелированным подзапросом по тому же индексу (rating и reviews_count в
+    INCLUDE), поэтому у продавца со 100k+ товаров ни товары, ни отзывы не
+    перебираются. Только курсор: ?ordering=-id (по умолчанию) или id.
+    Ответ у каждого пользователя свой, поэтому он не кэшируется.
+    """
+    serializer_class = OwnerProductSerializer
+    pagination_class = CursorOnlyPagination
+    cursor_ordering_fields = ('id',)
+    cursor_default_ordering = '-id'
+    permission_classes = [IsAuthenticated]
+    query_budget = 1
+
+    def get_queryset(self):
+        # request.user — пользователь из токена без запроса к базе, фильтруем по id
+        return Product.objects.filter(owner_id=self.request.user.id)
+
+    def list(self, request, *args, **kwargs):
+        products = self.get_queryset()
+        plan = ReadPlan(self.get_serializer())
+        rows = plan_rows(products.annotate(totals=Subquery(owner_totals(products))), plan,
+                         (*self.cursor_ordering_fields, 'totals'))
+        page = self.paginate_queryset(rows)
+        # после последней страницы строк нет, итоги тогда отдельным запросом
+        if page:
+            totals = page[0]['totals']
+        else:
+            totals = next(iter(owner_totals(products).values_list('totals', flat=True)), None)
+        response = self.get_paginated_response(plan.represent(page))
+        response.data['totals'] = totals_summary(totals)
+        return response
+
+
+class CategoryStatsListAPIView(CachedResponseMixin, ReadPlanListMixin, ListAPIView):
+    """
+    Статистика всех категорий для дашбордов из материализованного представления
+    product_category_stats: цены, число товаров и отзывов, средняя оценка.
+
+    Данные пересчитывает задача update_category_stats (CELERY_BEAT_SCHEDULE), время
+    пересчёта — в refreshed_at. ?ordering=-reviews_count и т. п. по полям ordering_fields.
+    """
+    serializer_class = CategoryStatsSerializer
+    cache_models = (CategoryStats,)
+    permission_classes = [IsAuthenticated]
+    ordering_fields = ('category', 'products_count', 'price_avg', 'rating', 'reviews_count')
+    query_budget = 1
+
+    def get_queryset(self):
+        ordering = self.request.query_params.get('ordering', 'category')
+        if ordering.lstrip('-') not in self.ordering_fields:
+            raise ValidationError({'ordering': f'Допустимые поля: {", ".join(self.ordering_fields)}.'})
+        return CategoryStats.objects.order_by(ordering, 'category')
+
+
+class CategoryStatsDetailAPIView(CachedResponseMixin, RetrieveAPIView):
+    queryset = CategoryStats.objects.all()
+    serializer_class = CategoryStatsSerializer
+    cache_models = (CategoryStats,)
+    permission_classes = [IsAuthenticated]
+    lookup_field = 'pk'
+    lookup_url_kwarg = 'id'
+    query_budget = 1
 
 
 class RunExampleTaskAPIView(APIView):
     def get(self, request):
-        example_delay_task.delay()
+        simple_task.delay()
         return Response({"status": "Задача Celery отправлена"})
\ No newline at end of file
@@ -3,14 +3,24 @@ ASGI config for shop_api project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Async endpoints (product/async_views.py, users/async_views.py) are mounted
+under /api/v1/async/. To serve them without blocking a worker per request, run
+gunicorn with uvicorn workers instead of the sync WSGI workers:
+
+    gunicorn shop_api.asgi:application -k uvicorn.workers.UvicornWorker -w 4 --bind 0.0.0.0:8000
+
+or `docker compose --profile asgi up backend-asgi`.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
+import dotenv
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shop_api.settings')
+dotenv.load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
 
 application = get_asgi_application()
@@ -0,0 +1,180 @@
+"""
+Чтение с реплик Postgres.
+
+ReplicaRoutingMiddleware помечает запрос безопасного метода (GET/HEAD/OPTIONS) как
+читающий, и ReplicaRouter отправляет его SELECT-ы на одну из реплик из
+REPLICA_DATABASES. Всё остальное — записи, запросы небезопасных методов, Celery и
+management-команды — идёт в primary ('default').
+
+Read-your-writes: после успешного изменяющего запроса пользователь на
+READ_YOUR_WRITES_SECONDS «прилипает» к primary, чтобы сразу видеть свои изменения.
+Метка хранится в кэше по id пользователя (для анонимов — по IP) и проверяется лениво,
+при первом чтении, когда DRF уже аутентифицировал пользователя.
+
+Реплика считается недоступной, если не отвечает или отстаёт больше чем на
+REPLICA_MAX_LAG_SECONDS; результат проверки кэшируется в процессе на
+REPLICA_CHECK_INTERVAL секунд. Если здоровых реплик нет, чтение идёт в primary.
+
+Под ASGI middleware остаётся асинхронной: выбор хранится в ContextVar, а async ORM
+выполняет запросы в потоке с копией контекста, поэтому роутер видит выбор запроса.
+"""
+import contextvars
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PRIMARY = 'default'
+
+_routing = contextvars.ContextVar('db_routing', default=None)
+
+_health = {}
+_health_lock = threading.Lock()
+
+
+def sticky_key(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'db:sticky:user:{user.pk}'
+    return f'db:sticky:ip:{request.META.get("REMOTE_ADDR")}'
+
+
+def stick_to_primary(request):
+    # DRF проставляет аутентифицированного пользователя и в исходный request
+    cache.set(sticky_key(request), 1, timeout=settings.READ_YOUR_WRITES_SECONDS)
+
+
+def replica_lag(alias):
+    """Отставание реплики в секундах; 0 — реплика догнала primary или это не реплика."""
+    connection = connections[alias]
+    connection.ensure_connection()
+    # курсор драйвера напрямую: служебная проверка не должна попадать в счётчики запросов эндпоинта
+    with connection.wrap_database_errors, connection.connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT CASE WHEN NOT pg_is_in_recovery() '
+            '            OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+            '       ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+        )
+        return float(cursor.fetchone()[0])
+
+
+def replica_is_healthy(alias):
+    now = time.monotonic()
+    with _health_lock:
+        checked = _health.get(alias)
+        if checked and now - checked[0] < settings.REPLICA_CHECK_INTERVAL:
+            return checked[1]
+    try:
+        lag = replica_lag(alias)
+        healthy = lag <= settings.REPLICA_MAX_LAG_SECONDS
+        if not healthy:
+            logger.warning('Реплика %s отстаёт на %.1f с, чтение идёт в primary', alias, lag)
+    except DatabaseError:
+        logger.warning('Реплика %s недоступна, чтение идёт в primary', alias, exc_info=True)
+        healthy = False
+    with _health_lock:
+        _health[alias] = (now, healthy)
+    return healthy
+
+
+def choose_replica():
+    replicas = [alias for alias in settings.REPLICA_DATABASES if replica_is_healthy(alias)]
+    return random.choice(replicas) if replicas else PRIMARY
+
+
+@contextmanager
+def use_primary():
+    """Чтения внутри блока идут в primary, даже в GET-запросе."""
+    token = _routing.set(None)
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+
+class RequestRouting:
+    """
+    Выбор базы для чтения в рамках одного запроса.
+
+    Решение запоминается по ключу прилипания: чтения до аутентификации (старые
+    токены проверяются по базе) решаются по IP, после — по пользователю.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.decisions = {}
+
+    def db_for_read(self):
+        key = sticky_key(self.request)
+        if key not in self.decisions:
+            self.decisions[key] = PRIMARY if cache.get(key) else choose_replica()
+        return self.decisions[key]
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.REPLICA_DATABASES:
+            return self.get_response(request)
+
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            if response.status_code < 400:
+                stick_to_primary(request)
+            return response
+
+        token = _routing.set(RequestRouting(request))
+        try:
+            return self.get_response(request)
+        finally:
+            _routing.reset(token)
+
+    async def __acall__(self, request):
+        if not settings.REPLICA_DATABASES:
+            return await self.get_response(request)
+
+        if request.method not in SAFE_METHODS:
+            response = await self.get_response(request)
+            if response.status_code < 400:
+                # request.user может быть ленивым пользователем сессии, который читается из базы
+                await sync_to_async(stick_to_primary)(request)
+            return response
+
+        token = _routing.set(RequestRouting(request))
+        try:
+            return await self.get_response(request)
+        finally:
+            _routing.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        return routing.db_for_read() if routing else PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # реплики содержат те же данные, что и primary
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
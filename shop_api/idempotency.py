@@ -0,0 +1,187 @@
+"""
+Повтор запросов создания по заголовку Idempotency-Key.
+
+Мобильные клиенты повторяют POST после таймаута; без ключа каждый повтор заново
+проходит проверки и создаёт дубликат. Представление подключает IdempotencyMixin:
+
+    idempotent_methods = ('POST',)  # по умолчанию
+
+Первый ответ на ключ сохраняется в Redis на IDEMPOTENCY_TTL секунд и отдаётся
+повторам как есть (с заголовком Idempotent-Replayed: true). Пока первый запрос
+выполняется, ключ занят коротким замком: параллельный дубликат ждёт его ответа
+до IDEMPOTENCY_WAIT секунд, а не выполняет создание второй раз. Тот же ключ с
+другим телом запроса — ошибка клиента (422).
+
+Проверка ключа и захват замка — один скрипт Redis, сохранение ответа и снятие
+замка — ещё один. Если Redis недоступен, запрос выполняется как без ключа.
+"""
+import hashlib
+import logging
+import time
+import uuid
+
+import orjson
+from django.conf import settings
+from django.http.request import RawPostDataException
+from redis.exceptions import RedisError
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from shop_api.redis_client import get_redis
+from shop_api.renderers import ORJSONRenderer
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+
+# сохранённый ответ -> {1, ответ}; ключ свободен и замок взят -> {2}; ключ занят -> {0}
+CLAIM_SCRIPT = """
+local stored = redis.call('GET', KEYS[1])
+if stored then
+    return {1, stored}
+end
+if redis.call('SET', KEYS[2], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return {2}
+end
+return {0}
+"""
+
+# ответ сохраняется, замок снимается, только если он ещё наш
+STORE_SCRIPT = """
+if ARGV[2] ~= '' then
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+end
+if redis.call('GET', KEYS[2]) == ARGV[1] then
+    redis.call('DEL', KEYS[2])
+end
+return 1
+"""
+
+STORED, CLAIMED, BUSY = 1, 2, 0
+
+
+class IdempotencyKeyInUse(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Запрос с этим Idempotency-Key ещё выполняется, повторите позже.'
+    default_code = 'idempotency_key_in_use'
+
+
+class IdempotencyKeyMismatch(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'Idempotency-Key уже использован с другим запросом.'
+    default_code = 'idempotency_key_mismatch'
+
+
+class Replay(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+def response_key(scope, key):
+    return f'idempotency:{scope}:{key}'
+
+
+def lock_key(scope, key):
+    return f'idempotency_lock:{scope}:{key}'
+
+
+def claim_key(scope, key, token):
+    """(STORED, сохранённый ответ) | (CLAIMED, None) | (BUSY, None)."""
+    lock_ms = int(settings.IDEMPOTENCY_LOCK_TTL * 1000)
+    result = get_redis().register_script(CLAIM_SCRIPT)(
+        keys=[response_key(scope, key), lock_key(scope, key)], args=[token, lock_ms])
+    return result[0], (result[1] if len(result) > 1 else None)
+
+
+def store_response(scope, key, token, payload):
+    """Сохраняет ответ (payload=None — только снять замок)."""
+    get_redis().register_script(STORE_SCRIPT)(
+        keys=[response_key(scope, key), lock_key(scope, key)],
+        args=[token, payload or '', settings.IDEMPOTENCY_TTL])
+
+
+def request_fingerprint(request):
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode())
+    try:
+        digest.update(request.body)
+    except RawPostDataException:
+        # тело уже прочитано парсером (например, проверкой прав) — берём разобранные данные
+        digest.update(ORJSONRenderer().render(request.data))
+    return digest.hexdigest()
+
+
+def request_scope(request):
+    """Ключи разных пользователей не пересекаются; анонимные различаются по IP."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.id}'
+    return f'ip:{request.META.get("REMOTE_ADDR", "")}'
+
+
+class IdempotencyMixin:
+    """
+    Idempotency-Key для методов idempotent_methods.
+
+    Ключ проверяется после аутентификации и прав доступа (ответы 401/403 не
+    сохраняются), сохраняются все ответы, кроме 5xx: повтор ошибки валидации
+    даёт ту же ошибку без запросов к базе. Если обработчик упал с 500, замок
+    истекает через IDEMPOTENCY_LOCK_TTL и ключ можно использовать снова.
+    """
+    idempotent_methods = ('POST',)
+
+    def initial(self, request, *args, **kwargs):
+        self._idempotency = None
+        super().initial(request, *args, **kwargs)
+        key = request.headers.get(HEADER)
+        if key is None or request.method not in self.idempotent_methods:
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise ValidationError({HEADER: f'Ожидается непустая строка не длиннее {MAX_KEY_LENGTH} символов.'})
+
+        scope, token, fingerprint = request_scope(request), uuid.uuid4().hex, request_fingerprint(request)
+        try:
+            state, stored = claim_key(scope, key, token)
+            deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT
+            while state == BUSY and time.monotonic() < deadline:
+                time.sleep(POLL_INTERVAL)
+                state, stored = claim_key(scope, key, token)
+        except RedisError:
+            logger.warning('Redis недоступен, Idempotency-Key %s не проверяется', key)
+            return
+
+        if state == BUSY:
+            raise IdempotencyKeyInUse()
+        if state == STORED:
+            stored = orjson.loads(stored)
+            if stored['fingerprint'] != fingerprint:
+                raise IdempotencyKeyMismatch()
+            raise Replay(Response(stored['data'], status=stored['status'], headers={'Idempotent-Replayed': 'true'}))
+        self._idempotency = (scope, key, token, fingerprint)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, Replay):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        claimed, self._idempotency = getattr(self, '_idempotency', None), None
+        if claimed is None:
+            return response
+
+        scope, key, token, fingerprint = claimed
+        payload = None
+        if response.status_code < 500:
+            payload = orjson.dumps({
+                'fingerprint': fingerprint,
+                'status': response.status_code,
+                'data': orjson.loads(ORJSONRenderer().render(response.data) or b'null'),
+            })
+        try:
+            store_response(scope, key, token, payload)
+        except RedisError:
+            logger.warning('Redis недоступен, ответ на Idempotency-Key %s не сохранён', key)
+        return response
@@ -0,0 +1,122 @@
+"""
+Бюджеты SQL-запросов для эндпоинтов.
+
+Представление объявляет бюджет атрибутом класса:
+
+    query_budget = 3                      # на любой метод
+    query_budget = {'GET': 3, 'POST': 4}  # по методам
+
+Бюджет не должен зависеть от размера страницы и числа строк в таблицах;
+это проверяют тесты в product/tests.py и users/tests.py. В рантайме
+QueryBudgetMiddleware считает запросы и, в зависимости от QUERY_BUDGET_MODE
+('off', 'log', 'raise'), пишет превышения в лог и в счётчик по эндпоинтам.
+Под ASGI middleware остаётся асинхронной; соединения Django у каждого потока свои,
+поэтому счётчик ставится в том потоке, где async ORM выполняет запросы запроса.
+"""
+import logging
+import threading
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection, connections
+
+logger = logging.getLogger(__name__)
+
+_violations = Counter()
+_violations_lock = threading.Lock()
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def get_query_budget(view, method):
+    view = getattr(view, 'view_class', None) or getattr(view, 'cls', None) or view
+    budget = getattr(view, 'query_budget', None)
+    if isinstance(budget, dict):
+        return budget.get(method)
+    return budget
+
+
+def query_budget_violations():
+    with _violations_lock:
+        return dict(_violations)
+
+
+def reset_query_budget_violations():
+    with _violations_lock:
+        _violations.clear()
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def count_queries(counter):
+    """Подключает counter ко всем соединениям текущего потока; ExitStack закрывается в том же потоке."""
+    # служебные запросы при открытии соединения (pg_type и т.п.) в бюджет не входят
+    connection.ensure_connection()
+    stack = ExitStack()
+    # считаются запросы ко всем базам, включая реплики для чтения
+    for db in connections.all():
+        stack.enter_context(db.execute_wrapper(counter))
+    return stack
+
+
+class QueryBudgetMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        mode = getattr(settings, 'QUERY_BUDGET_MODE', 'off')
+        if mode == 'off':
+            return self.get_response(request)
+
+        counter = QueryCounter()
+        with count_queries(counter):
+            response = self.get_response(request)
+        return self.check_budget(request, response, counter.count, mode)
+
+    async def __acall__(self, request):
+        mode = getattr(settings, 'QUERY_BUDGET_MODE', 'off')
+        if mode == 'off':
+            return await self.get_response(request)
+
+        # sync_to_async запроса выполняется в одном потоке — там же, где и async ORM
+        counter = QueryCounter()
+        stack = await sync_to_async(count_queries)(counter)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.check_budget(request, response, counter.count, mode)
+
+    def check_budget(self, request, response, count, mode):
+        match = request.resolver_match
+        budget = get_query_budget(match.func, request.method) if match else None
+        if budget is None:
+            return response
+
+        response['X-Query-Budget'] = f'{count}/{budget}'
+        if count > budget:
+            endpoint = f'{request.method} {match.route}'
+            with _violations_lock:
+                _violations[endpoint] += 1
+            logger.warning('Превышен бюджет запросов %s: %s из %s', endpoint, count, budget)
+            if mode == 'raise':
+                raise QueryBudgetExceeded(f'{endpoint}: {count} queries, budget {budget}')
+        return response
@@ -0,0 +1,161 @@
+"""
+Ограничение частоты запросов по алгоритму token bucket в Redis.
+
+Представление объявляет лимиты атрибутом класса, как и query_budget:
+
+    rate_limits = (RateLimit('ip', '30/h', burst=10),)              # на любой метод
+    rate_limits = {'POST': (RateLimit('user', '60/min', burst=20),)}  # по методам
+
+У каждого лимита свой счётчик: область ('user', 'ip' или 'email' из тела запроса),
+эндпоинт и идентификатор. Корзина вмещает burst токенов (по умолчанию — число из
+rate) и пополняется равномерно со скоростью rate; запрос забирает по токену из
+каждой своей корзины. Все корзины запроса проверяются одним Lua-скриптом — один
+round trip к Redis, и запрос либо проходит по всем лимитам, либо не тратит ничего.
+Отказ — 429 с Retry-After (через Throttled DRF). Если Redis недоступен, запрос
+пропускается, как и в проверке отзыва токенов. Async-представления без DRF
+проверяют те же корзины через arate_limit_wait().
+"""
+import logging
+import re
+
+from django.conf import settings
+from redis.exceptions import RedisError
+from rest_framework.throttling import BaseThrottle
+
+from shop_api.redis_client import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'sec': 1, 'min': 60, 'h': 3600, 'hour': 3600, 'day': 86400}
+RATE_RE = re.compile(r'^(\d+)/(\d*)(\w+)$')
+
+# ARGV: пары (ёмкость, токенов в мс) по KEYS; ответ — 0 или сколько мс ждать токена
+TOKEN_BUCKET_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local wait, tokens = 0, {}
+for i, key in ipairs(KEYS) do
+    local capacity, refill = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local available = tonumber(bucket[1]) or capacity
+    local elapsed = math.max(0, now - (tonumber(bucket[2]) or now))
+    available = math.min(capacity, available + elapsed * refill)
+    if available < 1 then
+        wait = math.max(wait, math.ceil((1 - available) / refill))
+    end
+    tokens[i] = available
+end
+if wait > 0 then
+    return wait
+end
+for i, key in ipairs(KEYS) do
+    local capacity, refill = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    redis.call('HSET', key, 'tokens', tokens[i] - 1, 'ts', now)
+    -- полная корзина ничем не отличается от отсутствующей
+    redis.call('PEXPIRE', key, math.ceil(capacity / refill))
+end
+return 0
+"""
+
+
+class RateLimit:
+    """Лимит rate ('5/min', '30/h', '3/10min') с запасом burst для одной области."""
+    scopes = ('user', 'ip', 'email')
+
+    def __init__(self, scope, rate, burst=None):
+        if scope not in self.scopes:
+            raise ValueError(f'Неизвестная область лимита: {scope!r}')
+        match = RATE_RE.match(rate)
+        if match is None or match.group(3) not in PERIODS:
+            raise ValueError(f'Неверный формат лимита: {rate!r}')
+        count, multiplier, period = match.groups()
+        self.scope = scope
+        self.rate = rate
+        self.capacity = burst if burst is not None else int(count)
+        self.refill = int(count) / (int(multiplier or 1) * PERIODS[period] * 1000)  # токенов в мс
+
+    def __repr__(self):
+        return f'RateLimit({self.scope!r}, {self.rate!r}, burst={self.capacity})'
+
+
+def get_rate_limits(view, method):
+    view = getattr(view, 'view_class', None) or getattr(view, 'cls', None) or view
+    limits = getattr(view, 'rate_limits', None) or ()
+    if isinstance(limits, dict):
+        return limits.get(method, ())
+    return limits
+
+
+def bucket_key(endpoint, limit, ident):
+    return f'ratelimit:{endpoint}:{limit.rate}:{limit.scope}:{ident}'
+
+
+def bucket_args(endpoint, limits, identify):
+    """KEYS и ARGV скрипта для лимитов; identify(scope) -> идентификатор или None (лимит не применяется)."""
+    keys, args = [], []
+    for limit in limits:
+        ident = identify(limit.scope)
+        if ident is not None:
+            keys.append(bucket_key(endpoint, limit, ident))
+            args.extend((limit.capacity, repr(limit.refill)))
+    return keys, args
+
+
+def normalize_email(email):
+    return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+
+def consume_tokens(keys, args):
+    """Забирает по токену из каждой корзины; 0 или сколько миллисекунд ждать."""
+    return get_redis().register_script(TOKEN_BUCKET_SCRIPT)(keys=keys, args=args)
+
+
+async def aconsume_tokens(keys, args):
+    return await get_async_redis().register_script(TOKEN_BUCKET_SCRIPT)(keys=keys, args=args)
+
+
+async def arate_limit_wait(endpoint, limits, identify):
+    """Для async-представлений без DRF: 0 или сколько секунд ждать. Корзины те же, что у throttle."""
+    keys, args = bucket_args(endpoint, limits, identify)
+    if not keys or not settings.RATE_LIMITS_ENABLED:
+        return 0
+    try:
+        return await aconsume_tokens(keys, args) / 1000
+    except RedisError:
+        logger.warning('Redis недоступен, лимиты %s не проверяются', endpoint)
+        return 0
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttle DRF для rate_limits представления; без лимитов к Redis не обращается."""
+
+    def __init__(self):
+        self.wait_ms = 0
+
+    def allow_request(self, request, view):
+        limits = get_rate_limits(view, request.method)
+        if not limits or not settings.RATE_LIMITS_ENABLED:
+            return True
+
+        def identify(scope):
+            if scope == 'user':
+                user = request.user
+                return f'user:{user.id}' if user and user.is_authenticated else f'ip:{self.get_ident(request)}'
+            if scope == 'ip':
+                return self.get_ident(request)
+            # без email в теле лимит не применяется: запрос всё равно не пройдёт валидацию
+            data = request.data
+            return normalize_email(data.get('email')) if hasattr(data, 'get') else None
+
+        keys, args = bucket_args(type(view).__name__, limits, identify)
+        if not keys:
+            return True
+        try:
+            self.wait_ms = consume_tokens(keys, args)
+        except RedisError:
+            logger.warning('Redis недоступен, лимиты %s не проверяются', type(view).__name__)
+            return True
+        return self.wait_ms == 0
+
+    def wait(self):
+        return self.wait_ms / 1000
@@ -0,0 +1,133 @@
+"""
+Общий доступ к Redis для кода приложения (коды подтверждения, лимиты и т.п.).
+
+Клиенты строятся из settings.REDIS_URL поверх одного пула соединений на процесс,
+поэтому всплеск запросов переиспользует открытые сокеты, а не открывает новые.
+Время установки соединений и выполнения команд накапливается в redis_stats().
+"""
+import logging
+import threading
+import time
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RedisStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self.connections_opened = 0
+        self.connect_time = 0.0
+        self.commands = 0
+        self.command_time = 0.0
+        self.max_command_time = 0.0
+
+    def reset(self):
+        with self._lock:
+            self._clear()
+
+    def record_connect(self, elapsed):
+        with self._lock:
+            self.connections_opened += 1
+            self.connect_time += elapsed
+
+    def record_command(self, name, elapsed):
+        with self._lock:
+            self.commands += 1
+            self.command_time += elapsed
+            self.max_command_time = max(self.max_command_time, elapsed)
+        if elapsed * 1000 >= settings.REDIS_SLOW_COMMAND_MS:
+            logger.warning('Медленная команда Redis %s: %.1f мс', name, elapsed * 1000)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'connections_opened': self.connections_opened,
+                'avg_connect_ms': self.connect_time / self.connections_opened * 1000 if self.connections_opened else 0.0,
+                'commands': self.commands,
+                'avg_command_ms': self.command_time / self.commands * 1000 if self.commands else 0.0,
+                'max_command_ms': self.max_command_time * 1000,
+            }
+
+
+stats = RedisStats()
+
+
+def redis_stats():
+    return stats.snapshot()
+
+
+class InstrumentedConnection(redis.Connection):
+    def connect(self):
+        if self._sock:
+            return
+        started = time.perf_counter()
+        super().connect()
+        stats.record_connect(time.perf_counter() - started)
+
+
+class InstrumentedRedis(redis.Redis):
+    def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            stats.record_command(args[0], time.perf_counter() - started)
+
+
+class AsyncInstrumentedConnection(aioredis.Connection):
+    async def connect(self):
+        if self.is_connected:
+            return
+        started = time.perf_counter()
+        await super().connect()
+        stats.record_connect(time.perf_counter() - started)
+
+
+class AsyncInstrumentedRedis(aioredis.Redis):
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            stats.record_command(args[0], time.perf_counter() - started)
+
+
+def pool_options():
+    return {
+        # при исчерпании пула запрос ждёт свободное соединение, а не открывает новое
+        'max_connections': settings.REDIS_MAX_CONNECTIONS,
+        'timeout': settings.REDIS_SOCKET_TIMEOUT,
+        'socket_timeout': settings.REDIS_SOCKET_TIMEOUT,
+        'socket_connect_timeout': settings.REDIS_SOCKET_TIMEOUT,
+        'health_check_interval': 30,
+    }
+
+
+_pool = None
+_async_pool = None
+
+
+def get_redis():
+    """Синхронный клиент поверх общего пула (пул сам пересоздаётся после fork)."""
+    global _pool
+    if _pool is None:
+        _pool = redis.BlockingConnectionPool.from_url(settings.REDIS_URL, connection_class=InstrumentedConnection,
+                                              **pool_options())
+    return InstrumentedRedis(connection_pool=_pool)
+
+
+def get_async_redis():
+    """Асинхронный клиент поверх общего пула для async-представлений."""
+    global _async_pool
+    if _async_pool is None:
+        _async_pool = aioredis.BlockingConnectionPool.from_url(settings.REDIS_URL,
+                                                       connection_class=AsyncInstrumentedConnection,
+                                                       **pool_options())
+    return AsyncInstrumentedRedis(connection_pool=_async_pool)
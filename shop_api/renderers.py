@@ -0,0 +1,32 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+_encoder = JSONEncoder()
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson с тем же выводом байт в байт.
+
+    DRF по умолчанию пишет компактный JSON без экранирования не-ASCII, и orjson
+    делает то же самое. Всё, что orjson не кодирует сам или кодирует иначе
+    (Decimal, даты и время, lazy-строки), уходит в JSONEncoder DRF: даты
+    получают те же миллисекунды и «Z», а Decimal становится числом.
+    Запросы с отступами (Accept: application/json; indent=4) обрабатывает
+    обычный JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=_encoder.default, option=ORJSON_OPTIONS)
+        # как и JSONRenderer: U+2028/U+2029 валидны в JSON, но не в JavaScript
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'product',
     'users',
@@ -53,15 +54,36 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'querycount.middleware.QueryCountMiddleware'
+    'querycount.middleware.QueryCountMiddleware',
+    'shop_api.db_router.ReplicaRoutingMiddleware',
+    'shop_api.query_budget.QueryBudgetMiddleware',
 ]
 
+# 'off' | 'log' | 'raise' — проверка бюджетов запросов эндпоинтов, см. shop_api/query_budget.py
+QUERY_BUDGET_MODE = config('QUERY_BUDGET_MODE', default='off')
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # пользователь строится из claims токена без запроса к базе, см. users/authentication.py
+        'users.authentication.StatelessJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        # тот же JSON, что у rest_framework.renderers.JSONRenderer, но кодируется orjson
+        'shop_api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    # лимиты из атрибута rate_limits представлений, см. shop_api/rate_limit.py
+    'DEFAULT_THROTTLE_CLASSES': (
+        'shop_api.rate_limit.TokenBucketThrottle',
     ),
 }
 
+SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'users.token.MyTokenObtainPairSerializer',
+    # claims нового access-токена из базы, отозванные refresh-токены отклоняются
+    'TOKEN_REFRESH_SERIALIZER': 'users.token.ClaimsTokenRefreshSerializer',
+}
+
 
 CACHES = {
     "default": {
@@ -123,6 +145,22 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения GET-запросов, см. shop_api/db_router.py: DB_REPLICA_HOSTS=replica1,replica2:5433
+for index, replica in enumerate(filter(None, config('DB_REPLICA_HOSTS', default='').split(',')), start=1):
+    host, _, port = replica.strip().partition(':')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': int(port) if port else DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['shop_api.db_router.ReplicaRouter']
+# сколько секунд после изменяющего запроса пользователь читает из primary
+READ_YOUR_WRITES_SECONDS = config('READ_YOUR_WRITES_SECONDS', default=5, cast=int)
+REPLICA_MAX_LAG_SECONDS = config('REPLICA_MAX_LAG_SECONDS', default=5.0, cast=float)
+REPLICA_CHECK_INTERVAL = config('REPLICA_CHECK_INTERVAL', default=5.0, cast=float)
+
 
 
 # Password validation
@@ -166,8 +204,21 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-CELERY_BROKER_URL = config('REDIS_URL')
-CELERY_RESULT_BACKEND = config('REDIS_URL')
+REDIS_URL = config('REDIS_URL')
+REDIS_MAX_CONNECTIONS = config('REDIS_MAX_CONNECTIONS', default=50, cast=int)
+REDIS_SOCKET_TIMEOUT = config('REDIS_SOCKET_TIMEOUT', default=2.0, cast=float)
+REDIS_SLOW_COMMAND_MS = config('REDIS_SLOW_COMMAND_MS', default=50, cast=float)
+
+# Idempotency-Key для запросов создания, см. shop_api/idempotency.py
+IDEMPOTENCY_TTL = config('IDEMPOTENCY_TTL', default=24 * 60 * 60, cast=int)  # сколько хранится первый ответ
+IDEMPOTENCY_LOCK_TTL = config('IDEMPOTENCY_LOCK_TTL', default=10.0, cast=float)  # замок на время первого запроса
+IDEMPOTENCY_WAIT = config('IDEMPOTENCY_WAIT', default=5.0, cast=float)  # сколько дубликат ждёт первый ответ
+
+# token bucket лимиты эндпоинтов (rate_limits), см. shop_api/rate_limit.py
+RATE_LIMITS_ENABLED = config('RATE_LIMITS_ENABLED', default=True, cast=bool)
+
+CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = REDIS_URL
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
@@ -179,4 +230,16 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'product.tasks.scheduled_task',
         'schedule': crontab(),  # выполняется каждую минуту
     },
+    'reconcile_products_count': {
+        'task': 'product.tasks.reconcile_products_count',
+        'schedule': crontab(minute=0),  # раз в час
+    },
+    'reconcile_ratings': {
+        'task': 'product.tasks.reconcile_ratings',
+        'schedule': crontab(minute=30, hour=3),  # раз в сутки ночью
+    },
+    'update_category_stats': {
+        'task': 'product.tasks.update_category_stats',
+        'schedule': crontab(minute='*/10'),  # аналитика отстаёт от каталога не больше чем на 10 минут
+    },
 }
@@ -6,7 +6,10 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/v1/products/', include('product.urls')),
     path('api/v1/users/', include('users.urls')),
-    path('api/v1/products/', include('product.urls'))
+    path('api/v1/products/', include('product.urls')),
+    # асинхронный путь чтения, см. product/async_views.py
+    path('api/v1/async/products/', include('product.async_urls')),
+    path('api/v1/async/users/', include('users.async_urls')),
 ]
 
 urlpatterns += swagger.urlpatterns
@@ -0,0 +1,10 @@
+from django.urls import path
+from users.async_views import (
+    send_confirmation_code,
+    confirm_user
+)
+
+urlpatterns = [
+    path('send-code/', send_confirmation_code),
+    path('confirm/', confirm_user),
+]
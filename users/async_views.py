@@ -0,0 +1,83 @@
+"""Асинхронные эндпоинты подтверждения email: Redis и Postgres не блокируют воркер."""
+import json
+import random
+import string
+
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+from shop_api.rate_limit import arate_limit_wait, normalize_email
+from users.models import CustomUser
+from .confirmation import aconsume_code, astore_code
+from .serializers import ConfirmationRequestSerializer, ConfirmationVerifySerializer
+from .views import ConfirmUserAPIView, SendConfirmationCodeAPIView
+
+
+def validated_data(request, serializer_class):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        data = {}
+    serializer = serializer_class(data=data)
+    if not serializer.is_valid():
+        return None, JsonResponse(serializer.errors, status=400)
+    return serializer.validated_data, None
+
+
+async def throttled_response(request, view_class, email):
+    """429 по лимитам синхронного двойника view_class: корзины у обоих эндпоинтов общие."""
+    idents = {'ip': BaseThrottle().get_ident(request), 'email': normalize_email(email)}
+    wait = await arate_limit_wait(view_class.__name__, view_class.rate_limits, idents.get)
+    if not wait:
+        return None
+    exc = Throttled(wait)
+    response = JsonResponse({'detail': exc.detail}, status=exc.status_code, json_dumps_params={'ensure_ascii': False})
+    response['Retry-After'] = str(exc.wait)
+    return response
+
+
+@csrf_exempt
+@require_POST
+async def send_confirmation_code(request):
+    data, error_response = validated_data(request, ConfirmationRequestSerializer)
+    if error_response:
+        return error_response
+
+    email = data['email']
+    error_response = await throttled_response(request, SendConfirmationCodeAPIView, email)
+    if error_response:
+        return error_response
+
+    code = ''.join(random.choices(string.digits, k=6))
+    await astore_code(email, code)
+
+    return JsonResponse({'message': 'Код отправлен на email', 'code': code}, status=200,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+@csrf_exempt
+@require_POST
+async def confirm_user(request):
+    data, error_response = validated_data(request, ConfirmationVerifySerializer)
+    if error_response:
+        return error_response
+
+    email = data['email']
+    error_response = await throttled_response(request, ConfirmUserAPIView, email)
+    if error_response:
+        return error_response
+
+    if not await aconsume_code(email, data['code']):
+        return JsonResponse({'error': 'Неверный или истекший код!'}, status=400,
+                            json_dumps_params={'ensure_ascii': False})
+
+    updated = await CustomUser.objects.filter(email=email).aupdate(is_active=True)
+    if not updated:
+        return JsonResponse({'error': 'Пользователь не найден!'}, status=404,
+                            json_dumps_params={'ensure_ascii': False})
+
+    return JsonResponse({'message': 'Пользователь успешно подтвержден!'}, status=200,
+                        json_dumps_params={'ensure_ascii': False})
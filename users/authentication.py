@@ -0,0 +1,83 @@
+"""
+JWT-аутентификация без запроса к базе на каждый запрос.
+
+Пользователь собирается из проверенных claims токена (id, email, is_staff,
+birthday). Вместо чтения CustomUser проверяется одна метка в Redis, которая
+ставится при деактивации пользователя или изменении данных из claims. Метка
+живёт столько же, сколько refresh-токен: до её истечения token/refresh/ не
+выдаёт новых access-токенов по refresh-токенам, выпущенным до отзыва (см.
+users/token.py).
+"""
+import logging
+import time
+
+from django.utils.dateparse import parse_date
+from django.utils.functional import cached_property
+from redis.exceptions import RedisError
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from shop_api.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_CLAIMS = ('email', 'is_staff', 'birthday', 'iat')
+
+
+def revocation_key(user_id):
+    return f"jwt_revoked:{user_id}"
+
+
+def revoke_user_tokens(user_id):
+    """
+    Отзывает все выданные до этого момента токены пользователя, access и refresh.
+
+    iat хранится с точностью до секунды, поэтому токены, выпущенные в ту же секунду,
+    что и отзыв, остаются действительными: иначе новый вход сразу после отзыва
+    (например, после смены прав) отклонялся бы до следующей секунды.
+    """
+    lifetime = max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME)
+    get_redis().set(revocation_key(user_id), int(time.time()), ex=int(lifetime.total_seconds()))
+
+
+def is_revoked(token):
+    """Выпущен ли токен до отзыва токенов его пользователя (RedisError не перехватывается)."""
+    revoked_at = get_redis().get(revocation_key(token[api_settings.USER_ID_CLAIM]))
+    return revoked_at is not None and token['iat'] < int(revoked_at)
+
+
+class ClaimsUser(TokenUser):
+    @cached_property
+    def id(self):
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def email(self):
+        return self.token.get('email')
+
+    @cached_property
+    def birthday(self):
+        return parse_date(self.token['birthday']) if self.token.get('birthday') else None
+
+    def __str__(self):
+        return self.email or super().__str__()
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        # старые токены без нужных claims обслуживаются обычным путём через базу
+        if any(claim not in validated_token for claim in REQUIRED_CLAIMS):
+            return super().get_user(validated_token)
+
+        try:
+            revoked = is_revoked(validated_token)
+        except RedisError:
+            logger.warning('Redis недоступен, пользователь %s проверяется по базе',
+                           validated_token[api_settings.USER_ID_CLAIM])
+            return super().get_user(validated_token)
+
+        if revoked:
+            raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+        return ClaimsUser(validated_token)
@@ -0,0 +1,36 @@
+"""Хранение кодов подтверждения в Redis: одна атомарная операция на шаг."""
+from shop_api.redis_client import get_async_redis, get_redis
+
+CODE_TTL = 300  # 5 минут
+
+# проверка и удаление кода за один round trip; повторно использовать код нельзя
+CONSUME_CODE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+return 0
+"""
+
+
+def code_key(email):
+    return f"confirm_code:{email}"
+
+
+def store_code(email, code):
+    # SET ... EX заменяет старый код атомарно, отдельный DELETE не нужен
+    get_redis().set(code_key(email), code, ex=CODE_TTL)
+
+
+def consume_code(email, code):
+    client = get_redis()
+    return bool(client.register_script(CONSUME_CODE_SCRIPT)(keys=[code_key(email)], args=[code]))
+
+
+async def astore_code(email, code):
+    await get_async_redis().set(code_key(email), code, ex=CODE_TTL)
+
+
+async def aconsume_code(email, code):
+    client = get_async_redis()
+    return bool(await client.register_script(CONSUME_CODE_SCRIPT)(keys=[code_key(email)], args=[code]))
@@ -1,6 +1,26 @@
 from django.contrib.auth.models import BaseUserManager
+from django.db import models
 
-class CustomUserManager(BaseUserManager):
+# поля, попадающие в JWT (см. CustomUser.claim_values)
+CLAIM_FIELDS = {'email', 'is_active', 'is_staff', 'is_superuser', 'birthday', 'password'}
+
+
+class CustomUserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # update() не вызывает post_save, поэтому токены затронутых пользователей отзываются здесь;
+        # активация не в счёт: неактивный пользователь токенов не получает
+        if not CLAIM_FIELDS & set(kwargs) or kwargs == {'is_active': True}:
+            return super().update(**kwargs)
+        from users.signals import revoke_tokens
+
+        ids = list(self.values_list('id', flat=True))
+        updated = super().update(**kwargs)
+        for user_id in ids:
+            revoke_tokens(user_id)
+        return updated
+
+
+class CustomUserManager(BaseUserManager.from_queryset(CustomUserQuerySet)):
     def create_user(self, email,username=None, password=None, **extra_fields):
         if not email:
             raise ValueError('The Email field must be set')
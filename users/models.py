@@ -18,4 +18,15 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     REQUIRED_FIELDS = []
 
     def __str__(self):
-        return self.email or ""
\ No newline at end of file
+        return self.email or ""
+
+    def claim_values(self):
+        # поля, попадающие в JWT; их изменение отзывает выданные токены
+        return (self.email, self.is_active, self.is_staff, self.is_superuser, self.birthday, self.password)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if not instance.get_deferred_fields():
+            instance._loaded_claims = instance.claim_values()
+        return instance
\ No newline at end of file
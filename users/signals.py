@@ -0,0 +1,32 @@
+import logging
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from redis.exceptions import RedisError
+
+from users.authentication import revoke_user_tokens
+from users.models import CustomUser
+
+logger = logging.getLogger(__name__)
+
+
+def revoke_tokens(user_id):
+    try:
+        revoke_user_tokens(user_id)
+    except RedisError:
+        logger.exception('Не удалось отозвать токены пользователя %s', user_id)
+
+
+@receiver(post_save, sender=CustomUser)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    loaded = instance.__dict__.get('_loaded_claims')
+    if loaded is not None and loaded != instance.claim_values():
+        revoke_tokens(instance.id)
+    instance._loaded_claims = instance.claim_values()
+
+
+@receiver(post_delete, sender=CustomUser)
+def user_deleted(sender, instance, **kwargs):
+    revoke_tokens(instance.id)
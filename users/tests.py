@@ -1,3 +1,247 @@
-from django.test import TestCase
+import datetime
+from unittest import mock
 
-# Create your tests here.
+import fakeredis
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from redis.exceptions import RedisError
+from rest_framework.test import APITestCase
+
+from rest_framework_simplejwt.tokens import AccessToken
+
+from shop_api.query_budget import get_query_budget
+from shop_api.rate_limit import RateLimit, consume_tokens
+from users.models import CustomUser
+from .views import ConfirmUserAPIView, RegistrationAPIView
+
+
+# корзины лимитов живут в Redis между запусками; лимиты проверяют RateLimitTests и TokenBucketScriptTests
+@override_settings(RATE_LIMITS_ENABLED=False)
+class QueryBudgetTests(APITestCase):
+    """Регистрация и подтверждение не зависят от числа пользователей в базе."""
+    SIZES = (10, 300)
+
+    def seed_users(self, size):
+        missing = size - CustomUser.objects.count()
+        # без хэширования паролей: '!' — неиспользуемый пароль
+        CustomUser.objects.bulk_create([
+            CustomUser(email=f'user{CustomUser.objects.count() + i}@example.com', password='!')
+            for i in range(missing)
+        ])
+
+    def assertBudget(self, view, make_request):
+        budget = get_query_budget(view, 'POST')
+        counts = []
+        for size in self.SIZES:
+            self.seed_users(size)
+            with CaptureQueriesContext(connection) as queries:
+                response = make_request(size)
+            self.assertLess(response.status_code, 400, response.content)
+            counts.append(len(queries))
+        self.assertEqual(len(set(counts)), 1, f'{view.__name__}: число запросов растёт {counts}')
+        self.assertLessEqual(counts[0], budget)
+
+    def test_registration(self):
+        self.assertBudget(RegistrationAPIView, lambda size: self.client.post(
+            '/api/v1/users/register/', {'email': f'new{size}@example.com', 'password': 'secret'}, format='json'))
+
+    @mock.patch('users.views.consume_code', return_value=True)
+    def test_confirm(self, consume_code):
+        self.assertBudget(ConfirmUserAPIView, lambda size: self.client.post(
+            '/api/v1/users/confirm/', {'email': 'user1@example.com', 'code': '123456'}, format='json'))
+
+
+@mock.patch('users.views.store_code')
+class RateLimitTests(APITestCase):
+    """Все лимиты запроса проверяются одним вызовом скрипта; отказ — 429 с Retry-After."""
+
+    def send_code(self, email='User@Example.com '):
+        return self.client.post('/api/v1/users/send-code/', {'email': email}, format='json')
+
+    def test_allowed(self, store_code):
+        with mock.patch('shop_api.rate_limit.consume_tokens', return_value=0) as consume:
+            self.assertEqual(self.send_code().status_code, 200)
+        keys, args = consume.call_args.args
+        self.assertEqual(consume.call_count, 1)
+        self.assertEqual(keys, ['ratelimit:SendConfirmationCodeAPIView:1/min:email:user@example.com',
+                                'ratelimit:SendConfirmationCodeAPIView:30/h:ip:127.0.0.1'])
+        self.assertEqual(args[::2], [3, 10])
+
+    def test_throttled(self, store_code):
+        with mock.patch('shop_api.rate_limit.consume_tokens', return_value=1500):
+            response = self.send_code()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '2')
+        store_code.assert_not_called()
+
+    def test_throttled_async(self, store_code):
+        with mock.patch('shop_api.rate_limit.aconsume_tokens', new=mock.AsyncMock(return_value=1500)):
+            response = self.client.post('/api/v1/async/users/send-code/', {'email': 'user@example.com'},
+                                        format='json')
+        self.assertEqual((response.status_code, response['Retry-After']), (429, '2'))
+
+    def test_redis_unavailable(self, store_code):
+        with mock.patch('shop_api.rate_limit.consume_tokens', side_effect=RedisError):
+            self.assertEqual(self.send_code().status_code, 200)
+
+    def test_without_limits(self, store_code):
+        with mock.patch('shop_api.rate_limit.consume_tokens') as consume:
+            self.client.post('/api/v1/users/token/refresh/', {'refresh': 'invalid'}, format='json')
+        consume.assert_not_called()
+
+    def test_parse_rate(self, store_code):
+        limit = RateLimit('email', '3/10min')
+        self.assertEqual((limit.capacity, limit.refill), (3, 3 / 600_000))
+        with self.assertRaises(ValueError):
+            RateLimit('ip', '3/fortnight')
+
+
+class FakeRedis:
+    """GET/SET для меток отзыва токенов без сервера Redis."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = str(value).encode()
+
+
+@override_settings(RATE_LIMITS_ENABLED=False)
+class TokenRevocationTests(APITestCase):
+    """Отозванные токены не продлеваются через token/refresh/, claims нового токена — из базы."""
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = mock.patch('users.authentication.get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = CustomUser.objects.create_user(email='staff@example.com', password='secret', is_staff=True)
+        # токены выпущены заранее: выпущенные в секунду отзыва остаются действительными
+        issued_at = timezone.now() - datetime.timedelta(seconds=10)
+        with mock.patch('rest_framework_simplejwt.tokens.aware_utcnow', return_value=issued_at):
+            self.access, self.refresh = self.login()
+
+    def login(self):
+        response = self.client.post('/api/v1/users/login/', {'email': 'staff@example.com', 'password': 'secret'},
+                                    format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data['access'], response.data['refresh']
+
+    def refresh_token(self):
+        return self.client.post('/api/v1/users/token/refresh/', {'refresh': self.refresh}, format='json')
+
+    def authenticated(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        status_code = self.client.get('/api/v1/products/mine/').status_code
+        self.client.credentials()
+        return status_code
+
+    def test_refresh_reissues_claims(self):
+        response = self.refresh_token()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(AccessToken(response.data['access'])['is_staff'])
+        self.assertEqual(self.authenticated(response.data['access']), 200)
+
+    def test_demote_then_refresh(self):
+        self.user = CustomUser.objects.get(id=self.user.id)
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.authenticated(self.access), 401)
+        self.assertEqual(self.refresh_token().status_code, 403)
+
+    def test_queryset_update_revokes(self):
+        CustomUser.objects.filter(id=self.user.id).update(is_active=False)
+        self.assertEqual(self.authenticated(self.access), 401)
+        self.assertEqual(self.refresh_token().status_code, 403)
+
+    def test_login_right_after_revocation(self):
+        CustomUser.objects.filter(id=self.user.id).update(is_staff=False)
+        self.assertEqual(self.authenticated(self.access), 401)
+        # новый вход в ту же или следующую секунду после отзыва
+        access, self.refresh = self.login()
+        self.assertEqual(self.authenticated(access), 200)
+        response = self.refresh_token()
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(AccessToken(response.data['access'])['is_staff'])
+
+    def test_refresh_without_redis(self):
+        CustomUser.objects.filter(id=self.user.id).update(is_staff=False)
+        with mock.patch('users.authentication.get_redis', side_effect=RedisError):
+            response = self.refresh_token()
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(AccessToken(response.data['access'])['is_staff'])
+
+
+@mock.patch('users.views.store_code')
+class TokenBucketScriptTests(APITestCase):
+    """Lua-скрипт token bucket, выполненный Redis-совместимым сервером в памяти (fakeredis с Lua)."""
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch('shop_api.rate_limit.get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def send_code(self, email):
+        return self.client.post('/api/v1/users/send-code/', {'email': email}, format='json')
+
+    def test_burst_then_throttled(self, store_code):
+        # email: 1/min с запасом 3
+        self.assertEqual([self.send_code('user@example.com').status_code for _ in range(4)], [200, 200, 200, 429])
+        response = self.send_code('USER@example.com')
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(55 <= int(response['Retry-After']) <= 60, response['Retry-After'])
+        self.assertEqual(self.send_code('other@example.com').status_code, 200)
+
+    def test_all_or_nothing(self, store_code):
+        limit = RateLimit('ip', '1/h')
+        self.assertEqual(consume_tokens(['a', 'b'], [1, repr(limit.refill), 2, repr(limit.refill)]), 0)
+        # корзина a пуста: отказ, и токен из b не списывается
+        self.assertGreater(consume_tokens(['a', 'b'], [1, repr(limit.refill), 2, repr(limit.refill)]), 0)
+        self.assertEqual(consume_tokens(['b'], [2, repr(limit.refill)]), 0)
+        self.assertGreater(self.redis.pttl('b'), 0)
+
+    def test_refill(self, store_code):
+        refill = repr(RateLimit('ip', '1/s').refill)
+        self.assertEqual(consume_tokens(['c'], [1, refill]), 0)
+        wait = consume_tokens(['c'], [1, refill])
+        self.assertTrue(0 < wait <= 1000, wait)
+        # сдвигаем время последнего списания на секунду назад — токен успел пополниться
+        self.redis.hincrbyfloat('c', 'ts', -1000)
+        self.assertEqual(consume_tokens(['c'], [1, refill]), 0)
+
+
+@override_settings(RATE_LIMITS_ENABLED=False)
+class AsyncConfirmationTests(APITestCase):
+    """Async-версии send-code/ и confirm/ отвечают так же, как синхронные."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='user@example.com', password='secret', is_active=False)
+
+    def post(self, path, data):
+        return self.client.post(f'/api/v1/async/users/{path}', data, format='json')
+
+    @mock.patch('users.async_views.astore_code')
+    def test_send_code(self, astore_code):
+        response = self.post('send-code/', {'email': 'user@example.com'})
+        self.assertEqual(response.status_code, 200)
+        astore_code.assert_awaited_once_with('user@example.com', response.json()['code'])
+        self.assertEqual(self.post('send-code/', {'email': 'не email'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/async/users/send-code/').status_code, 405)
+
+    def test_confirm(self):
+        data = {'email': 'user@example.com', 'code': '123456'}
+        with mock.patch('users.async_views.aconsume_code', return_value=False):
+            self.assertEqual(self.post('confirm/', data).status_code, 400)
+        self.assertFalse(CustomUser.objects.get(id=self.user.id).is_active)
+
+        with mock.patch('users.async_views.aconsume_code', return_value=True) as aconsume_code:
+            self.assertEqual(self.post('confirm/', data).status_code, 200)
+            self.assertEqual(self.post('confirm/', {**data, 'email': 'missing@example.com'}).status_code, 404)
+        aconsume_code.assert_any_await('user@example.com', '123456')
+        self.assertTrue(CustomUser.objects.get(id=self.user.id).is_active)
@@ -1,8 +1,67 @@
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+import logging
+
+from redis.exceptions import RedisError
+from rest_framework.exceptions import PermissionDenied
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from users.authentication import is_revoked
+from users.models import CustomUser
+
+logger = logging.getLogger(__name__)
+
+
+def user_claims(user):
+    # StatelessJWTAuthentication верит этим claims без запроса к базе
+    return {
+        'email': user.email,
+        'is_staff': user.is_staff,
+        'is_superuser': user.is_superuser,
+        'birthday': user.birthday.isoformat() if user.birthday else None,
+    }
+
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
-        token['birthday'] = user.birthday.isoformat() if user.birthday else None
+        token.payload.update(user_claims(user))
         return token
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Новый access-токен по refresh-токену с claims из базы, а не из refresh-токена.
+
+    Refresh-токен, выпущенный до отзыва токенов пользователя (смена пароля,
+    понижение прав, деактивация), отклоняется. Если Redis недоступен, отзыв не
+    проверяется, но claims всё равно берутся из текущей строки пользователя.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        try:
+            revoked = is_revoked(refresh)
+        except RedisError:
+            logger.warning('Redis недоступен, отзыв refresh-токена пользователя %s не проверяется',
+                           refresh[api_settings.USER_ID_CLAIM])
+            revoked = False
+        if revoked:
+            # сам refresh-токен подлинный, но продлевать его запрещено — 403, а не 401
+            raise PermissionDenied('Token has been revoked', code='token_revoked')
+
+        user = CustomUser.objects.filter(**{api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM]}).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+
+        access = refresh.access_token
+        access.payload.update(user_claims(user))
+        data = {'access': str(access)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            refresh.payload.update(user_claims(user))
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
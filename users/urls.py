@@ -1,12 +1,16 @@
 from django.urls import path
+from rest_framework_simplejwt.views import TokenRefreshView
 from users.views import (
     RegistrationAPIView,
     SendConfirmationCodeAPIView,
-    ConfirmUserAPIView
+    ConfirmUserAPIView,
+    LoginAPIView
 )
 
 urlpatterns = [
     path('register/', RegistrationAPIView.as_view()),
     path('send-code/', SendConfirmationCodeAPIView.as_view()),
     path('confirm/', ConfirmUserAPIView.as_view()),
+    path('login/', LoginAPIView.as_view()),
+    path('token/refresh/', TokenRefreshView.as_view()),
 ]
\ No newline at end of file
@@ -3,6 +3,9 @@ from rest_framework.response import Response
 from rest_framework import status
 from django.contrib.auth import authenticate
 from rest_framework.generics import CreateAPIView
+from rest_framework_simplejwt.views import TokenObtainPairView
+from shop_api.idempotency import IdempotencyMixin
+from shop_api.rate_limit import RateLimit
 from users.models import CustomUser
 from .serializers import (
     RegisterValidateSerializer,
@@ -10,14 +13,14 @@ from .serializers import (
     ConfirmationRequestSerializer,
     ConfirmationVerifySerializer
 )
+from .confirmation import consume_code, store_code
 import random
 import string
-import redis
 
-redis_client = redis.Redis(host='localhost', port=6379, db=0)
-
-class RegistrationAPIView(CreateAPIView):
+class RegistrationAPIView(IdempotencyMixin, CreateAPIView):
     serializer_class = RegisterValidateSerializer
+    query_budget = 2
+    rate_limits = (RateLimit('ip', '10/h', burst=5),)
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -35,20 +38,25 @@ class RegistrationAPIView(CreateAPIView):
         return Response({'user_id': user.id, 'email': user.email}, status=status.HTTP_201_CREATED)
 
 class SendConfirmationCodeAPIView(APIView):
+    query_budget = 0
+    # новый код на тот же email раз в минуту, с одного IP — не больше 30 в час
+    rate_limits = (RateLimit('email', '1/min', burst=3), RateLimit('ip', '30/h', burst=10))
+
     def post(self, request):
         serializer = ConfirmationRequestSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
         email = serializer.validated_data['email']
         code = ''.join(random.choices(string.digits, k=6))
-        redis_key = f"confirm_code:{email}"
-
-        redis_client.delete(redis_key)  # удалить старый код, если есть
-        redis_client.setex(redis_key, 300, code)  # установить новый код с TTL 5 минут
+        store_code(email, code)  # новый код с TTL 5 минут заменяет старый
 
         return Response({'message': 'Код отправлен на email', 'code': code}, status=200)
 
 class ConfirmUserAPIView(APIView):
+    query_budget = 1
+    # код из 6 цифр: перебор на один email ограничен несколькими попытками
+    rate_limits = (RateLimit('email', '5/10min'), RateLimit('ip', '60/h', burst=20))
+
     def post(self, request):
         serializer = ConfirmationVerifySerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -56,19 +64,14 @@ class ConfirmUserAPIView(APIView):
         email = serializer.validated_data['email']
         code = serializer.validated_data['code']
 
-        redis_key = f"confirm_code:{email}"
-        stored_code = redis_client.get(redis_key)
-
-        if stored_code is None or stored_code.decode() != code:
+        if not consume_code(email, code):
             return Response({'error': 'Неверный или истекший код!'}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            user = CustomUser.objects.get(email=email)
-        except CustomUser.DoesNotExist:
+        if not CustomUser.objects.filter(email=email).update(is_active=True):
             return Response({'error': 'Пользователь не найден!'}, status=status.HTTP_404_NOT_FOUND)
 
-        user.is_active = True
-        user.save()
-        redis_client.delete(redis_key)
-
         return Response({'message': 'Пользователь успешно подтвержден!'}, status=200)
+
+
+class LoginAPIView(TokenObtainPairView):
+    rate_limits = (RateLimit('email', '10/10min', burst=5), RateLimit('ip', '60/h', burst=20))